@@ -0,0 +1,5 @@
+"""
+Offline-Bench: Pulser gegen Fake-Venus (Modbus TCP) und Fake-Shelly (HTTP) laufen lassen.
+
+  python3 -m bench --profile steps --duration 30
+"""
@@ -0,0 +1,341 @@
+"""
+Bench-Lauf: Fakes starten, Pulser als echte Prozesse starten, Profil abspielen, auswerten.
+
+Je Kanal:
+  energy err  - gesendete Pulse * Wh/Puls gegen die exakt integrierte Profil-Energie
+  latency     - Puls-Ankunft am Fake-Shelly gegen den idealen Schwellen-Zeitpunkt
+  jitter      - Abweichung der Pulsabstände von den idealen Abständen (rms/max)
+  max queue   - größte Pulsqueue (per /metrics abgefragt)
+  cpu         - CPU-Zeit des Pulser-Prozesses (im Engine-Modus für alle Kanäle gemeinsam)
+  counter err - mit --counter-push: letzter gepushter Zählerstand gegen die Profil-Energie
+"""
+import argparse
+import json
+import math
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from pulsar.config import CHANNEL_DEFAULTS, load_signals, parse_terms
+
+from .counter_sink import CounterSink
+from .fake_shelly import FakeShelly
+from .fake_venus import FakeVenus
+from .profiles import SYNTHETIC, Profile, load_profile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_POWER_W = 25_000
+INTEGRATION_STEP_S = 0.001
+SCRAPE_EVERY_S = 0.2
+
+_QUEUE_RE = re.compile(r'^pulsar_channel_pulse_queue\{channel="([^"]+)"\} (\d+)', re.M)
+
+
+@dataclass
+class ChannelResult:
+    channel: str
+    imp_per_kwh: int
+    pulses: int
+    expected_pulses: float
+    energy_err_wh: float
+    latency_avg_ms: float
+    latency_max_ms: float
+    jitter_rms_ms: float
+    jitter_max_ms: float
+    max_queue: int
+    cpu_s: float
+    cpu_pct: float
+    counter_err_wh: Optional[float] = None
+
+
+@dataclass
+class Pulser:
+    label: str
+    channels: Tuple[str, ...]
+    proc: subprocess.Popen
+    metrics_port: int
+    log_path: str
+    cpu_s: float = 0.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def channel_power(channel: str, profile: Profile, t: float) -> int:
+    """Sollleistung des Kanals wie im Pulser (Terme aus CHANNEL_DEFAULTS, gedeckelt)."""
+    w = profile.at(t)
+    p = sum(term.sign * w[term.signal] for term in _terms(channel))
+    return min(max(0, p), MAX_POWER_W)
+
+
+_TERMS_CACHE: Dict[str, tuple] = {}
+
+
+def _terms(channel: str) -> tuple:
+    if channel not in _TERMS_CACHE:
+        spec = str(CHANNEL_DEFAULTS[channel]["signals"])
+        _TERMS_CACHE[channel] = parse_terms(spec, load_signals(), channel)
+    return _TERMS_CACHE[channel]
+
+
+def ideal_pulses(channel: str, profile: Profile, wh_per_pulse: float) -> Tuple[float, List[float]]:
+    """Exakte Profil-Energie (Wh) + Zeitpunkte, zu denen je eine Pulsschwelle überschritten wird."""
+    dt = INTEGRATION_STEP_S
+    steps = int(math.ceil(profile.total_s / dt))
+    e_wh = 0.0
+    crossings: List[float] = []
+    prev = channel_power(channel, profile, 0.0)
+    for i in range(1, steps + 1):
+        t = i * dt
+        p = channel_power(channel, profile, t)
+        step = (prev + p) / 2 * dt / 3600.0
+        nxt = e_wh + step
+        while (len(crossings) + 1) * wh_per_pulse <= nxt:
+            target = (len(crossings) + 1) * wh_per_pulse
+            crossings.append(t - dt + dt * (target - e_wh) / step)
+        e_wh, prev = nxt, p
+    return e_wh, crossings
+
+
+def _spawn(label: str, script: str, channels: Tuple[str, ...], env: Dict[str, str], logdir: str) -> Pulser:
+    port = _free_port()
+    env = dict(env, METRICS_PORT=str(port), METRICS_BIND="127.0.0.1")
+    log_path = os.path.join(logdir, f"{label}.log")
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(REPO, script)], env=env, cwd=REPO, stdout=log, stderr=subprocess.STDOUT
+        )
+    return Pulser(label, channels, proc, port, log_path)
+
+
+def _scrape_queues(p: Pulser) -> Dict[str, int]:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{p.metrics_port}/metrics", timeout=0.5) as r:
+            text = r.read().decode()
+    except OSError:
+        return {}
+    return {ch: int(n) for ch, n in _QUEUE_RE.findall(text)}
+
+
+def _stop(p: Pulser) -> None:
+    """SIGTERM + wait4: CPU-Zeit genau dieses Prozesses."""
+    if p.proc.poll() is not None:
+        with open(p.log_path) as f:
+            tail = f.read()[-2000:]
+        print(f"WARN: Pulser {p.label} vorzeitig beendet (exit {p.proc.returncode}):\n{tail}", file=sys.stderr)
+        return
+    p.proc.send_signal(signal.SIGTERM)
+    try:
+        _, _, ru = os.wait4(p.proc.pid, 0)
+    except ChildProcessError:
+        return
+    p.proc.returncode = 0
+    p.cpu_s = ru.ru_utime + ru.ru_stime
+
+
+def run_bench(args: argparse.Namespace) -> List[ChannelResult]:
+    profile = load_profile(args.profile, args.duration)
+    channels = tuple(c for c in args.channels.split(",") if c)
+    for c in channels:
+        if c not in CHANNEL_DEFAULTS:
+            raise SystemExit(f"Kanal unbekannt: {c} ({', '.join(CHANNEL_DEFAULTS)})")
+
+    shelly = FakeShelly(
+        latency_s=args.shelly_latency_ms / 1000, drop_rate=args.shelly_drop, lost_reply_rate=args.shelly_lost_reply
+    )
+    venus = FakeVenus(
+        profile, latency_s=args.venus_latency_ms / 1000, strict=args.strict_venus,
+        reset_every_s=args.venus_reset_every, silent_units=frozenset(args.venus_silent_unit),
+    )
+    sink = CounterSink(args.counter_push) if args.counter_push else None
+    shelly.start()
+    if sink is not None:
+        sink.start()
+    t0_ns = time.monotonic_ns()
+    venus.start(t0_ns)
+
+    imp = {c: args.imp_per_kwh or int(CHANNEL_DEFAULTS[c]["imp_per_kwh"]) for c in channels}
+    # je Kanal --outputs Relais-Indizes: Default-Index, +10, +20, ...
+    relays = {c: [int(CHANNEL_DEFAULTS[c]["relay_idx"]) + 10 * k for k in range(args.outputs)] for c in channels}
+    relay = {c: ",".join(str(i) for i in relays[c]) for c in channels}
+
+    base = dict(os.environ)
+    base.update(
+        PYTHONUNBUFFERED="1",
+        VENUS_IP="127.0.0.1",
+        VENUS_PORT=str(venus.port),
+        SHELLY_IP=f"127.0.0.1:{shelly.port}",
+        SHELLY_DEVICE="plus_uni" if args.shelly_batch else args.shelly_device,
+        STATE_DIR="off",
+        LOG_LEVEL=args.log_level,
+    )
+    if args.shelly_batch:
+        base["SHELLY_BATCH"] = "script"
+    if sink is not None:
+        base["COUNTER_PUSH_URL"] = sink.url
+    for kv in args.env:
+        k, _, v = kv.partition("=")
+        base[k] = v
+
+    logdir = tempfile.mkdtemp(prefix="pulsar-bench-")
+    pulsers: List[Pulser] = []
+    if args.engine:
+        env = dict(base, CHANNELS=",".join(channels))
+        for c in channels:
+            env[f"{c.upper()}_IMP_PER_KWH"] = str(imp[c])
+            env[f"{c.upper()}_SHELLY_RELAY_IDX"] = relay[c]
+        pulsers.append(_spawn("engine", "engine_pulser.py", channels, env, logdir))
+    else:
+        for c in channels:
+            env = dict(base, IMP_PER_KWH=str(imp[c]), SHELLY_RELAY_IDX=relay[c])
+            pulsers.append(_spawn(c, f"{c}_pulser.py", (c,), env, logdir))
+
+    max_queue = {c: 0 for c in channels}
+    end = t0_ns + int(profile.total_s * 1e9)
+    try:
+        while time.monotonic_ns() < end:
+            for p in pulsers:
+                for ch, n in _scrape_queues(p).items():
+                    if ch in max_queue:
+                        max_queue[ch] = max(max_queue[ch], n)
+            time.sleep(SCRAPE_EVERY_S)
+    finally:
+        for p in pulsers:
+            _stop(p)
+        venus.stop()
+        shelly.stop()
+        if sink is not None:
+            sink.stop()
+
+    wall_s = profile.total_s
+    results = []
+    for p in pulsers:
+        for c in p.channels:
+            pulses = sorted(ts for idx in relays[c] for ts in shelly.pulses_for(idx))
+            counter = sink.last(c) if sink is not None else None
+            results.append(_evaluate(c, profile, imp[c], pulses, t0_ns, max_queue[c], p, wall_s, counter))
+    pulses_total = sum(r.pulses for r in results)
+    print(f"Shelly-Requests: {shelly.requests} für {pulses_total} Pulse (inkl. RPC/Keep-warm)", file=sys.stderr)
+    print(f"Venus-Requests: {venus.requests} ({venus.requests / wall_s:.1f}/s)", file=sys.stderr)
+    if venus.resets:
+        print(f"Venus-Resets: {venus.resets}", file=sys.stderr)
+    if shelly.dropped or shelly.lost_replies:
+        print(f"Shelly-Fehler: {shelly.dropped} verschluckt, {shelly.lost_replies} Antworten verloren", file=sys.stderr)
+    if sink is not None:
+        print(
+            f"Zählerstand-Push: {len(sink.messages)} Nachrichten, {sink.lost} verloren, {len(sink.errors)} Fehler",
+            file=sys.stderr,
+        )
+        for e in sink.errors:
+            print(f"  {e}", file=sys.stderr)
+    if not args.keep_logs:
+        for p in pulsers:
+            os.unlink(p.log_path)
+        os.rmdir(logdir)
+    else:
+        print(f"Pulser-Logs: {logdir}")
+    return results
+
+
+def _evaluate(
+    channel: str, profile: Profile, imp_per_kwh: int, pulses_ns: List[int], t0_ns: int,
+    max_queue: int, p: Pulser, wall_s: float, counter: Optional[dict] = None,
+) -> ChannelResult:
+    wh_per_pulse = 1000.0 / imp_per_kwh
+    energy_wh, ideal = ideal_pulses(channel, profile, wh_per_pulse)
+    actual = [(ts - t0_ns) / 1e9 for ts in pulses_ns]
+
+    n = min(len(actual), len(ideal))
+    lat = [actual[k] - ideal[k] for k in range(n)]
+    jit = [(actual[k] - actual[k - 1]) - (ideal[k] - ideal[k - 1]) for k in range(1, n)]
+
+    def ms(x: float) -> float:
+        return round(x * 1000, 1)
+
+    return ChannelResult(
+        channel=channel,
+        imp_per_kwh=imp_per_kwh,
+        pulses=len(actual),
+        expected_pulses=round(energy_wh / wh_per_pulse, 2),
+        energy_err_wh=round(len(actual) * wh_per_pulse - energy_wh, 2),
+        latency_avg_ms=ms(sum(lat) / n) if n else 0.0,
+        latency_max_ms=ms(max(lat)) if n else 0.0,
+        jitter_rms_ms=ms(math.sqrt(sum(j * j for j in jit) / len(jit))) if jit else 0.0,
+        jitter_max_ms=ms(max(abs(j) for j in jit)) if jit else 0.0,
+        max_queue=max_queue,
+        cpu_s=round(p.cpu_s, 3),
+        cpu_pct=round(100.0 * p.cpu_s / wall_s, 2),
+        counter_err_wh=round(counter["wh"] - energy_wh, 2) if counter is not None else None,
+    )
+
+
+def _print_table(results: List[ChannelResult], engine: bool) -> None:
+    counter = any(r.counter_err_wh is not None for r in results)
+    head = (
+        f"{'channel':<8} {'pulses':>6} {'expected':>9} {'err Wh':>7} {'lat avg':>8} {'lat max':>8} "
+        f"{'jit rms':>8} {'jit max':>8} {'max q':>5} {'cpu s':>7} {'cpu %':>6}"
+    ) + (f" {'cnt err':>7}" if counter else "")
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        print(
+            f"{r.channel:<8} {r.pulses:>6} {r.expected_pulses:>9.2f} {r.energy_err_wh:>7.2f} "
+            f"{r.latency_avg_ms:>6.1f}ms {r.latency_max_ms:>6.1f}ms {r.jitter_rms_ms:>6.1f}ms {r.jitter_max_ms:>6.1f}ms "
+            f"{r.max_queue:>5} {r.cpu_s:>7.3f} {r.cpu_pct:>6.2f}"
+            + (f" {r.counter_err_wh:>7.2f}" if r.counter_err_wh is not None else "")
+        )
+    if engine:
+        print("(Engine-Modus: cpu gilt für den gemeinsamen Prozess)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python3 -m bench", description="Pulser offline gegen Fake-Venus/-Shelly messen")
+    ap.add_argument("--profile", default="steps", help=f"{' | '.join(SYNTHETIC)} oder CSV (t,pv,house,hp,chg)")
+    ap.add_argument("--duration", type=float, default=30.0, help="Dauer synthetischer Profile (s)")
+    ap.add_argument("--channels", default="pv,wp,house")
+    ap.add_argument("--engine", action="store_true", help="ein engine_pulser statt je Kanal ein Prozess")
+    ap.add_argument("--imp-per-kwh", type=int, default=0, help="für alle Kanäle (Default: Kanal-Default)")
+    ap.add_argument("--shelly-device", default="uni", choices=("uni", "plus_uni"))
+    ap.add_argument("--shelly-batch", action="store_true", help="Gen2-Batch über das Pulse-Script (plus_uni)")
+    ap.add_argument("--outputs", type=int, default=1, help="Ausgänge (Relais) je Kanal")
+    ap.add_argument("--venus-latency-ms", type=float, default=0.0)
+    ap.add_argument("--shelly-latency-ms", type=float, default=0.0)
+    ap.add_argument("--shelly-drop", type=float, default=0.0, help="Anteil Pulse: 200 OK, aber nicht geschaltet")
+    ap.add_argument("--shelly-lost-reply", type=float, default=0.0, help="Anteil Pulse: geschaltet, Antwort verloren")
+    ap.add_argument("--strict-venus", action="store_true", help="zusammengefasste Reads mit Lücke ablehnen")
+    ap.add_argument(
+        "--venus-reset-every", type=float, default=0.0, metavar="S", help="alle S Sekunden Verbindungen kappen"
+    )
+    ap.add_argument(
+        "--venus-silent-unit", type=int, action="append", default=[], metavar="UNIT", help="Unit antwortet nie"
+    )
+    ap.add_argument(
+        "--counter-push", choices=("udp", "http"), help="Zählerstand-Ausgang an einen lokalen Empfänger mitmessen"
+    )
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VAL", help="zusätzliche Pulser-Konfig")
+    ap.add_argument("--log-level", default="WARNING")
+    ap.add_argument("--keep-logs", action="store_true")
+    ap.add_argument("--json", action="store_true", help="Ergebnis als JSON")
+    args = ap.parse_args(argv)
+
+    results = run_bench(args)
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        _print_table(results, args.engine)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Empfänger-Stub für den Zählerstand-Ausgang (COUNTER_PUSH_URL): UDP-Datagramme oder HTTP-POST.
+
+Jede Nachricht wird mit Ankunftszeit (monotonic_ns) aufgezeichnet und geprüft:
+  - seq lückenlos (Lücke = verlorene Datagramme; Rücksprung auf 1 = Neustart des Pulsers)
+  - wh je Kanal monoton steigend, auch über Neustarts
+Standalone: python3 -m bench.counter_sink --udp 9999 (bzw. --http 9999), Ausgabe je Nachricht.
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+class CounterSink:
+    def __init__(self, proto: str = "udp", port: int = 0, on_message: Optional[Callable[[dict], None]] = None):
+        self.proto = proto
+        self.on_message = on_message
+        self.messages: List[dict] = []
+        self.arrivals: List[int] = []
+        self.lost = 0  # fehlende seq
+        self.restarts = 0
+        self.errors: List[str] = []  # Rücksprünge des Zählerstands, kaputte Nachrichten
+        self.last_wh: Dict[str, float] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._udp: Optional[socket.socket] = None
+        self.server: Optional[ThreadingHTTPServer] = None
+
+        if proto == "udp":
+            self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp.bind(("127.0.0.1", port))
+            self.port = self._udp.getsockname()[1]
+            target = self._serve_udp
+        else:
+            sink = self
+
+            class Handler(BaseHTTPRequestHandler):
+                protocol_version = "HTTP/1.1"
+
+                def do_POST(self) -> None:
+                    n = int(self.headers.get("Content-Length", 0))
+                    sink._receive(self.rfile.read(n))
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+                def log_message(self, *args) -> None:
+                    pass
+
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            self.server.daemon_threads = True
+            self.port = self.server.server_address[1]
+            target = self.server.serve_forever
+        self._thread = threading.Thread(target=target, name="counter-sink", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"udp://127.0.0.1:{self.port}" if self.proto == "udp" else f"http://127.0.0.1:{self.port}/counter"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self._udp is not None:
+            self._udp.close()
+
+    def _serve_udp(self) -> None:
+        while True:
+            try:
+                data = self._udp.recv(65536)
+            except OSError:
+                return
+            self._receive(data)
+
+    def _receive(self, data: bytes) -> None:
+        now = time.monotonic_ns()
+        try:
+            msg = json.loads(data)
+            seq = int(msg["seq"])
+            chans = msg["channels"]
+        except (ValueError, KeyError, TypeError) as e:
+            with self._lock:
+                self.errors.append(f"kaputte Nachricht ({e})")
+            return
+        with self._lock:
+            if seq == 1 and self._seq:
+                self.restarts += 1
+            elif seq > self._seq + 1:
+                self.lost += seq - self._seq - 1
+            self._seq = seq
+            for name, c in chans.items():
+                prev = self.last_wh.get(name)
+                if prev is not None and c["wh"] < prev:
+                    self.errors.append(f"seq {seq}: {name} wh {prev} -> {c['wh']}")
+                self.last_wh[name] = c["wh"]
+            self.messages.append(msg)
+            self.arrivals.append(now)
+        if self.on_message is not None:
+            self.on_message(msg)
+
+    def last(self, channel: str) -> Optional[dict]:
+        """Letzter Eintrag des Kanals."""
+        with self._lock:
+            for msg in reversed(self.messages):
+                if channel in msg["channels"]:
+                    return msg["channels"][channel]
+        return None
+
+
+def _print(msg: dict) -> None:
+    parts = " ".join(
+        f"{name}={c['wh']:.4f}Wh/{c['w']}W/{c['pulses']}p" for name, c in msg["channels"].items()
+    )
+    print(f"#{msg['seq']} {parts}", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python3 -m bench.counter_sink", description="Zählerstand-Push empfangen")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--udp", type=int, metavar="PORT")
+    g.add_argument("--http", type=int, metavar="PORT")
+    args = ap.parse_args(argv)
+
+    sink = CounterSink("udp" if args.udp is not None else "http", args.udp or args.http or 0, on_message=_print)
+    sink.start()
+    print(f"COUNTER_PUSH_URL={sink.url}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+    print(
+        f"{len(sink.messages)} Nachrichten, {sink.lost} verloren, {sink.restarts} Neustarts, "
+        f"{len(sink.errors)} Fehler", file=sys.stderr,
+    )
+    for e in sink.errors:
+        print(f"  {e}", file=sys.stderr)
+    return 1 if sink.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Fake-Shelly: HTTP/1.1-Stub für /relay/<idx>?turn=on (Gen1) und /rpc/Switch.Set?id=<idx>&on=true (Gen2).
+
+Jeder Puls wird mit Ankunftszeit (monotonic_ns) je Ausgang aufgezeichnet. /shelly
+(Keep-warm) wird beantwortet, aber nicht gezählt. keep-alive wie beim echten Gerät.
+
+Gen2-Scripting (SHELLY_BATCH=script): POST /rpc mit Script.List/Create/PutCode/GetCode/
+SetConfig/Start/Stop verwaltet Scripts im Speicher. Läuft ein Script, beantwortet
+/script/<sid>/pulse?id=&n=&ms= wie das echte pulsar-Script: die Pulse werden je Relais
+angehängt und von einem Thread im Abstand ms "geschaltet" (Zeitpunkt = Schaltzeit).
+/script/<sid>/count?id= liefert wie das Script die Einschaltungen je Relais.
+
+Fehlerbilder für den Abgleich (SHELLY_RECONCILE_S), je Einzelpuls mit Wahrscheinlichkeit:
+  drop_rate       - 200 OK, aber nicht geschaltet
+  lost_reply_rate - geschaltet, Antwort kommt erst nach LOST_REPLY_S (Client-Timeout -> Retry)
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+LOST_REPLY_S = 5.0
+
+
+class FakeShelly:
+    def __init__(
+        self, port: int = 0, latency_s: float = 0.0, drop_rate: float = 0.0, lost_reply_rate: float = 0.0,
+        seed: int = 1,
+    ):
+        self.latency_s = latency_s
+        self.drop_rate = drop_rate
+        self.lost_reply_rate = lost_reply_rate
+        self.dropped = 0
+        self.lost_replies = 0
+        self._rng = random.Random(seed)
+        self.pulses: Dict[int, List[int]] = {}
+        self.requests = 0
+        self.scripts: Dict[int, dict] = {}
+        self._trains: Dict[int, dict] = {}  # Relais -> {"n", "ms", "busy"}
+        self._lock = threading.Lock()
+
+        shelly = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                code, body = shelly._handle(self.path)
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:
+                n = int(self.headers.get("Content-Length", 0))
+                code, body = shelly._handle_rpc(self.rfile.read(n))
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-shelly", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _relay(path: str) -> Optional[int]:
+        u = urlsplit(path)
+        q = parse_qs(u.query)
+        if u.path.startswith("/relay/") and q.get("turn") == ["on"]:
+            return int(u.path[len("/relay/"):])
+        if u.path == "/rpc/Switch.Set" and q.get("on") == ["true"]:
+            return int(q.get("id", ["0"])[0])
+        return None
+
+    def _handle(self, path: str):
+        ts = time.monotonic_ns()
+        with self._lock:
+            self.requests += 1
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+        if urlsplit(path).path == "/shelly":
+            return 200, b'{"type":"fake"}'
+        if path.startswith("/script/"):
+            return self._script_endpoint(path)
+        try:
+            idx = self._relay(path)
+        except ValueError:
+            idx = None
+        if idx is None:
+            return 404, b'{"code":404}'
+        with self._lock:
+            r = self._rng.random()
+            if r < self.drop_rate:
+                self.dropped += 1
+                return 200, b'{"was_on":false}'
+            self.pulses.setdefault(idx, []).append(ts)
+            lost = r < self.drop_rate + self.lost_reply_rate
+            if lost:
+                self.lost_replies += 1
+        if lost:
+            time.sleep(LOST_REPLY_S)
+        return 200, b'{"was_on":false}'
+
+    def _handle_rpc(self, raw: bytes):
+        with self._lock:
+            self.requests += 1
+        try:
+            req = json.loads(raw)
+            result = self._rpc(req["method"], req.get("params") or {})
+        except (KeyError, ValueError) as e:
+            return 200, json.dumps({"id": 1, "error": {"code": -103, "message": str(e)}}).encode()
+        return 200, json.dumps({"id": req.get("id"), "src": "fake", "result": result}).encode()
+
+    def _rpc(self, method: str, params: dict) -> dict:
+        with self._lock:
+            if method == "Script.List":
+                return {"scripts": [
+                    {"id": i, "name": s["name"], "enable": s["enable"], "running": s["running"]}
+                    for i, s in sorted(self.scripts.items())
+                ]}
+            if method == "Script.Create":
+                sid = max(self.scripts, default=0) + 1
+                self.scripts[sid] = {"name": params["name"], "code": "", "enable": False, "running": False}
+                return {"id": sid}
+            s = self.scripts[params["id"]]
+            if method == "Script.PutCode":
+                s["code"] = (s["code"] if params.get("append") else "") + params["code"]
+                return {"len": len(s["code"])}
+            if method == "Script.GetCode":
+                off = params.get("offset", 0)
+                data = s["code"][off:off + 512]
+                return {"data": data, "left": max(0, len(s["code"]) - off - len(data))}
+            if method == "Script.SetConfig":
+                s["enable"] = bool(params["config"].get("enable", s["enable"]))
+                return {"restart_required": False}
+            if method in ("Script.Start", "Script.Stop"):
+                was = s["running"]
+                s["running"] = method == "Script.Start"
+                return {"was_running": was}
+        raise ValueError(f"unbekannte Methode {method}")
+
+    def _script_endpoint(self, path: str):
+        u = urlsplit(path)
+        parts = u.path.split("/")  # "", "script", sid, endpoint
+        with self._lock:
+            s = self.scripts.get(int(parts[2])) if len(parts) == 4 and parts[2].isdigit() else None
+            if s is None or not s["running"] or parts[3] not in ("pulse", "count"):
+                return 404, b'{"code":404}'
+            q = parse_qs(u.query)
+            idx = int(q.get("id", ["0"])[0])
+            t = self._trains.setdefault(idx, {"n": 0, "ms": 80, "busy": False})
+            if parts[3] == "count":
+                return 200, json.dumps({"id": idx, "ons": len(self.pulses.get(idx, ())), "queued": t["n"]}).encode()
+            t["n"] += int(q.get("n", ["1"])[0])
+            t["ms"] = int(q.get("ms", [t["ms"]])[0])
+            if not t["busy"]:
+                t["busy"] = True
+                threading.Thread(target=self._train, args=(idx,), daemon=True).start()
+            return 200, json.dumps({"id": idx, "queued": t["n"]}).encode()
+
+    def _train(self, idx: int) -> None:
+        """Pulszug wie das Script: sofort ein Puls, danach im Abstand ms bis die Queue leer ist."""
+        nxt = time.monotonic_ns()
+        while True:
+            with self._lock:
+                t = self._trains[idx]
+                if t["n"] <= 0:
+                    t["busy"] = False
+                    return
+                t["n"] -= 1
+                self.pulses.setdefault(idx, []).append(time.monotonic_ns())
+                nxt += t["ms"] * 1_000_000
+            time.sleep(max(0.0, (nxt - time.monotonic_ns()) / 1e9))
+
+    def pulses_for(self, idx: int) -> List[int]:
+        with self._lock:
+            return list(self.pulses.get(idx, ()))
@@ -0,0 +1,172 @@
+"""
+Fake-Venus: Modbus-TCP-Server (FC3) mit den Registern, die die Pulser lesen.
+
+  unit 100: 811-813 PV L1-L3, 817-819 House L1-L3 (uint16)
+  unit 31:  5502-5503 HP (uint32, big)
+  unit 52:  3900-3902 Wallbox L1-L3 (uint16)
+
+Werte kommen aus einem Profil zur Zeit der Anfrage. Register zwischen bekannten
+Adressen derselben Unit liefern 0 (strict=True: Modbus-Exception wie eine Venus,
+die zusammengefasste Reads ablehnt). Gepipelinte Requests werden in Reihenfolge
+beantwortet; optional mit künstlicher Latenz pro Request.
+
+Fehlerbilder: reset_every_s schließt alle Verbindungen in diesem Takt (Venus-Neustart,
+WLAN-Abriss), silent_units beantworten keine Requests (z.B. Wallbox aus).
+"""
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .profiles import Profile, Watts
+
+MBAP = struct.Struct(">HHHB")
+FC_READ_HOLDING = 3
+ILLEGAL_ADDRESS = 2
+
+
+def _phases(w: int) -> List[int]:
+    """Auf drei Phasen verteilen, Summe bleibt exakt."""
+    w = max(0, w)
+    p = w // 3
+    return [w - 2 * p, p, p]
+
+
+def register_map(w: Watts) -> Dict[Tuple[int, int], int]:
+    regs: Dict[Tuple[int, int], int] = {}
+    for i, v in enumerate(_phases(w["pv"])):
+        regs[(100, 811 + i)] = v
+    for i, v in enumerate(_phases(w["house"])):
+        regs[(100, 817 + i)] = v
+    hp = max(0, w["hp"])
+    regs[(31, 5502)], regs[(31, 5503)] = hp >> 16, hp & 0xFFFF
+    for i, v in enumerate(_phases(w["chg"])):
+        regs[(52, 3900 + i)] = v
+    return regs
+
+
+# Adressbereich je Unit, in dem unbekannte Register 0 liefern
+_SPANS = {100: (811, 819), 31: (5502, 5503), 52: (3900, 3902)}
+
+
+class FakeVenus:
+    def __init__(
+        self, profile: Profile, port: int = 0, latency_s: float = 0.0, strict: bool = False,
+        reset_every_s: float = 0.0, silent_units: FrozenSet[int] = frozenset(),
+    ):
+        self.profile = profile
+        self.latency_s = latency_s
+        self.strict = strict
+        self.reset_every_s = reset_every_s
+        self.silent_units = silent_units
+        self.t0_ns = time.monotonic_ns()
+        self.requests = 0
+        self.resets = 0
+        self.first_request_ns: Optional[int] = None
+        self._lock = threading.Lock()
+        self._conns: List[socket.socket] = []
+        self._stop = threading.Event()
+
+        venus = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with venus._lock:
+                    venus._conns.append(self.request)
+                try:
+                    venus._serve(self.request)
+                except OSError:
+                    pass
+                finally:
+                    with venus._lock:
+                        venus._conns.remove(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-venus", daemon=True)
+
+    def start(self, t0_ns: Optional[int] = None) -> None:
+        if t0_ns is not None:
+            self.t0_ns = t0_ns
+        self._thread.start()
+        if self.reset_every_s > 0:
+            threading.Thread(target=self._resetter, name="fake-venus-reset", daemon=True).start()
+
+    def _resetter(self) -> None:
+        while not self._stop.wait(self.reset_every_s):
+            with self._lock:
+                conns = list(self._conns)
+            for c in conns:
+                try:
+                    c.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.resets += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def now_s(self) -> float:
+        return (time.monotonic_ns() - self.t0_ns) / 1e9
+
+    def _read(self, unit: int, addr: int, count: int) -> Optional[List[int]]:
+        regs = register_map(self.profile.at(self.now_s()))
+        span = _SPANS.get(unit)
+        if span is None or addr < span[0] or addr + count - 1 > span[1]:
+            return None
+        out = []
+        for a in range(addr, addr + count):
+            v = regs.get((unit, a))
+            if v is None and self.strict:
+                return None
+            out.append(v or 0)
+        return out
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+        buf = b""
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+    def _serve(self, sock: socket.socket) -> None:
+        while True:
+            head = self._recv_exact(sock, MBAP.size)
+            if head is None:
+                return
+            tid, _proto, length, unit = MBAP.unpack(head)
+            pdu = self._recv_exact(sock, length - 1)
+            if pdu is None:
+                return
+            with self._lock:
+                self.requests += 1
+                if self.first_request_ns is None:
+                    self.first_request_ns = time.monotonic_ns()
+            if unit in self.silent_units:
+                continue
+            if self.latency_s > 0:
+                time.sleep(self.latency_s)
+
+            fc = pdu[0]
+            vals = None
+            if fc == FC_READ_HOLDING and len(pdu) >= 5:
+                addr, count = struct.unpack_from(">HH", pdu, 1)
+                vals = self._read(unit, addr, count)
+            if vals is None:
+                resp = struct.pack(">BB", fc | 0x80, ILLEGAL_ADDRESS)
+            else:
+                resp = struct.pack(f">BB{len(vals)}H", fc, 2 * len(vals), *vals)
+            try:
+                sock.sendall(MBAP.pack(tid, 0, len(resp) + 1, unit) + resp)
+            except OSError:
+                return
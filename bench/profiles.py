@@ -0,0 +1,119 @@
+"""
+Leistungsprofile für den Bench: Watt je Signal (pv, house, hp, chg) als Funktion der Zeit.
+
+Synthetische Profile sind deterministisch (Rauschen mit festem Seed), aufgezeichnete
+Profile kommen als CSV (t,pv,house,hp,chg; t in Sekunden, linear interpoliert).
+Vor und nach dem eigentlichen Profil liegt je eine Null-Phase (lead/tail): so fällt
+der Start der Pulser nicht ins Gewicht und die Queue läuft am Ende leer.
+"""
+import bisect
+import csv
+import math
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+SIGNALS = ("pv", "house", "hp", "chg")
+
+Watts = Dict[str, int]
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    duration_s: float
+    fn: Callable[[float], Watts]
+    lead_s: float = 2.0
+    tail_s: float = 3.0
+
+    @property
+    def total_s(self) -> float:
+        return self.lead_s + self.duration_s + self.tail_s
+
+    def at(self, t: float) -> Watts:
+        """Watt je Signal zur Zeit t (Sekunden seit Bench-Start)."""
+        t -= self.lead_s
+        if t < 0 or t >= self.duration_s:
+            return {s: 0 for s in SIGNALS}
+        return self.fn(t)
+
+
+def _const(pv: int, house: int, hp: int, chg: int) -> Callable[[float], Watts]:
+    return lambda t: {"pv": pv, "house": house, "hp": hp, "chg": chg}
+
+
+def constant(duration_s: float) -> Profile:
+    return Profile("constant", duration_s, _const(6000, 5000, 1200, 0))
+
+
+def ramp(duration_s: float) -> Profile:
+    """Alle Signale laufen linear von 0 auf ihren Maximalwert."""
+
+    def fn(t: float) -> Watts:
+        x = t / duration_s
+        return {"pv": int(12000 * x), "house": int(9000 * x), "hp": int(2500 * x), "chg": int(3000 * x)}
+
+    return Profile("ramp", duration_s, fn)
+
+
+def steps(duration_s: float) -> Profile:
+    """Sprünge alle 5s (Wallbox an/aus, HP-Verdichter), hohe Pulsraten zwischendurch."""
+    levels = [
+        (3000, 2000, 0, 0),
+        (15000, 12000, 2500, 7000),
+        (500, 1500, 800, 0),
+        (22000, 20000, 3000, 11000),
+        (0, 400, 0, 0),
+    ]
+
+    def fn(t: float) -> Watts:
+        pv, house, hp, chg = levels[int(t // 5.0) % len(levels)]
+        return {"pv": pv, "house": house, "hp": hp, "chg": chg}
+
+    return Profile("steps", duration_s, fn)
+
+
+def sine(duration_s: float, seed: int = 1) -> Profile:
+    """PV-Tagesgang im Zeitraffer + verrauschter Hausverbrauch (Rauschen mit festem Seed)."""
+    rng = random.Random(seed)
+    noise = [rng.uniform(-400, 400) for _ in range(int(duration_s * 10) + 2)]
+
+    def fn(t: float) -> Watts:
+        pv = 9000 * max(0.0, math.sin(math.pi * t / duration_s))
+        n = noise[int(t * 10)]
+        hp = 1500 if int(t // 7) % 2 else 0
+        return {"pv": int(pv), "house": int(max(0.0, 2500 + hp + n)), "hp": hp, "chg": 0}
+
+    return Profile("sine", duration_s, fn)
+
+
+def from_csv(path: str) -> Profile:
+    rows: List[Tuple[float, Watts]] = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows.append((float(row["t"]), {s: int(float(row.get(s) or 0)) for s in SIGNALS}))
+    if len(rows) < 2:
+        raise ValueError(f"{path}: mindestens zwei Zeilen nötig")
+    rows.sort(key=lambda r: r[0])
+    t0 = rows[0][0]
+    ts = [t - t0 for t, _ in rows]
+
+    def fn(t: float) -> Watts:
+        i = bisect.bisect_right(ts, t) - 1
+        if i >= len(ts) - 1:
+            return dict(rows[-1][1])
+        (ta, a), (tb, b) = (ts[i], rows[i][1]), (ts[i + 1], rows[i + 1][1])
+        x = (t - ta) / (tb - ta) if tb > ta else 0.0
+        return {s: int(a[s] + (b[s] - a[s]) * x) for s in SIGNALS}
+
+    return Profile(path, ts[-1], fn)
+
+
+SYNTHETIC = {"constant": constant, "ramp": ramp, "steps": steps, "sine": sine}
+
+
+def load_profile(spec: str, duration_s: float) -> Profile:
+    """Name eines synthetischen Profils oder Pfad zu einer CSV-Datei."""
+    if spec in SYNTHETIC:
+        return SYNTHETIC[spec](duration_s)
+    return from_csv(spec)
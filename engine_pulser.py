@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+engine_pulser: alle Kanäle (CHANNELS=pv,wp,house,...) in einem Prozess.
+
+Ein Modbus-Client, jedes Register wird pro Zyklus nur einmal gelesen.
+Konfig: /etc/pv-tools/engine.env (Kanal-Keys mit Prefix, z.B. PV_IMP_PER_KWH).
+"""
+from pulsar.engine import run
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
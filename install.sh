@@ -5,11 +5,61 @@ APP_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 CFG_DIR="/etc/pv-tools"
 UNIT_PATH="/etc/systemd/system/pulser@.service"
 VENV_DIR="${APP_DIR}/.venv"
+# Betriebsart: single = pulser@pv/@wp/@house (je ein Prozess)
+#              engine = pulser@engine (alle Kanäle aus engine.env, ein Modbus-Client)
+PULSER_MODE="${PULSER_MODE:-single}"
 
 need_cmd() { command -v "$1" >/dev/null 2>&1; }
 
+# Unit bei jedem Install/Update neu schreiben (update.sh ruft "install.sh unit"),
+# damit bestehende Installationen neue Einträge (StateDirectory, --env-file, ExecReload) bekommen
+write_unit() {
+  echo "[*] Installing systemd template unit: ${UNIT_PATH}"
+  sudo tee "${UNIT_PATH}" >/dev/null <<EOF
+[Unit]
+Description=Pulser (%i)
+Wants=network-online.target
+After=network-online.target
+
+[Service]
+Type=simple
+User=pvtools
+Group=pvtools
+WorkingDirectory=${APP_DIR}
+EnvironmentFile=-${CFG_DIR}/%i.env
+Environment=PYTHONUNBUFFERED=1
+ExecStart=${VENV_DIR}/bin/python ${APP_DIR}/%i_pulser.py --env-file ${CFG_DIR}/%i.env
+# systemctl reload: Konfig ohne Neustart neu laden (Zustand/Queues bleiben)
+ExecReload=/bin/kill -HUP \$MAINPID
+Restart=always
+RestartSec=2
+# Kanal-Zustand (Energie-Rest/Pulsqueue) -> /var/lib/pv-tools, siehe STATE_DIR
+StateDirectory=pv-tools
+
+# light hardening (can be relaxed if needed)
+NoNewPrivileges=true
+PrivateTmp=true
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+  sudo systemctl daemon-reload
+}
+
+if [ "${1:-}" = "unit" ]; then
+  write_unit
+  exit 0
+fi
+
 echo "[*] pv-tools installer"
 echo "    APP_DIR=${APP_DIR}"
+echo "    PULSER_MODE=${PULSER_MODE}"
+
+if [ "${PULSER_MODE}" != "single" ] && [ "${PULSER_MODE}" != "engine" ]; then
+  echo "[!] PULSER_MODE must be 'single' or 'engine'" >&2
+  exit 1
+fi
 
 if ! need_cmd sudo; then
   echo "[!] sudo not found. Please install sudo or run as root." >&2
@@ -38,33 +88,7 @@ else
   exit 1
 fi
 
-echo "[*] Installing systemd template unit: ${UNIT_PATH}"
-sudo tee "${UNIT_PATH}" >/dev/null <<EOF
-[Unit]
-Description=Pulser (%i)
-Wants=network-online.target
-After=network-online.target
-
-[Service]
-Type=simple
-User=pvtools
-Group=pvtools
-WorkingDirectory=${APP_DIR}
-EnvironmentFile=-${CFG_DIR}/%i.env
-Environment=PYTHONUNBUFFERED=1
-ExecStart=${VENV_DIR}/bin/python ${APP_DIR}/%i_pulser.py
-Restart=always
-RestartSec=2
-
-# light hardening (can be relaxed if needed)
-NoNewPrivileges=true
-PrivateTmp=true
-
-[Install]
-WantedBy=multi-user.target
-EOF
-
-sudo systemctl daemon-reload
+write_unit
 
 echo "[*] Installing config examples to ${CFG_DIR} (only if missing)..."
 sudo mkdir -p "${CFG_DIR}"
@@ -91,12 +115,18 @@ sudo chown -R root:pvtools "${CFG_DIR}"
 sudo chmod -R 750 "${CFG_DIR}"
 sudo find "${CFG_DIR}" -type f -name "*.env" -exec sudo chmod 640 {} \;
 
-echo "[*] Enabling and starting services for existing *_pulser.py scripts..."
+echo "[*] Enabling and starting services for existing *_pulser.py scripts (mode: ${PULSER_MODE})..."
 shopt -s nullglob
 found=0
 for f in "${APP_DIR}"/*_pulser.py; do
   base="$(basename "$f")"
-  inst="${base%_pulser.py}"   # pv / house / wp ...
+  inst="${base%_pulser.py}"   # pv / house / wp / engine ...
+  # engine und Einzel-Pulser nie gleichzeitig -> sonst doppelte Impulse
+  if { [ "${PULSER_MODE}" = "engine" ] && [ "${inst}" != "engine" ]; } || \
+     { [ "${PULSER_MODE}" = "single" ] && [ "${inst}" = "engine" ]; }; then
+    sudo systemctl disable --now "pulser@${inst}" >/dev/null 2>&1 || true
+    continue
+  fi
   echo "    - pulser@${inst}"
   sudo systemctl enable --now "pulser@${inst}"
   found=1
@@ -107,5 +137,10 @@ fi
 
 echo
 echo "[✓] Install complete."
+if [ "${PULSER_MODE}" = "engine" ]; then
+  echo "    Status:  systemctl status pulser@engine"
+  echo "    Logs:    journalctl -u pulser@engine -f"
+  exit 0
+fi
 echo "    Status:  systemctl status pulser@pv pulser@house pulser@wp"
 echo "    Logs:    journalctl -u pulser@pv -f"
@@ -0,0 +1,6 @@
+"""
+Gemeinsamer Kern der Pulser: Venus/Modbus lesen, Energie integrieren, Shelly pulsen.
+
+Die Skripte `*_pulser.py` im Repo-Root sind nur noch dünne Einstiegspunkte,
+die die Engine mit einem oder mehreren Kanälen starten.
+"""
@@ -0,0 +1,163 @@
+"""
+RUNTIME=asyncio: Poll-Loop, Emitter, Metrics-Endpoint und Modbus-Proxy als Tasks in einem Event-Loop.
+
+Statt Poll-Thread + einem Thread je Emitter und Ausgang laufen alle Kanäle in einem
+Thread; Modbus (AsyncPymodbusReader, alle Reads eines Zyklus gleichzeitig) und
+Shelly-HTTP (AsyncShellyTransport) blockieren ihn nicht. Integration, Statuslog und
+adaptives Pollen sind dieselben wie im Thread-Betrieb (engine.Cycle).
+Nur das fdatasync der State-/Recorder-Dateien geht in einen Worker-Thread (gibt den GIL frei).
+MODBUS_PIPELINE gilt hier nicht: die Reads laufen immer über pymodbus' asyncio-Client.
+Nicht unterstützt (Konfig-Fehler): SHELLY_BATCH, SHELLY_RECONCILE_S.
+"""
+import asyncio
+import logging
+import signal
+import time
+from typing import List, Optional, Union
+
+from .channel import Channel
+from .config import EngineConfig
+from .counter import start_counter_push_async
+from .emitter import AsyncPulseEmitter
+from .engine import Cycle
+from .metrics import start_metrics_async
+from .modbus import AsyncPoller, AsyncPymodbusReader
+from .profiler import CONNECT, READ, SYNC
+from .proxy import AsyncModbusProxy, start_proxy_async
+from .recorder import Recorder, open_recorder
+from .reload import STOP_TIMEOUT_S, Reloader
+from .state import StateStore, open_store
+from .table import ChannelTable
+
+log = logging.getLogger(__name__)
+
+
+def run(cfg: EngineConfig, reloader: Reloader) -> None:
+    asyncio.run(_main(cfg, reloader))
+
+
+async def _main(cfg: EngineConfig, reloader: Reloader) -> None:
+    reader = AsyncPymodbusReader(cfg.modbus)
+
+    labels = {name: s.label for name, s in cfg.signals.items()}
+    table = ChannelTable(cfg.channels, cfg.used_signals())
+    chans = [
+        Channel(c, labels, table, i, store=open_store(cfg.state_dir, c.name), emitter_cls=AsyncPulseEmitter)
+        for i, c in enumerate(cfg.channels)
+    ]
+    poller = AsyncPoller(
+        reader, cfg.used_signals(), cfg.modbus.merge_gap, cfg.modbus.backoff_min_s, cfg.modbus.backoff_max_s
+    )
+    metrics = await start_metrics_async(cfg.metrics_bind, cfg.metrics_port)
+    if metrics is not None:
+        poller.on_read = metrics.observe_modbus
+        metrics.track_channels(chans)
+    proxy = await start_proxy_async(cfg.proxy_bind, cfg.proxy_port, cfg.proxy_max_age_s, cfg.modbus)
+    if proxy is not None:
+        poller.on_regs = proxy.cache.store
+        if metrics is not None:
+            metrics.track_proxy(proxy)
+    recorder = open_recorder(cfg.record_dir, cfg.record_size_mb, poller.signals, cfg.channels)
+    if recorder is not None:
+        recorder.track_channels(chans)
+    for ch in chans:
+        ch.restore(cfg.state_hold_max_s)
+        ch.emitter.start()
+    # Zählerstand-Ausgang neben den Pulsen (COUNTER_PUSH_URL)
+    counter = start_counter_push_async(cfg.counter_push_url, cfg.counter_push_s, chans)
+    if counter is not None and metrics is not None:
+        metrics.track_counter(counter.push)
+
+    # systemd stop/restart: Poll-Task abbrechen, damit der letzte Zustand auf der Platte ist
+    main = asyncio.current_task()
+    assert main is not None
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, main.cancel)
+    cycle = Cycle(cfg, poller, chans, metrics, recorder)
+    loop.add_signal_handler(signal.SIGUSR1, cycle.dump)
+    loop.add_signal_handler(signal.SIGHUP, cycle.request_reload)
+
+    log.info(
+        "Pulser gestartet (asyncio): Venus=%s:%d | Kanäle=%s | Signale=%s (%s)",
+        cfg.modbus.host, cfg.modbus.port, ",".join(c.name for c in chans),
+        ",".join(s.name for s in poller.signals), poller.describe(),
+    )
+
+    try:
+        await _loop(cycle, reloader, proxy)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if counter is not None:
+            counter.close()
+        for ch in cycle.chans:
+            await ch.emitter.aclose()
+            ch.checkpoint()
+            if ch.store is not None:
+                ch.store.close()
+        if cycle.recorder is not None:
+            cycle.recorder.close()
+        if proxy is not None:
+            proxy.close()
+        cycle.poller.reader.close()
+
+
+async def _reload(cycle: Cycle, reloader: Reloader, proxy: Optional[AsyncModbusProxy]) -> None:
+    plan = reloader.plan(cycle.cfg, cycle.chans, AsyncPulseEmitter)
+    if plan is None:
+        return
+    if plan.channels:
+        # laufende Trigger fertig werden lassen (aclose bricht ab), die Queue übernimmt der neue Emitter
+        deadline = time.monotonic() + STOP_TIMEOUT_S
+        while any(ch.emitter.in_flight for ch in cycle.chans) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for ch in cycle.chans:
+            await ch.emitter.aclose()
+    reader = AsyncPymodbusReader(plan.cfg.modbus) if plan.endpoint else None
+    cycle.reconfigure(plan, reader, AsyncPoller, proxy)
+
+
+async def _loop(cycle: Cycle, reloader: Reloader, proxy: Optional[AsyncModbusProxy]) -> None:
+    prof = cycle.prof
+    while True:
+        try:
+            await cycle.ticker.wait_async()
+            if cycle.reload_pending:
+                cycle.reload_pending = False
+                await _reload(cycle, reloader, proxy)
+            poller = cycle.poller
+            reader = poller.reader
+            prof.begin()
+            if not await reader.connect():
+                raise RuntimeError("Modbus connect() fehlgeschlagen")
+            prof.mark(CONNECT)
+
+            start_ns = time.monotonic_ns()
+            samples, errors = await poller.poll()
+            prof.mark(READ)
+            # Sample-Zeitpunkt = Read fertig (nicht Loop-Start)
+            cycle.sampled(start_ns, time.monotonic_ns(), samples, errors)
+
+            # fdatasync kann auf SD-Karten dauern, gibt aber den GIL frei: der Loop läuft solange weiter
+            stores = cycle.stores_to_sync()
+            if stores:
+                await asyncio.to_thread(_sync_all, stores)
+                prof.mark(SYNC)
+            prof.end()
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            prof.end()
+            delay = cycle.failed(e)
+            try:
+                cycle.poller.reader.close()
+            except Exception:
+                pass
+            await asyncio.sleep(delay)
+
+
+def _sync_all(stores: List[Union[StateStore, Recorder]]) -> None:
+    for store in stores:
+        store.sync()
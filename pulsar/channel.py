@@ -0,0 +1,298 @@
+"""
+Ein Pulskanal: Pulse aus dem Energie-Rest seiner Zeile der ChannelTable ernten.
+
+Leistung, Integration und EMA rechnet die Tabelle für alle Kanäle in einem Schritt;
+gesendet wird asynchron vom PulseEmitter des Kanals.
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional, Type
+
+from .config import ChannelConfig
+from .emitter import PulseEmitter
+from .state import ChannelState, StateStore, downtime_s
+from .table import ChannelTable
+
+log = logging.getLogger(__name__)
+
+# BACKLOG_POLICY=carry: höchstens so viel Energie vortragen (2^62 W*ns ~ 1,28 MWh, bei 25 kW ~2 Tage),
+# darüber wird wie bei drop verworfen und gezählt - der Rest (int64 in der Tabelle) läuft nie über
+CARRY_MAX_WNS = 1 << 62
+
+
+class Channel:
+    def __init__(
+        self, cfg: ChannelConfig, labels: Dict[str, str], table: ChannelTable, row: int,
+        store: Optional[StateStore] = None, emitter_cls: Type[PulseEmitter] = PulseEmitter,
+    ):
+        assert table.names[row] == cfg.name
+        self.cfg = cfg
+        self.name = cfg.name
+        self.labels = labels  # Signalname -> Anzeigename fürs Log
+        self.table = table
+        self.row = row
+        self.store = store
+
+        # Energie-Rest (W*ns) liegt in der Tabelle, geerntete Pulse gehen in die Queue des Emitters.
+        # _lock (der Tabelle) hält Energie + Queue für Checkpoints konsistent (Poll- vs. Emitter-Threads).
+        self._lock = table.lock
+        self.emitter = emitter_cls(cfg, self.pulse_context, on_sent=self.checkpoint, on_extra=self._absorb_extra)
+        # BACKLOG_POLICY=drop: verworfene Pulse (seit Start), Energie exakt mitgezählt
+        self.dropped_pulses = 0
+        self.dropped_wns = 0
+        self.overloaded = False  # Queue am Limit; endet erst, wenn die Queue halb abgebaut ist
+        # Zählerstand = _meter_base + Energie-Rest: die Tabelle integriert in den Rest, was ihn sonst
+        # ändert (Ernte, Drop, Abgleich), wird hier gegengebucht
+        self._meter_base = 0
+
+    @property
+    def power_w(self) -> int:
+        return self.table.power[self.row]
+
+    @property
+    def avg_power_w(self) -> float:
+        return self.table.avg[self.row]
+
+    @property
+    def energy_wns(self) -> int:
+        return self.table.energy[self.row]
+
+    @energy_wns.setter
+    def energy_wns(self, v: int) -> None:
+        self.table.energy[self.row] = v
+
+    @property
+    def meter_wns(self) -> int:
+        """Zählerstand: insgesamt integrierte Energie (W*ns), monoton, unabhängig von Pulsen und Queue."""
+        with self._lock:
+            return self._meter_base + self.energy_wns
+
+    @property
+    def gaps(self) -> int:
+        return self.table.gaps[self.row]
+
+    @property
+    def pulse_queue(self) -> int:
+        return self.emitter.queue
+
+    @property
+    def pulses_sent(self) -> int:
+        return self.emitter.pulses_sent
+
+    def harvest(self) -> None:
+        """
+        Nach ChannelTable.update, wenn der Rest mindestens einen vollen Puls hat: Pulse ernten,
+        jeweils mit dem Zeitpunkt der Schwellen-Überschreitung (Energie im Intervall linear
+        interpoliert) -> Basis für den Scheduler. Schon vorher vorhandene Energie (carry) ist sofort fällig.
+        """
+        t, row = self.table, self.row
+        e0 = t.e0[row]
+        step = t.energy[row] - e0
+        self._harvest(lambda k: t.due(row, k, e0, step))
+        self._check_overload()
+
+    def settle(self) -> None:
+        """Ende des Zyklus: Überlast-Hysterese (Queue baut sich in den Emittern ab) und Checkpoint."""
+        if self.overloaded:
+            self._check_overload()
+        self.checkpoint()
+
+    def _harvest(self, due: Callable[[int], int]) -> None:
+        """
+        Volle Pulse aus dem Energie-Rest in die Queue (due(k) = Fälligkeit des k-ten), höchstens bis max_queue.
+        Überzählige Pulse: carry = Energie bleibt im Rest, drop = verworfen und gezählt.
+        """
+        wpp = self.cfg.wns_per_pulse
+        with self._lock:
+            n = int(self.energy_wns // wpp)
+            if n <= 0:
+                return
+            take = n
+            if self.cfg.max_queue > 0:
+                take = min(n, max(0, self.cfg.max_queue - self.emitter.queue))
+            over = n - take
+            if self.cfg.backlog_policy == "drop":
+                drop = over
+            else:
+                # carry: nur bis CARRY_MAX_WNS, der Rest nach der Ernte bleibt darunter
+                drop = max(0, -(-(self.energy_wns - take * wpp - CARRY_MAX_WNS) // wpp))
+                if drop and not self.dropped_pulses:
+                    log.warning(
+                        "[%s] Vortrag über %.0f kWh, überzählige Pulse werden verworfen", self.name,
+                        CARRY_MAX_WNS / 3.6e15, extra={"fields": {"channel": self.name, "queue": self.pulse_queue}},
+                    )
+            if drop:
+                self.dropped_pulses += drop
+                self.dropped_wns += drop * wpp
+                self.energy_wns -= drop * wpp
+                self._meter_base += drop * wpp
+            self.energy_wns -= take * wpp
+            self._meter_base += take * wpp
+            if take:
+                self.emitter.submit([due(k) for k in range(1, take + 1)])
+
+    def _absorb_extra(self, n: int) -> None:
+        """Shelly hat n Pulse mehr geschaltet als gezählt: Energie dafür ist schon ausgegeben (Rest kann negativ werden)."""
+        with self._lock:
+            self.energy_wns -= n * self.cfg.wns_per_pulse
+            self._meter_base += n * self.cfg.wns_per_pulse
+
+    def _check_overload(self) -> None:
+        """Überlast-Zustand mit Hysterese (kein Flattern, wenn jeder Puls wieder einen Platz frei macht)."""
+        limit = self.cfg.max_queue
+        if limit <= 0:
+            return
+        queue = self.emitter.queue
+        if not self.overloaded:
+            over = queue >= limit
+        else:
+            over = queue > limit // 2 or self.energy_wns >= self.cfg.wns_per_pulse
+        if over == self.overloaded:
+            return
+        self.overloaded = over
+        if over:
+            log.warning(
+                "[%s] Überlast: Queue am Limit (MAX_QUEUE=%d), %s", self.name, self.cfg.max_queue,
+                "Energie wird vorgetragen" if self.cfg.backlog_policy == "carry" else "überzählige Pulse werden verworfen",
+                extra={"fields": {"channel": self.name, "queue": self.pulse_queue}},
+            )
+        else:
+            log.info("[%s] Überlast beendet (queue=%d)", self.name, self.pulse_queue)
+
+    def restore(self, hold_max_s: float) -> None:
+        """
+        Zustand aus dem StateStore übernehmen und die Ausfallzeit abgleichen:
+        bis hold_max_s wird mit der letzten Leistung weiterintegriert (typisch Restart/Deploy),
+        darüber hinaus ist die Energie unbekannt und wird nicht erfunden.
+        """
+        if self.store is None:
+            return
+        st = self.store.load()
+        if st is None:
+            log.info("[%s] Kein gespeicherter Zustand (%s), starte bei 0", self.name, self.store.path)
+            return
+        if st.wns_per_pulse != self.cfg.wns_per_pulse:
+            log.info(
+                "[%s] Pulswertigkeit geändert (%d -> %d Wns), rechne um", self.name, st.wns_per_pulse, self.cfg.wns_per_pulse
+            )
+            st = st.convert(self.cfg.wns_per_pulse)
+
+        down = downtime_s(st)
+        held = min(down, max(0.0, hold_max_s))
+        wpp = self.cfg.wns_per_pulse
+        # gespeicherte Queue + Rest + überbrückte Zeit, neu geerntet (Queue-Limit gilt auch hier)
+        bridged = int(st.power_w * held * 1e9)
+        energy = st.pulse_queue * wpp + st.energy_wns + bridged
+
+        now_ns = time.monotonic_ns()
+        with self._lock:
+            self.energy_wns = energy
+            self._meter_base = st.meter_wns + bridged - energy
+            self.emitter.pulses_sent = st.pulses_sent
+        self.table.seed(self.row, now_ns, st.power_w)
+        self._harvest(lambda k: now_ns)
+        queue = self.pulse_queue
+        self._check_overload()
+        log.info(
+            "[%s] Zustand geladen: Rest=%.2fWh queue=%d sent=%d | Ausfall %.1fs, davon %.1fs mit %dW überbrückt",
+            self.name, self.energy_wns / 3.6e12, queue, st.pulses_sent, down, held, st.power_w,
+            extra={"fields": {"channel": self.name, "queue": queue, "downtime_s": round(down, 1)}},
+        )
+        self.checkpoint()
+
+    def take_over(self, old: "Channel") -> None:
+        """
+        Reload: Zustand des alten Kanals übernehmen (dessen Emitter ist gestoppt). Leistung, EMA,
+        Zeitstempel und Zähler bleiben; bei gleicher Pulswertigkeit behalten die Pulse der Queue
+        ihre Fälligkeit, sonst werden Rest + Queue energiegleich umgerechnet und sofort geerntet.
+        """
+        em = old.emitter
+        pending = em.scheduler.pending()
+        if em.in_flight:
+            # Stop-Timeout: der alte Ausgang sendet sie noch, zählen also als gesendet
+            log.warning("[%s] Reload: %d Puls(e) noch unterwegs, als gesendet gezählt", self.name, em.in_flight)
+        st = ChannelState(
+            wall_ns=time.time_ns(),
+            wns_per_pulse=old.cfg.wns_per_pulse,
+            energy_wns=old.energy_wns,
+            pulse_queue=len(pending),
+            pulses_sent=em.pulses_sent + em.in_flight,
+            power_w=old.power_w,
+            meter_wns=old.meter_wns,
+        )
+        wpp = self.cfg.wns_per_pulse
+        self.table.adopt(self.row, old.table, old.row)
+        self.dropped_pulses, self.dropped_wns = old.dropped_pulses, old.dropped_wns
+        with self._lock:
+            self.emitter.pulses_sent = st.pulses_sent
+            if st.wns_per_pulse == wpp:
+                self.energy_wns = st.energy_wns
+                self.emitter.submit(pending)
+            else:
+                st = st.convert(wpp)
+                self.energy_wns = st.pulse_queue * wpp + st.energy_wns
+                log.info(
+                    "[%s] Pulswertigkeit geändert (%d -> %d Wns): Rest+Queue %d Pulse -> %d", self.name,
+                    old.cfg.wns_per_pulse, wpp, len(pending), st.pulse_queue,
+                )
+            self._meter_base = st.meter_wns - self.energy_wns
+        now_ns = time.monotonic_ns()
+        self._harvest(lambda k: now_ns)
+        self._check_overload()
+        self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Aktuellen Zustand in den StateStore schreiben (billig, jeder Zyklus + jeder Puls)."""
+        if self.store is None:
+            return
+        with self._lock:
+            st = ChannelState(
+                wall_ns=time.time_ns(),
+                wns_per_pulse=self.cfg.wns_per_pulse,
+                energy_wns=self.energy_wns,
+                pulse_queue=self.emitter.queue,
+                pulses_sent=self.emitter.pulses_sent,
+                power_w=self.power_w,
+                meter_wns=self._meter_base + self.energy_wns,
+            )
+        self.store.save(st)
+
+    def desired_interval_s(self) -> float:
+        """Gewünschter Pulsabstand aus aktueller (gedeckelter) Leistung."""
+        d = (self.cfg.wns_per_pulse / max(1, self.power_w)) / 1e9  # ns -> s
+        return max(self.cfg.min_trigger_interval_s, d)
+
+    def describe(self) -> str:
+        """z.B. 'House=1200W - HP=300W - Wallbox=0W => house=900W' (Werte des letzten Zyklus)."""
+        samples = self.table.samples
+        s = ""
+        for i, t in enumerate(self.cfg.terms):
+            sample = samples.get(t.signal)
+            sign, label = t.sign, self.labels.get(t.signal, t.signal)
+            w = 0 if sample is None else sample.total if t.phase is None else sample.phases[t.phase]
+            if t.phase is not None:
+                label += f" L{t.phase + 1}"
+            if i == 0:
+                s = f"{label}={w}W" if sign > 0 else f"-{label}={w}W"
+            else:
+                s += f" {'+' if sign > 0 else '-'} {label}={w}W"
+        if len(self.cfg.terms) > 1 or self.cfg.terms[0].phase is not None:
+            s += f" => {self.name}={self.power_w}W"
+        return s
+
+    def pulse_context(self) -> str:
+        """Kontext für das Puls-Log des Emitters."""
+        return f"{self.describe()} | next~{self.desired_interval_s():.2f}s"
+
+    def status_line(self) -> str:
+        s = (
+            f"[{self.name}] P={self.power_w}W (avg~{int(self.avg_power_w)}W) | "
+            f"{self.describe()} | queue={self.pulse_queue} sent={self.pulses_sent} | "
+            f"{self.emitter.timing_summary()}"
+        )
+        if self.overloaded:
+            s += f" | OVERLOAD (max={self.cfg.max_queue}, {self.cfg.backlog_policy} {self.energy_wns / 3.6e12:.2f}Wh)"
+        if self.dropped_pulses:
+            s += f" | dropped={self.dropped_pulses} ({self.dropped_wns / 3.6e12:.2f}Wh)"
+        gaps = self.table.gap_summary(self.row)
+        return f"{s} | {gaps}" if gaps else s
@@ -0,0 +1,152 @@
+"""
+Zyklus-Takt gegen absolute Deadlines (CLOCK_MONOTONIC) statt "Zyklus + sleep(Intervall)".
+
+Der nächste Poll wird ab der geplanten Startzeit des aktuellen Zyklus gerechnet, nicht ab
+Read-Ende: Modbus-RTT, Verarbeitung, Log und fsync verschieben den Takt damit nicht mehr,
+die Sample-Rate bleibt fest. Geschlafen wird bis zum absoluten Zeitpunkt
+(Linux: clock_nanosleep mit TIMER_ABSTIME, sonst time.sleep auf den Rest).
+
+Dauert ein Zyklus länger als geplant, ist die Deadline verpasst: sie wird im Raster
+übersprungen (Phase bleibt), gezählt und im Statuslog/Metrics gemeldet.
+Die Emitter warten schon auf absolute Puls-Deadlines (Scheduler), dort wird die Wartezeit
+bei jedem Aufwachen neu aus der Deadline gerechnet und driftet nicht.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import sys
+import time
+from typing import Callable, Optional
+
+from .stats import LatencyStats
+
+log = logging.getLogger(__name__)
+
+CLOCK_MONOTONIC = 1
+TIMER_ABSTIME = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _load_nanosleep() -> Optional[Callable]:
+    """clock_nanosleep aus der libc, nur wenn time.monotonic_ns() auf CLOCK_MONOTONIC läuft."""
+    if not sys.platform.startswith("linux"):
+        return None
+    if time.get_clock_info("monotonic").implementation != "clock_gettime(CLOCK_MONOTONIC)":
+        return None
+    try:
+        fn = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6").clock_nanosleep
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(_Timespec), ctypes.POINTER(_Timespec)]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_nanosleep = _load_nanosleep()
+
+
+def sleep_until(deadline_ns: int, woken: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Bis deadline_ns (monotonic) schlafen, gibt die Verspätung beim Aufwachen (ns, >= 0) zurück.
+    woken: nach einem Signal abfragen, True = vorzeitig aufwachen (z.B. Reload).
+    """
+    if _nanosleep is not None:
+        ts = _Timespec(deadline_ns // 1_000_000_000, deadline_ns % 1_000_000_000)
+        # EINTR (Signal): Python-Handler laufen lassen, dann gegen dieselbe Deadline weiter
+        while _nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, ctypes.byref(ts), None) == errno.EINTR:
+            if woken is not None and woken():
+                break
+    else:
+        while True:
+            rest = deadline_ns - time.monotonic_ns()
+            if rest <= 0:
+                break
+            time.sleep(rest / 1e9)
+    return max(0, time.monotonic_ns() - deadline_ns)
+
+
+class Ticker:
+    """
+    Absolute Deadlines des Poll-Loops: wait() schläft bis zur geplanten Startzeit,
+    schedule() setzt die nächste ab dieser Startzeit (nicht ab "jetzt").
+    """
+
+    def __init__(self) -> None:
+        self.target_ns: Optional[int] = None  # geplante Startzeit des nächsten/aktuellen Zyklus
+        self.missed = 0  # übersprungene Deadlines seit Start
+        self.late = LatencyStats()  # Aufwachen - Deadline, seit dem letzten reset()
+        self.last_late_ns = 0
+        self._woken = False  # interrupt(): laufendes Warten abbrechen
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def base_ns(self) -> int:
+        """Geplante Startzeit des laufenden Zyklus (Basis für die nächste Deadline)."""
+        return self.target_ns if self.target_ns is not None else time.monotonic_ns()
+
+    def wait(self) -> int:
+        """Bis zur Deadline schlafen (erster Zyklus/nach reset(): sofort), gibt die Deadline zurück."""
+        if self.target_ns is None:
+            self.target_ns = time.monotonic_ns()
+        elif not self._woken:
+            self.last_late_ns = sleep_until(self.target_ns, lambda: self._woken)
+            self.late.record(self.last_late_ns)
+        self._woken = False
+        return self.target_ns
+
+    async def wait_async(self) -> int:
+        """wait() für RUNTIME=asyncio (Event-Loop-Timer, ms-Auflösung)."""
+        if self.target_ns is None:
+            self.target_ns = time.monotonic_ns()
+        elif not self._woken:
+            rest = self.target_ns - time.monotonic_ns()
+            if rest > 0:
+                self._wake = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), rest / 1e9)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake = None
+            self.last_late_ns = max(0, time.monotonic_ns() - self.target_ns)
+            self.late.record(self.last_late_ns)
+        self._woken = False
+        return self.target_ns
+
+    def interrupt(self) -> None:
+        """Laufendes/nächstes wait() sofort beenden (aus dem Signal-Handler, z.B. Reload)."""
+        self._woken = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def schedule(self, wake_ns: int, now_ns: int) -> int:
+        """
+        Nächste Deadline setzen. Liegt wake_ns schon zurück, wird im Raster des geplanten
+        Abstands übersprungen und als verpasst gezählt. Gibt die neue Deadline zurück.
+        """
+        base = self.base_ns
+        period = max(1, wake_ns - base)
+        if wake_ns <= now_ns:
+            skip = (now_ns - wake_ns) // period + 1
+            self.missed += skip
+            log.debug(
+                "Takt: %d Deadline(s) verpasst (Zyklus %.1fms, Abstand %.1fms)",
+                skip, (now_ns - base) / 1e6, period / 1e6,
+                extra={"key": "clock.missed", "fields": {"missed": skip}},
+            )
+            wake_ns += skip * period
+        self.target_ns = wake_ns
+        return wake_ns
+
+    def reset(self) -> None:
+        """Nach Fehlern/Backoff: nächster Zyklus startet sofort und ist die neue Basis."""
+        self.target_ns = None
+        self.last_late_ns = 0
+
+    def summary(self) -> str:
+        s = self.late.summary("takt late")
+        return f"{s} verpasst={self.missed}" if self.missed else s
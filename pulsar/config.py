@@ -0,0 +1,454 @@
+"""
+Konfiguration aus ENV (systemd EnvironmentFile).
+
+Globale Keys (Venus, Register, Loop) gelten für alle Kanäle. Kanal-Keys können
+pro Kanal mit Prefix überschrieben werden: `<KANAL>_<KEY>` vor `<KEY>`,
+z.B. `PV_IMP_PER_KWH=150` vor `IMP_PER_KWH=100`. Damit funktionieren die
+bisherigen pv/wp/house.env unverändert (dort gibt es nur die Keys ohne Prefix).
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .shelly import shelly_on_url
+from .shelly_script import split_switch_url
+
+
+def env_str(key: str, default: str) -> str:
+    v = os.getenv(key)
+    return default if v is None or v == "" else v
+
+
+def env_int(key: str, default: int) -> int:
+    v = os.getenv(key)
+    if v is None or v == "":
+        return default
+    return int(v)
+
+
+def env_float(key: str, default: float) -> float:
+    v = os.getenv(key)
+    if v is None or v == "":
+        return default
+    return float(v)
+
+
+def env_bool(key: str, default: bool) -> bool:
+    v = os.getenv(key)
+    if v is None or v == "":
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def env_list(key: str, default: str) -> Tuple[str, ...]:
+    """Kommaliste, Leerzeichen werden ignoriert."""
+    return tuple(x.strip() for x in env_str(key, default).split(",") if x.strip())
+
+
+def read_env_file(path: str) -> Dict[str, str]:
+    """KEY=VAL-Zeilen wie systemd EnvironmentFile (Kommentare, Anführungszeichen)."""
+    env: Dict[str, str] = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            k, v = line.split("=", 1)
+            v = v.strip()
+            if len(v) >= 2 and v[0] == v[-1] and v[0] in "\"'":
+                v = v[1:-1]
+            env[k.strip()] = v
+    return env
+
+
+# =========================
+# Modbus / Signale
+# =========================
+@dataclass(frozen=True)
+class ModbusConfig:
+    host: str
+    port: int
+    timeout_s: float
+    # Requests aller Units gleichzeitig senden (Transaction-IDs), sonst pymodbus sequentiell
+    pipeline: bool
+    # Registerblöcke derselben Unit zusammenfassen, wenn die Lücke <= merge_gap ist (-1 = nie)
+    merge_gap: int
+    # Reconnect nach abgebrochenem Zyklus bzw. Aussetzen einer stummen Unit: min_s, verdoppelt bis max_s (+-Jitter)
+    backoff_min_s: float = 0.2
+    backoff_max_s: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ModbusConfig":
+        return cls(
+            host=env_str("VENUS_IP", "192.168.41.101"),
+            port=env_int("VENUS_PORT", 502),
+            timeout_s=env_float("MODBUS_TIMEOUT_S", 2.0),
+            pipeline=env_bool("MODBUS_PIPELINE", True),
+            merge_gap=env_int("MODBUS_MERGE_GAP", 8),
+            backoff_min_s=env_float("MODBUS_BACKOFF_MIN_S", 0.2),
+            backoff_max_s=env_float("MODBUS_BACKOFF_MAX_S", 30.0),
+        )
+
+
+# Register-Typen: u16x3 = L1/L2/L3 als 3x uint16, u32 = ein Wert aus 2 Registern
+REG_COUNT = {"u16x3": 3, "u32": 2}
+
+
+@dataclass(frozen=True)
+class SignalConfig:
+    """Ein Registerblock auf der Venus, wird pro Poll-Zyklus genau einmal gelesen."""
+
+    name: str
+    label: str
+    unit_id: int
+    addr: int
+    kind: str
+    wordorder: str = "big"
+
+    @property
+    def count(self) -> int:
+        return REG_COUNT[self.kind]
+
+
+def load_signals() -> Dict[str, SignalConfig]:
+    """Alle bekannten Signale, Register/Unit-IDs wie in den bisherigen Skripten."""
+    sigs = [
+        # PV - AC-coupled on input L1/L2/L3 Power (W), uint16 (com.victronenergy.system)
+        SignalConfig("pv", "PV", env_int("SYSTEM_UNIT_ID", 100), env_int("REG_PV_L1_W", 811), "u16x3"),
+        # Household total consumption L1/L2/L3 (W), uint16
+        SignalConfig("house", "House", env_int("HOUSE_UNIT_ID", 100), env_int("REG_HOUSE_L1_W", 817), "u16x3"),
+        # Heatpump consumption (W), uint32 - falls HP-Wert unsinnig: HP_WORDORDER=little testen
+        SignalConfig(
+            "hp", "HP", env_int("HP_UNIT_ID", 31), env_int("REG_HP_POWER_U32", 5502), "u32",
+            wordorder=env_str("HP_WORDORDER", "big"),
+        ),
+        # Wallbox / AC load (Shelly 3EM) L1/L2/L3 (W), uint16
+        SignalConfig("chg", "Wallbox", env_int("CHG_UNIT_ID", 52), env_int("REG_CHG_L1_W", 3900), "u16x3"),
+    ]
+    return {s.name: s for s in sigs}
+
+
+# =========================
+# Kanäle
+# =========================
+WNS_PER_KWH = 3_600_000_000_000_000
+
+@dataclass(frozen=True)
+class Term:
+    signal: str
+    sign: int  # +1 / -1
+    phase: Optional[int] = None  # nur eine Phase eines u16x3-Signals (0-2), None = Summe
+
+
+# Defaults je bekanntem Kanal (entsprechen den bisherigen Einzelskripten)
+CHANNEL_DEFAULTS: Dict[str, Dict[str, object]] = {
+    "pv": {"signals": "pv", "imp_per_kwh": 150, "relay_idx": 0, "max_key": "MAX_POWER_W"},
+    "wp": {"signals": "hp", "imp_per_kwh": 100, "relay_idx": 2, "max_key": "MAX_POWER_W"},
+    "house": {"signals": "house,-hp,-chg", "imp_per_kwh": 100, "relay_idx": 1, "max_key": "MAX_NET_POWER_W"},
+}
+
+
+@dataclass(frozen=True)
+class ChannelConfig:
+    name: str
+    # Erster Term = Pflichtsignal (fehlt es, wird der Zyklus für den Kanal übersprungen),
+    # weitere Terme sind optional (Lesefehler -> 0 W, wie bisher HP/Wallbox bei house)
+    terms: Tuple[Term, ...]
+    imp_per_kwh: int
+    wns_per_pulse: int
+    max_power_w: int
+    # Ausgänge (Relais/Shellys), auf die die Pulse verteilt werden
+    shelly_on_urls: Tuple[str, ...]
+    output_dispatch: str  # round_robin | least_loaded
+    min_trigger_interval_s: float
+    http_timeout: Tuple[float, float]  # (connect, read)
+    shelly_retries: int
+    retry_delay_s: float
+    shelly_keepalive: str  # auto | 1 | 0
+    shelly_keepwarm_s: float  # 0 = aus
+    # Gen2-Batch: off | script (Pulszug auf dem Gerät), Pulse innerhalb batch_window_s gehen in einen Request
+    shelly_batch: str
+    batch_window_s: float
+    # Abgleich gesendet vs. geschaltet über den Einschalt-Zähler des Pulse-Scripts (Gen2), 0 = aus
+    reconcile_s: float
+    alpha_avg: float
+    # Integration: trapezoid | hold, Lücken > max_gap_s nach gap_policy (interpolate | hold | zero)
+    integration: str
+    max_gap_s: float
+    gap_policy: str
+    # Scheduler: Puls wird pulse_delay_s nach Schwellen-Überschreitung gesendet,
+    # Rückstand wird mit höchstens max_pulse_rate_hz abgebaut
+    pulse_delay_s: float
+    max_pulse_rate_hz: float
+    # Rückstand: höchstens max_queue Pulse (0 = unbegrenzt), darüber
+    # carry = Energie bleibt im Rest und wird später geerntet, drop = verwerfen und zählen
+    max_queue: int
+    backlog_policy: str
+
+
+class ChannelEnv:
+    """ENV-Lookup mit Kanal-Prefix: `<KANAL>_<KEY>` -> `<KEY>` -> default."""
+
+    def __init__(self, channel: str):
+        self.prefix = channel.upper() + "_"
+
+    def _key(self, key: str) -> str:
+        v = os.getenv(self.prefix + key)
+        return key if v is None or v == "" else self.prefix + key
+
+    def get_str(self, key: str, default: str) -> str:
+        return env_str(self._key(key), default)
+
+    def get_int(self, key: str, default: int) -> int:
+        return env_int(self._key(key), default)
+
+    def get_float(self, key: str, default: float) -> float:
+        return env_float(self._key(key), default)
+
+    def get_bool(self, key: str, default: bool) -> bool:
+        return env_bool(self._key(key), default)
+
+
+def parse_terms(spec: str, signals: Dict[str, SignalConfig], channel: str) -> Tuple[Term, ...]:
+    """'house,-hp,-chg' -> (Term(house,+1), Term(hp,-1), Term(chg,-1)), 'pv.l2' -> Term(pv,+1,phase=1)."""
+    terms = []
+    for raw in spec.split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        sign = 1
+        if raw[0] in "+-":
+            sign = -1 if raw[0] == "-" else 1
+            raw = raw[1:].strip()
+        phase: Optional[int] = None
+        name, dot, ph = raw.partition(".")
+        if dot:
+            if ph.lower() not in ("l1", "l2", "l3"):
+                raise ValueError(f"Kanal {channel}: Phase '{ph}' unbekannt (l1 | l2 | l3)")
+            phase = int(ph[1]) - 1
+            raw = name
+        if raw not in signals:
+            raise ValueError(f"Kanal {channel}: unbekanntes Signal '{raw}' (bekannt: {', '.join(signals)})")
+        if phase is not None and signals[raw].kind != "u16x3":
+            raise ValueError(f"Kanal {channel}: {raw} hat keine Phasen ({signals[raw].kind})")
+        terms.append(Term(raw, sign, phase))
+    if not terms:
+        raise ValueError(f"Kanal {channel}: keine Signale konfiguriert ({channel.upper()}_SIGNALS)")
+    return tuple(terms)
+
+
+def load_channel(name: str, signals: Dict[str, SignalConfig], poll_interval_s: float) -> ChannelConfig:
+    d = CHANNEL_DEFAULTS.get(name, {})
+    e = ChannelEnv(name)
+
+    spec = e.get_str("SIGNALS", str(d.get("signals", "")))
+    terms = parse_terms(spec, signals, name)
+    # Wallbox berücksichtigen? (1/0, true/false, yes/no)
+    if not e.get_bool("USE_WALLBOX", True):
+        terms = tuple(t for t in terms if t.signal != "chg")
+
+    imp_per_kwh = e.get_int("IMP_PER_KWH", int(d.get("imp_per_kwh", 100)))
+    max_key = str(d.get("max_key", "MAX_POWER_W"))
+    max_power_w = e.get_int(max_key, e.get_int("MAX_POWER_W", 25_000))
+
+    # Shelly: 30ms ON intern + mind. 30ms OFF -> Sicherheitsabstand
+    min_trigger_interval_s = e.get_float("MIN_TRIGGER_INTERVAL_S", 0.080)
+
+    # Shelly: Gen1 /relay/<idx>?turn=on oder Gen2 /rpc/Switch.Set?id=<idx>&on=true.
+    # Mehrere Ausgänge: SHELLY_IP und/oder SHELLY_RELAY_IDX als Liste (alle Kombinationen)
+    # oder SHELLY_ON_URL mit mehreren URLs, jeweils komma-getrennt.
+    urls = tuple(u.strip() for u in e.get_str("SHELLY_ON_URL", "").split(",") if u.strip())
+    if not urls:
+        device = e.get_str("SHELLY_DEVICE", "uni")
+        ips = [ip.strip() for ip in e.get_str("SHELLY_IP", "192.168.41.124").split(",") if ip.strip()]
+        idx_spec = e.get_str("SHELLY_RELAY_IDX", str(d.get("relay_idx", 0)))
+        try:
+            idxs = [int(i) for i in idx_spec.split(",") if i.strip()]
+        except ValueError:
+            raise ValueError(f"Kanal {name}: SHELLY_RELAY_IDX ungültig: {idx_spec}") from None
+        urls = tuple(shelly_on_url(ip, idx, device) for ip in ips for idx in idxs)
+    if not urls:
+        raise ValueError(f"Kanal {name}: kein Shelly-Ausgang konfiguriert")
+    if len(set(urls)) != len(urls):
+        raise ValueError(f"Kanal {name}: Shelly-Ausgang doppelt konfiguriert")
+    for url in urls:
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError(f"Kanal {name}: SHELLY_ON_URL braucht http:// oder https:// ({url})")
+
+    # Relais darf nicht dauerhaft langsamer sein als die Leistung Pulse erzeugt,
+    # sonst wächst der Rückstand bei Volllast ohne Ende
+    # Default: alle Ausgänge zusammen im Relais-Mindestabstand
+    outputs_rate_hz = len(urls) / max(0.001, min_trigger_interval_s)
+    max_pulse_rate_hz = e.get_float("MAX_PULSE_RATE_HZ", outputs_rate_hz)
+    relay_rate_hz = min(max_pulse_rate_hz, outputs_rate_hz)
+    needed_rate_hz = max_power_w * imp_per_kwh / 3_600_000
+    if needed_rate_hz >= relay_rate_hz:
+        raise ValueError(
+            f"Kanal {name}: {max_key}={max_power_w} bei {imp_per_kwh} Imp/kWh = {needed_rate_hz:.2f} Pulse/s, "
+            f"{len(urls)} Ausgang/Ausgänge schaffen max. {relay_rate_hz:.2f}/s (MIN_TRIGGER_INTERVAL_S/MAX_PULSE_RATE_HZ) "
+            f"-> IMP_PER_KWH oder {max_key} senken oder weitere Ausgänge"
+        )
+
+    backlog_policy = e.get_str("BACKLOG_POLICY", "carry")
+    if backlog_policy not in ("carry", "drop"):
+        raise ValueError(f"BACKLOG_POLICY unbekannt: {backlog_policy} (carry | drop)")
+
+    output_dispatch = e.get_str("OUTPUT_DISPATCH", "round_robin")
+    if output_dispatch not in ("round_robin", "least_loaded"):
+        raise ValueError(f"OUTPUT_DISPATCH unbekannt: {output_dispatch} (round_robin | least_loaded)")
+
+    shelly_batch = e.get_str("SHELLY_BATCH", "off")
+    if shelly_batch not in ("off", "script"):
+        raise ValueError(f"SHELLY_BATCH unbekannt: {shelly_batch} (off | script)")
+    reconcile_s = max(0.0, e.get_float("SHELLY_RECONCILE_S", 0.0))
+    if shelly_batch == "script" or reconcile_s > 0:
+        for url in urls:
+            split_switch_url(url)
+    batch_window_s = e.get_float("SHELLY_BATCH_WINDOW_S", 1.0) if shelly_batch == "script" else 0.0
+
+    # hier statt erst im Transport: ein Reload mit ungültigem Wert wird verworfen, bevor Emitter umgebaut werden
+    shelly_keepalive = e.get_str("SHELLY_KEEPALIVE", "auto")
+    if shelly_keepalive not in ("auto", "1", "0"):
+        raise ValueError(f"Kanal {name}: SHELLY_KEEPALIVE unbekannt: {shelly_keepalive} (auto | 1 | 0)")
+
+    return ChannelConfig(
+        name=name,
+        terms=terms,
+        imp_per_kwh=imp_per_kwh,
+        # 1 kWh = 3_600_000 Ws = 3_600_000_000_000_000 Wns
+        wns_per_pulse=WNS_PER_KWH // max(1, imp_per_kwh),
+        max_power_w=max_power_w,
+        shelly_on_urls=urls,
+        output_dispatch=output_dispatch,
+        min_trigger_interval_s=min_trigger_interval_s,
+        http_timeout=(e.get_float("HTTP_CONNECT_TIMEOUT_S", 2.0), e.get_float("HTTP_READ_TIMEOUT_S", 2.0)),
+        shelly_retries=e.get_int("SHELLY_RETRIES", 1),
+        retry_delay_s=e.get_float("RETRY_DELAY_S", 0.2),
+        shelly_keepalive=shelly_keepalive,
+        shelly_keepwarm_s=e.get_float("SHELLY_KEEPWARM_S", 0.0),
+        shelly_batch=shelly_batch,
+        batch_window_s=batch_window_s,
+        reconcile_s=reconcile_s,
+        alpha_avg=e.get_float("ALPHA_AVG", 0.90),
+        integration=e.get_str("INTEGRATION", "trapezoid"),
+        max_gap_s=e.get_float("MAX_GAP_S", 5.0),
+        gap_policy=e.get_str("GAP_POLICY", "interpolate"),
+        # Default: 1.5 Poll-Intervalle, damit der Puls beim Senden sicher schon geerntet ist;
+        # im Batch-Betrieb zusätzlich ein Fenster, damit die Pulse des Fensters schon bekannt sind
+        pulse_delay_s=e.get_float("PULSE_DELAY_S", 1.5 * poll_interval_s + batch_window_s),
+        max_pulse_rate_hz=max_pulse_rate_hz,
+        max_queue=max(0, e.get_int("MAX_QUEUE", 500)),
+        backlog_policy=backlog_policy,
+    )
+
+
+@dataclass(frozen=True)
+class EngineConfig:
+    modbus: ModbusConfig
+    signals: Dict[str, SignalConfig]
+    channels: Tuple[ChannelConfig, ...]
+    # Poll-Intervall: poll_interval_s (schnellstes) bis poll_max_s (Leistung konstant) bzw.
+    # poll_idle_s (alle Kanäle 0 W), zurück auf poll_interval_s bei Leistungssprüngen ab poll_change_w
+    poll_interval_s: float
+    poll_max_s: float
+    poll_idle_s: float
+    poll_change_w: int
+    log_every_s: float
+    # Persistenz: STATE_DIR=off = aus
+    state_dir: str
+    state_hold_max_s: float
+    state_sync_s: float
+    # Prometheus-Endpoint: METRICS_PORT=0 = aus
+    metrics_bind: str
+    metrics_port: int
+    # Logging: Level, text|json, Rate-Limit pro Meldung
+    log_level: str
+    log_format: str
+    log_rate_burst: int
+    log_rate_window_s: float
+    # threads (Poll-Loop + Threads je Emitter/Ausgang) | asyncio (alles in einem Event-Loop)
+    runtime: str = "threads"
+    # Sample-Recorder: Verzeichnis der Ring-Dateien, off = aus
+    record_dir: str = "off"
+    record_size_mb: float = 32.0
+    # Modbus-TCP-Proxy für andere Clients: MODBUS_PROXY_PORT=0 = aus
+    proxy_bind: str = "0.0.0.0"
+    proxy_port: int = 0
+    proxy_max_age_s: float = 1.0
+    # Zählerstand-Ausgang: udp://host:port oder http(s)://..., leer = aus
+    counter_push_url: str = ""
+    counter_push_s: float = 1.0
+
+    def used_signals(self) -> Tuple[SignalConfig, ...]:
+        """Signale, die mindestens ein Kanal braucht (in Konfig-Reihenfolge)."""
+        names = {t.signal for ch in self.channels for t in ch.terms}
+        return tuple(s for n, s in self.signals.items() if n in names)
+
+
+def load_engine_config(channels: Optional[Tuple[str, ...]] = None) -> EngineConfig:
+    """Lädt die Engine-Konfig; ohne explizite Kanäle aus CHANNELS (Default: pv,wp,house)."""
+    if channels is None:
+        channels = env_list("CHANNELS", "pv,wp,house")
+    if not channels:
+        raise ValueError("Keine Kanäle konfiguriert (CHANNELS)")
+    if len(set(channels)) != len(channels):
+        raise ValueError(f"Kanal doppelt konfiguriert: {','.join(channels)}")
+    signals = load_signals()
+    poll_interval_s = env_float("POLL_INTERVAL_S", 0.2)
+    poll_max_s = max(poll_interval_s, env_float("POLL_MAX_S", poll_interval_s))
+    poll_idle_s = max(poll_max_s, env_float("POLL_IDLE_S", poll_max_s))
+    chans = tuple(load_channel(n, signals, poll_interval_s) for n in channels)
+    for c in chans:
+        # längere Poll-Pausen als MAX_GAP_S würden jedes Mal als Lücke behandelt
+        if poll_idle_s >= c.max_gap_s:
+            raise ValueError(f"POLL_IDLE_S/POLL_MAX_S={poll_idle_s} muss kleiner als MAX_GAP_S={c.max_gap_s} (Kanal {c.name}) sein")
+    runtime = env_str("RUNTIME", "threads")
+    if runtime not in ("threads", "asyncio"):
+        raise ValueError(f"RUNTIME unbekannt: {runtime} (threads | asyncio)")
+    if runtime == "asyncio":
+        for c in chans:
+            if c.shelly_batch != "off" or c.reconcile_s > 0:
+                raise ValueError(f"RUNTIME=asyncio unterstützt SHELLY_BATCH/SHELLY_RECONCILE_S nicht (Kanal {c.name})")
+    log_level = env_str("LOG_LEVEL", "INFO")
+    if not isinstance(logging.getLevelName(log_level.upper()), int):
+        raise ValueError(f"LOG_LEVEL unbekannt: {log_level}")
+    log_format = env_str("LOG_FORMAT", "text")
+    if log_format not in ("text", "json"):
+        raise ValueError(f"LOG_FORMAT unbekannt: {log_format} (text | json)")
+    counter_push_url = env_str("COUNTER_PUSH_URL", "")
+    if counter_push_url:
+        u = urlsplit(counter_push_url)
+        if u.scheme not in ("udp", "http", "https") or not u.hostname or (u.scheme == "udp" and not u.port):
+            raise ValueError(f"COUNTER_PUSH_URL: udp://host:port oder http(s)://... erwartet ({counter_push_url})")
+    counter_push_s = env_float("COUNTER_PUSH_S", 1.0)
+    if counter_push_s <= 0:
+        raise ValueError(f"COUNTER_PUSH_S muss > 0 sein ({counter_push_s})")
+    return EngineConfig(
+        modbus=ModbusConfig.from_env(),
+        signals=signals,
+        channels=chans,
+        poll_interval_s=poll_interval_s,
+        poll_max_s=poll_max_s,
+        poll_idle_s=poll_idle_s,
+        poll_change_w=env_int("POLL_CHANGE_W", 100),
+        log_every_s=env_float("LOG_EVERY_S", 5.0),
+        state_dir=env_str("STATE_DIR", os.getenv("STATE_DIRECTORY", "/var/lib/pv-tools")),
+        state_hold_max_s=env_float("STATE_HOLD_MAX_S", 60.0),
+        state_sync_s=env_float("STATE_SYNC_S", 10.0),
+        metrics_bind=env_str("METRICS_BIND", "0.0.0.0"),
+        metrics_port=env_int("METRICS_PORT", 0),
+        log_level=log_level,
+        log_format=log_format,
+        log_rate_burst=env_int("LOG_RATE_BURST", 10),
+        log_rate_window_s=env_float("LOG_RATE_WINDOW_S", 60.0),
+        runtime=runtime,
+        record_dir=env_str("RECORD_DIR", "off"),
+        record_size_mb=env_float("RECORD_SIZE_MB", 32.0),
+        proxy_bind=env_str("MODBUS_PROXY_BIND", "0.0.0.0"),
+        proxy_port=env_int("MODBUS_PROXY_PORT", 0),
+        proxy_max_age_s=env_float("MODBUS_PROXY_MAX_AGE_S", 1.0),
+        counter_push_url=counter_push_url,
+        counter_push_s=counter_push_s,
+    )
@@ -0,0 +1,219 @@
+"""
+Zählerstand-Ausgang (COUNTER_PUSH_URL): je Kanal den monoton steigenden Zählerstand (Wh)
+und die aktuelle Leistung pushen, neben den Relais-Pulsen.
+
+Für Empfänger, die einen Zähler statt Impulsen verarbeiten können: kein Pulsraten-Limit
+(MIN_TRIGGER_INTERVAL_S), kein HTTP-Request je Puls, sondern eine Nachricht für alle Kanäle
+alle COUNTER_PUSH_S. Der Zählerstand ist die integrierte Energie des Kanals (Channel.meter_wns),
+wird mit dem Kanal-Zustand gespeichert und läuft über Neustarts und IMP_PER_KWH-Änderungen
+monoton weiter. Die Pulse stehen zum Gegenprüfen mit drin: wh - pulses * wh_per_pulse = Rest + Queue
+(solange IMP_PER_KWH gleich bleibt).
+
+  udp://host:port        ein JSON-Datagramm je Push (fire and forget)
+  http://host:port/pfad  JSON per POST über eine keep-alive-Verbindung, Antwort muss 2xx sein
+                         (eigene requests-Session, nicht die Shelly-Transports: deren Latenz/Reconnects
+                         bleiben reine Relais-Werte; RUNTIME=asyncio schickt sie per to_thread)
+
+Nachricht (seq zählt je Prozessstart ab 1, Lücken = verlorene Datagramme):
+  {"seq": 42, "ts": 1760000000.123, "channels": {"pv": {"wh": 1234.5678, "w": 5230,
+   "pulses": 1234, "wh_per_pulse": 1.0}, ...}}
+
+Empfänger zum Testen: python3 -m bench.counter_sink --udp 9999 (bzw. --http 9999).
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .channel import Channel
+
+log = logging.getLogger(__name__)
+
+# Connect-/Read-Timeout je HTTP-Push (höchstens ein Push-Intervall)
+PUSH_TIMEOUT_S = 2.0
+
+
+def _encode(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode()
+
+
+class CounterPush:
+    """Nachricht für alle Kanäle bauen und Ergebnis zählen; gesendet wird im Thread bzw. Task."""
+
+    def __init__(self, url: str, every_s: float, chans: Sequence[Channel]):
+        u = urlsplit(url)
+        self.udp: Optional[Tuple[str, int]] = (u.hostname or "", u.port or 0) if u.scheme == "udp" else None
+        self.url = url
+        self.every_ns = int(every_s * 1e9)
+        self.timeout = min(PUSH_TIMEOUT_S, every_s)
+        self.chans = chans  # Liste der Engine, nach einem Reload dieselbe mit neuen Kanälen
+        self.seq = 0
+        self.counts = {"ok": 0, "error": 0}
+
+    def message(self) -> dict:
+        self.seq += 1
+        return {
+            "seq": self.seq,
+            "ts": round(time.time(), 3),
+            "channels": {
+                c.name: {
+                    "wh": round(c.meter_wns / 3.6e12, 4),
+                    "w": c.power_w,
+                    "pulses": c.pulses_sent,
+                    "wh_per_pulse": c.cfg.wns_per_pulse / 3.6e12,
+                }
+                for c in self.chans
+            },
+        }
+
+    def next_deadline(self, deadline_ns: int) -> int:
+        """Nächster Push im festen Raster; hing ein Push länger, wird nicht nachgeholt."""
+        deadline_ns += self.every_ns
+        return max(deadline_ns, time.monotonic_ns())
+
+    def ok(self) -> None:
+        self.counts["ok"] += 1
+
+    def failed(self, e: object) -> None:
+        self.counts["error"] += 1
+        log.warning("Warn: Zählerstand-Push an %s fehlgeschlagen (%s)", self.url, e, extra={"key": "counter.push"})
+
+
+class HttpPush:
+    """POST über eine eigene keep-alive-Session (eine Verbindung, keine Retries: der nächste Push kommt ohnehin)."""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, msg: dict) -> None:
+        r = self.session.post(self.url, data=_encode(msg), timeout=self.timeout,
+                              headers={"Content-Type": "application/json"})
+        if not 200 <= r.status_code < 300:
+            raise ConnectionError(f"HTTP {r.status_code}")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class CounterPusher:
+    """RUNTIME=threads: Push-Thread, UDP über einen verbundenen Socket, HTTP über HttpPush."""
+
+    def __init__(self, push: CounterPush):
+        self.push = push
+        self._stop = threading.Event()
+        self._sock: Optional[socket.socket] = None
+        self._http = None if push.udp else HttpPush(push.url, push.timeout)
+        self._thread = threading.Thread(target=self._run, name="counter-push", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _send(self, msg: dict) -> None:
+        if self._http is not None:
+            self._http.send(msg)
+            return
+        if self._sock is None:
+            family, kind, proto, _, addr = socket.getaddrinfo(*self.push.udp, type=socket.SOCK_DGRAM)[0]
+            self._sock = socket.socket(family, kind, proto)
+            self._sock.connect(addr)
+        self._sock.send(_encode(msg))
+
+    def _run(self) -> None:
+        deadline = time.monotonic_ns()
+        while not self._stop.wait(max(0, deadline - time.monotonic_ns()) / 1e9):
+            try:
+                self._send(self.push.message())
+                self.push.ok()
+            except Exception as e:
+                self.push.failed(e)
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            deadline = self.push.next_deadline(deadline)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(self.push.timeout)
+        if self._sock is not None:
+            self._sock.close()
+        if self._http is not None:
+            self._http.close()
+
+
+def start_counter_push(url: str, every_s: float, chans: Sequence[Channel]) -> Optional[CounterPusher]:
+    """Push-Thread starten; None wenn aus (COUNTER_PUSH_URL leer)."""
+    if not url:
+        return None
+    pusher = CounterPusher(CounterPush(url, every_s, chans))
+    pusher.start()
+    log.info("Zählerstand-Push: %s alle %.1fs (%d Kanäle)", url, every_s, len(chans))
+    return pusher
+
+
+class AsyncCounterPusher:
+    """RUNTIME=asyncio: Push-Task, UDP über einen Datagram-Endpoint, HTTP über HttpPush in einem Worker-Thread."""
+
+    def __init__(self, push: CounterPush):
+        self.push = push
+        self._udp: Optional[asyncio.DatagramTransport] = None
+        self._http = None if push.udp else HttpPush(push.url, push.timeout)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="counter-push")
+
+    async def _send(self, msg: dict) -> None:
+        if self._http is not None:
+            await asyncio.to_thread(self._http.send, msg)
+            return
+        if self._udp is None:
+            self._udp, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=self.push.udp
+            )
+        self._udp.sendto(_encode(msg))
+
+    async def _run(self) -> None:
+        deadline = time.monotonic_ns()
+        while True:
+            await asyncio.sleep(max(0, deadline - time.monotonic_ns()) / 1e9)
+            try:
+                await self._send(self.push.message())
+                self.push.ok()
+            except Exception as e:
+                self.push.failed(e)
+                self._close_udp()
+            deadline = self.push.next_deadline(deadline)
+
+    def _close_udp(self) -> None:
+        if self._udp is not None:
+            self._udp.close()
+            self._udp = None
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self._close_udp()
+        if self._http is not None:
+            self._http.close()
+
+
+def start_counter_push_async(url: str, every_s: float, chans: Sequence[Channel]) -> Optional[AsyncCounterPusher]:
+    """Wie start_counter_push, aber als Task im laufenden Event-Loop."""
+    if not url:
+        return None
+    pusher = AsyncCounterPusher(CounterPush(url, every_s, chans))
+    pusher.start()
+    log.info("Zählerstand-Push: %s alle %.1fs (%d Kanäle)", url, every_s, len(chans))
+    return pusher
@@ -0,0 +1,542 @@
+"""
+Pulse-Emitter: eigener Thread pro Kanal, arbeitet die Pulsqueue ab.
+
+Der Poll-Loop legt nur Pulse in die Queue (`submit`), wartet aber nie auf HTTP.
+Wann gesendet wird, entscheidet der PulseScheduler (geplante Deadlines statt Bursts).
+
+Ein Kanal kann mehrere Ausgänge haben (mehrere Relais-Indizes und/oder Shellys).
+Jeder Ausgang hat einen eigenen Sende-Thread und eine eigene HTTP-Verbindung, der
+Emitter verteilt die fälligen Pulse (round_robin | least_loaded). Schlägt ein Trigger
+trotz Retries fehl, fliegt der Ausgang mit wachsendem Backoff aus der Rotation und der
+Puls geht an den nächsten. Langsame oder hängende Shellys verzögern damit nur ihre
+eigenen Pulse, nicht das Sampling.
+
+Mit SHELLY_BATCH=script (Gen2) gehen alle Pulse, deren Deadline innerhalb von
+SHELLY_BATCH_WINDOW_S nach dem ersten fälligen liegt, als ein Request an das
+Pulse-Script auf dem Shelly (n Pulse im Abstand T), siehe shelly_script.
+
+Mit SHELLY_RECONCILE_S liest jeder Ausgang in Sendepausen den Einschalt-Zähler des
+Pulse-Scripts und gleicht ihn gegen die als gesendet gezählten Pulse ab: fehlende
+Pulse (200 OK, aber nicht geschaltet) gehen zurück in die Queue, zusätzliche
+(Timeout nach dem Schalten + Retry) werden vom Energie-Rest abgezogen.
+
+Mit RUNTIME=asyncio laufen Emitter und Ausgänge als Tasks im Event-Loop
+(AsyncPulseEmitter/AsyncOutput), Verteilung und Rückmeldung sind dieselben.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .config import ChannelConfig
+from .scheduler import JitterStats, PulseScheduler
+from .shelly import AsyncShellyTransport, ShellyTransport, shelly_trigger_pulse, shelly_trigger_pulse_async
+from .shelly_script import batch_url, ensure_script, forget, read_count, split_switch_url
+
+# Nach einem Shelly-Fehler so lange keinen neuen Versuch auf diesem Ausgang (Puls bleibt in der Queue),
+# bei weiteren Fehlern in Folge verdoppelt bis OUTPUT_MAX_BACKOFF_S
+SHELLY_ERROR_BACKOFF_S = 1.0
+OUTPUT_MAX_BACKOFF_S = 30.0
+# Abgleich erst so lange nach dem letzten Puls des Ausgangs (Status-Handler auf dem Shelly hinkt etwas nach)
+RECONCILE_SETTLE_S = 0.3
+
+log = logging.getLogger(__name__)
+
+
+class Output:
+    """Ein Shelly-Ausgang: eigener Sende-Thread, Relais-Mindestabstand, Health."""
+
+    def __init__(
+        self, index: int, url: str, cfg: ChannelConfig, lock: threading.Lock, stop: threading.Event,
+        on_done: Callable[["Output", List[int], int, int, Optional[Exception]], None],
+        on_count: Callable[["Output", Optional[Tuple[int, int]], Optional[Exception]], None],
+    ):
+        self.index = index
+        self.url = url
+        u = urlsplit(url)
+        self.label = f"{u.netloc}{u.path}"  # z.B. 192.168.41.124/relay/0
+        self.batch = cfg.shelly_batch == "script"
+        if u.path == "/rpc/Switch.Set":
+            self.base, self.relay_idx = split_switch_url(url)
+            self.label += f"?id={self.relay_idx}"
+        self.cfg = cfg
+        self.transport = self._make_transport()
+        self.min_interval_ns = int(cfg.min_trigger_interval_s * 1e9)
+        self.last_sent_ns = -self.min_interval_ns
+        self.down_until_ns = 0
+        self.fail_streak = 0
+        self.sent = 0
+        self.failures = 0
+        self.busy = False
+        # Abgleich: Zähler-Stand (Einschaltungen, sent) beim letzten Abgleich
+        self.reconcile_ns = int(cfg.reconcile_s * 1e9)
+        self.next_reconcile_ns = 0
+        self.count_base: Optional[Tuple[int, int]] = None
+
+        # gemeinsamer Lock mit dem Emitter, eigene Condition zum Aufwecken
+        self._cond = threading.Condition(lock)
+        self._stop = stop
+        self._job: Optional[Tuple[List[int], int]] = None  # Deadlines der zugewiesenen Pulse, Abstand (ns)
+        self._on_done = on_done
+        self._on_count = on_count
+        self._thread = threading.Thread(target=self._run, name=f"output-{cfg.name}-{index}", daemon=True)
+
+    def _make_transport(self):
+        return ShellyTransport(
+            self.cfg.http_timeout, keepalive=self.cfg.shelly_keepalive, keepwarm_s=self.cfg.shelly_keepwarm_s,
+            name=f"{self.cfg.name}#{self.index}",
+        )
+
+    def healthy(self, now_ns: int) -> bool:
+        return now_ns >= self.down_until_ns
+
+    def ready_at(self) -> int:
+        """Frühester Sendezeitpunkt (Relais-Mindestabstand, Backoff nach Fehler)."""
+        return max(self.last_sent_ns + self.min_interval_ns, self.down_until_ns)
+
+    def assign(self, deadlines_ns: List[int], interval_ns: int) -> None:
+        """Puls(e) zuweisen (mit gehaltenem Lock), mehrere nur im Batch-Betrieb."""
+        self.busy = True
+        self._job = (deadlines_ns, interval_ns)
+        self._cond.notify()
+
+    def mark_failed(self, now_ns: int) -> float:
+        """Aus der Rotation nehmen (mit gehaltenem Lock), gibt den Backoff in s zurück."""
+        self.failures += 1
+        self.fail_streak += 1
+        backoff = min(OUTPUT_MAX_BACKOFF_S, SHELLY_ERROR_BACKOFF_S * 2 ** (self.fail_streak - 1))
+        self.down_until_ns = now_ns + int(backoff * 1e9)
+        return backoff
+
+    def mark_sent(self, n: int, last_ns: int) -> None:
+        """n Pulse gesendet, der letzte (bei Batches auf dem Gerät) um last_ns."""
+        self.sent += n
+        self.last_sent_ns = last_ns
+        self.fail_streak = 0
+        self.down_until_ns = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify()
+
+    def join(self, timeout: float) -> None:
+        self._thread.join(timeout)
+
+    def _reconcile_due_in(self) -> Optional[float]:
+        if self.reconcile_ns <= 0:
+            return None
+        return (self.next_reconcile_ns - time.monotonic_ns()) / 1e9
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._job is None and not self._stop.is_set():
+                    due_in = [t for t in (self.transport.warm_due_in(), self._reconcile_due_in()) if t is not None]
+                    wait = min(due_in) if due_in else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stop.is_set():
+                    break
+                job, self._job = self._job, None
+                due_in = self._reconcile_due_in()
+                reconcile = job is None and due_in is not None and due_in <= 0
+                if reconcile:
+                    self.busy = True  # keine Pulse auf diesen Ausgang, solange gezählt wird
+            if reconcile:
+                self._reconcile()
+                continue
+            if job is None:
+                self.transport.keep_warm()
+                continue
+
+            deadlines, interval_ns = job
+            sent_ns = time.monotonic_ns()
+            err: Optional[Exception] = None
+            try:
+                shelly_trigger_pulse(
+                    self.transport, self._url(len(deadlines), interval_ns),
+                    retries=self.cfg.shelly_retries, retry_delay_s=self.cfg.retry_delay_s,
+                )
+            except Exception as e:
+                err = e
+                if self.batch:
+                    forget(self.base)
+            self._on_done(self, deadlines, interval_ns, sent_ns, err)
+        self.transport.close()
+
+    def _reconcile(self) -> None:
+        """Einschalt-Zähler lesen (eigener Thread, Ausgang ist dabei belegt)."""
+        settle_ns = self.last_sent_ns + int(RECONCILE_SETTLE_S * 1e9) - time.monotonic_ns()
+        if settle_ns > 0:
+            time.sleep(settle_ns / 1e9)
+        count: Optional[Tuple[int, int]] = None
+        err: Optional[Exception] = None
+        try:
+            count = read_count(self.transport, self.base, ensure_script(self.transport, self.base), self.relay_idx)
+        except Exception as e:
+            err = e
+            forget(self.base)
+        self.next_reconcile_ns = time.monotonic_ns() + self.reconcile_ns
+        self._on_count(self, count, err)
+
+    def _url(self, n: int, interval_ns: int) -> str:
+        if not self.batch:
+            return self.url
+        script_id = ensure_script(self.transport, self.base)
+        return batch_url(self.base, script_id, self.relay_idx, n, interval_ns // 1_000_000)
+
+
+class AsyncOutput(Output):
+    """Ausgang als Task im Event-Loop (RUNTIME=asyncio), ohne Batch/Abgleich."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _make_transport(self):
+        return AsyncShellyTransport(
+            self.cfg.http_timeout, keepalive=self.cfg.shelly_keepalive, keepwarm_s=self.cfg.shelly_keepwarm_s,
+            name=f"{self.cfg.name}#{self.index}",
+        )
+
+    def assign(self, deadlines_ns: List[int], interval_ns: int) -> None:
+        super().assign(deadlines_ns, interval_ns)
+        self._event.set()
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(
+            self._arun(), name=f"output-{self.cfg.name}-{self.index}"
+        )
+
+    def wake(self) -> None:
+        self._event.set()
+
+    async def _arun(self) -> None:
+        try:
+            while True:
+                # ein Thread: zwischen Prüfen und clear() kann kein assign() dazwischenkommen
+                job, self._job = self._job, None
+                if job is None:
+                    wait = self.transport.warm_due_in()
+                    if wait is None or wait > 0:
+                        self._event.clear()
+                        try:
+                            await asyncio.wait_for(self._event.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+                    await self.transport.keep_warm()
+                    continue
+
+                deadlines, interval_ns = job
+                sent_ns = time.monotonic_ns()
+                err: Optional[Exception] = None
+                try:
+                    await shelly_trigger_pulse_async(
+                        self.transport, self.url,
+                        retries=self.cfg.shelly_retries, retry_delay_s=self.cfg.retry_delay_s,
+                    )
+                except Exception as e:
+                    err = e
+                self._on_done(self, deadlines, interval_ns, sent_ns, err)
+        finally:
+            self.transport.close()
+
+
+class PulseEmitter:
+    output_cls = Output
+
+    def __init__(
+        self, cfg: ChannelConfig, describe: Callable[[], str], on_sent: Optional[Callable[[], None]] = None,
+        on_extra: Optional[Callable[[int], None]] = None,
+    ):
+        self.cfg = cfg
+        self.name = cfg.name
+        self.describe = describe  # Kontext fürs Puls-Log (Leistung/Signale), vom Poll-Thread gepflegt
+        self.on_sent = on_sent  # nach jedem gesendeten Puls (Checkpoint)
+        self.on_extra = on_extra  # Abgleich: n Pulse mehr geschaltet als gezählt (Energie abziehen)
+        # optional (Recorder): (Ausgang, n, gesendet um ns, Abstand ns, gesendet gesamt, Queue) je Trigger
+        self.on_pulses: Optional[Callable[[Output, int, int, int, int, int], None]] = None
+        # optional (Recorder): (Ausgang, Abgleich-Differenz, gesendet gesamt)
+        self.on_adjust: Optional[Callable[[Output, int, int], None]] = None
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        n = len(cfg.shelly_on_urls)
+        # Mindestabstand gilt pro Ausgang; über alle Ausgänge zusammen entsprechend dichter
+        self.scheduler = PulseScheduler(
+            delay_ns=int(cfg.pulse_delay_s * 1e9),
+            min_gap_ns=int(max(cfg.min_trigger_interval_s / n, 1.0 / max(0.001, cfg.max_pulse_rate_hz)) * 1e9),
+        )
+        self.jitter = JitterStats()
+        self.pulses_sent = 0
+        self.failures = 0  # Trigger nach allen Retries fehlgeschlagen (alle Ausgänge)
+        self.in_flight = 0
+        # Abgleich (SHELLY_RECONCILE_S): geschaltet, aber nicht gezählt / gezählt, aber nicht geschaltet
+        self.reconciled_extra = 0
+        self.reconciled_missing = 0
+        self.outputs: List[Output] = [
+            self.output_cls(i, url, cfg, self._lock, self._stop, self._done, self._counted)
+            for i, url in enumerate(cfg.shelly_on_urls)
+        ]
+        self._rr = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"emitter-{cfg.name}", daemon=True)
+
+    @property
+    def queue(self) -> int:
+        """Noch nicht gesendete Pulse (inkl. gerade unterwegs)."""
+        return len(self.scheduler) + self.in_flight
+
+    def start(self) -> None:
+        for o in self.outputs:
+            o.start()
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
+        for o in self.outputs:
+            o.wake()
+        for o in self.outputs:
+            o.join(timeout)
+
+    def submit(self, due_ns: Iterable[int]) -> None:
+        """Pulse mit ihren Fälligkeitszeitpunkten einreihen (aus dem Poll-Thread, blockiert nicht)."""
+        with self._cond:
+            self.scheduler.add(due_ns)
+            self._cond.notify()
+
+    def _pick(self, now_ns: int) -> Tuple[Optional[Output], Optional[int]]:
+        """
+        (freier Ausgang, der jetzt senden kann | None, frühester Zeitpunkt, zu dem einer kann).
+        (None, None): alle Ausgänge beschäftigt.
+        """
+        idle = [o for o in self.outputs if not o.busy]
+        if not idle:
+            return None, None
+        earliest = min(o.ready_at() for o in idle)
+        ready = [o for o in idle if o.ready_at() <= now_ns]
+        if not ready:
+            return None, earliest
+        if self.cfg.output_dispatch == "least_loaded":
+            # am längsten ruhender Ausgang, bei Gleichstand der mit den wenigsten Pulsen
+            return min(ready, key=lambda o: (o.last_sent_ns, o.sent)), earliest
+        n = len(self.outputs)
+        for k in range(n):
+            o = self.outputs[(self._rr + k) % n]
+            if o in ready:
+                return o, earliest
+        return None, earliest
+
+    def _run(self) -> None:
+        """Fällige Pulse an freie Ausgänge verteilen."""
+        with self._cond:
+            while not self._stop.is_set():
+                wait_ns = self._dispatch(time.monotonic_ns())
+                if wait_ns != 0:
+                    self._cond.wait(None if wait_ns is None else wait_ns / 1e9)
+
+    def _dispatch(self, now: int) -> Optional[int]:
+        """
+        Einen fälligen Puls an einen freien Ausgang geben (mit gehaltenem Lock).
+        Gibt die Wartezeit bis zum nächsten Versuch in ns zurück, 0 = sofort, None = bis aufgeweckt.
+        """
+        deadline = self.scheduler.next_deadline()
+        if deadline is None:
+            return None
+        out, ready_ns = self._pick(now)
+        if ready_ns is None:
+            return None  # alle Ausgänge senden gerade, _done weckt auf
+        at = max(deadline, ready_ns)
+        if at > now or out is None:
+            return max(0, at - now)
+        self._rr = (out.index + 1) % len(self.outputs)
+        deadlines = [self.scheduler.pop(now)]
+        interval_ns = out.min_interval_ns
+        if out.batch:
+            interval_ns = self._collect_batch(deadlines, now, out.min_interval_ns)
+        self.in_flight += len(deadlines)
+        out.assign(deadlines, interval_ns)
+        return 0
+
+    def _collect_batch(self, deadlines: List[int], now_ns: int, min_interval_ns: int) -> int:
+        """
+        Alle Pulse mit Deadline bis SHELLY_BATCH_WINDOW_S nach dem ersten an `deadlines` anhängen,
+        gibt den Pulsabstand auf dem Gerät zurück (ganze ms, mindestens der Relais-Mindestabstand).
+        """
+        horizon = deadlines[0] + int(self.cfg.batch_window_s * 1e9)
+        while True:
+            nxt = self.scheduler.next_deadline()
+            if nxt is None or nxt > horizon:
+                break
+            deadlines.append(self.scheduler.pop(now_ns))
+        interval_ns = min_interval_ns
+        if len(deadlines) > 1:
+            interval_ns = max(interval_ns, (deadlines[-1] - deadlines[0]) // (len(deadlines) - 1))
+        return -(-interval_ns // 1_000_000) * 1_000_000
+
+    def _done(
+        self, out: Output, deadlines_ns: List[int], interval_ns: int, sent_ns: int, err: Optional[Exception]
+    ) -> None:
+        """Rückmeldung eines Ausgangs (aus dessen Sende-Thread)."""
+        n = len(deadlines_ns)
+        with self._cond:
+            out.busy = False
+            self.in_flight -= n
+            if err is not None:
+                self.failures += 1
+                backoff = out.mark_failed(time.monotonic_ns())
+                # Pulse zurück an den Anfang der Queue, nächster freier Ausgang übernimmt
+                self.scheduler.requeue(time.monotonic_ns(), n)
+            else:
+                # im Batch erzeugt das Gerät die Pulse im Abstand interval_ns ab Empfang
+                for i, d in enumerate(deadlines_ns):
+                    self.jitter.record(d, sent_ns + i * interval_ns)
+                out.mark_sent(n, sent_ns + (n - 1) * interval_ns)
+                self.pulses_sent += n
+            sent, queue = self.pulses_sent, self.queue
+            self._cond.notify()
+
+        if err is not None:
+            log.warning(
+                "[%s] Shelly Fehler%s: %s (Queue bleibt, Ausgang %.0fs aus der Rotation)",
+                self.name, self._out_suffix(out), err, backoff,
+                extra={"key": f"shelly.{self.name}.{out.index}", "fields": {"channel": self.name, "output": out.label}},
+            )
+            return
+        if self.on_sent is not None:
+            self.on_sent()
+        if self.on_pulses is not None:
+            self.on_pulses(out, n, sent_ns, interval_ns, sent, queue)
+        # bei hoher Pulsrate gedrosselt (LOG_RATE_BURST), Zähler stehen im Statuslog
+        pulse = f"#{sent}" if n == 1 else f"#{sent - n + 1}-{sent} (Batch {n}x{interval_ns // 1_000_000}ms)"
+        log.info(
+            "[%s] PULSE %s%s | %s | queue=%d", self.name, pulse, self._out_suffix(out), self.describe(), queue,
+            extra={
+                "key": f"pulse.{self.name}",
+                "fields": {"channel": self.name, "pulse": sent, "batch": n, "queue": queue, "output": out.label},
+            },
+        )
+
+    def _counted(self, out: Output, count: Optional[Tuple[int, int]], err: Optional[Exception]) -> None:
+        """Einschalt-Zähler eines Ausgangs gegen dessen gesendete Pulse abgleichen (aus dessen Thread)."""
+        diff = 0
+        with self._cond:
+            out.busy = False
+            self._cond.notify()
+            if count is not None:
+                ons, queued = count
+                if queued:
+                    pass  # Batch läuft noch auf dem Gerät, nächstes Mal
+                elif out.count_base is None or ons < out.count_base[0]:
+                    # erster Abgleich oder Script neu gestartet (Reboot): nur neue Basis
+                    out.count_base = (ons, out.sent)
+                else:
+                    diff = (ons - out.count_base[0]) - (out.sent - out.count_base[1])
+                    out.sent += diff
+                    self.pulses_sent += diff
+                    if diff < 0:
+                        # gezählt, aber nicht geschaltet -> nochmal senden
+                        self.reconciled_missing -= diff
+                        self.scheduler.requeue(time.monotonic_ns(), -diff)
+                    else:
+                        self.reconciled_extra += diff
+                    out.count_base = (ons, out.sent)
+
+        if err is not None:
+            log.warning(
+                "[%s] Abgleich%s fehlgeschlagen: %s", self.name, self._out_suffix(out), err,
+                extra={"key": f"reconcile.{self.name}.{out.index}", "fields": {"channel": self.name, "output": out.label}},
+            )
+            return
+        if diff == 0:
+            return
+        if diff > 0 and self.on_extra is not None:
+            self.on_extra(diff)
+        if self.on_adjust is not None:
+            self.on_adjust(out, diff, self.pulses_sent)
+        log.warning(
+            "[%s] Abgleich%s: Shelly hat %d Pulse %s geschaltet als gezählt -> %s", self.name, self._out_suffix(out),
+            abs(diff), "mehr" if diff > 0 else "weniger", "Energie-Rest korrigiert" if diff > 0 else "neu eingereiht",
+            extra={"fields": {"channel": self.name, "output": out.label, "diff": diff}},
+        )
+        if self.on_sent is not None:
+            self.on_sent()
+
+    def _out_suffix(self, out: Output) -> str:
+        return f" -> {out.label}" if len(self.outputs) > 1 else ""
+
+    def timing_summary(self) -> str:
+        """Puls-Timing + Shelly-Latenz seit dem letzten Aufruf (für den Statuslog), setzt zurück."""
+        with self._cond:
+            parts = [self.jitter.summary()]
+            if self.reconciled_extra or self.reconciled_missing:
+                parts.append(f"reconcile +{self.reconciled_extra}/-{self.reconciled_missing}")
+            now = time.monotonic_ns()
+            if len(self.outputs) > 1:
+                ok = sum(o.healthy(now) for o in self.outputs)
+                parts.append(f"outputs {ok}/{len(self.outputs)} ok")
+            for o in self.outputs:
+                s = o.transport.summary()
+                if len(self.outputs) > 1:
+                    s = f"{o.label}: {s}" + ("" if o.healthy(now) else " DOWN")
+                parts.append(s)
+                o.transport.latency.reset()
+            self.jitter.reset()
+        return " | ".join(parts)
+
+
+class AsyncPulseEmitter(PulseEmitter):
+    """
+    PulseEmitter für RUNTIME=asyncio: Verteilung und Ausgänge als Tasks im Event-Loop.
+    Der Lock bleibt (ist dann unbestritten), so teilen sich beide Varianten _pick/_done/_counted.
+    """
+
+    output_cls = AsyncOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        for o in self.outputs:
+            o.start()
+        self._task = asyncio.get_running_loop().create_task(self._arun(), name=f"emitter-{self.name}")
+
+    async def aclose(self) -> None:
+        tasks = [t for t in [self._task] + [o._task for o in self.outputs] if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, due_ns: Iterable[int]) -> None:
+        super().submit(due_ns)
+        self._wake.set()
+
+    def _done(self, *args) -> None:
+        super()._done(*args)
+        self._wake.set()
+
+    async def _arun(self) -> None:
+        while True:
+            with self._lock:
+                wait_ns = self._dispatch(time.monotonic_ns())
+            if wait_ns == 0:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if wait_ns is None else wait_ns / 1e9)
+            except asyncio.TimeoutError:
+                pass
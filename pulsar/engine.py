@@ -0,0 +1,428 @@
+"""
+Multi-Kanal-Engine: ein Modbus-Client, ein Poll-Zyklus, beliebig viele Pulskanäle.
+
+Der Poll-Loop wartet nie auf HTTP; jeder Kanal hat seinen eigenen Emitter-Thread.
+Mit RUNTIME=asyncio läuft stattdessen alles in einem Event-Loop (siehe aio).
+"""
+import argparse
+import cProfile
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type, Union
+
+from .channel import Channel
+from .clock import Ticker
+from .config import EngineConfig, load_engine_config
+from .counter import start_counter_push
+from .emitter import PulseEmitter
+from .log import get_logger, setup_logging, shutdown_logging
+from .metrics import PulserMetrics, start_metrics
+from .modbus import Backoff, Poller, SignalSample, make_reader
+from .profiler import CONNECT, INTEGRATE, LOG, READ, RECORD, SYNC, CycleProfiler
+from .proxy import ModbusProxy, start_proxy
+from .recorder import Recorder, open_recorder
+from .reload import STOP_TIMEOUT_S, Plan, Reloader, adopt_channels
+from .sampling import PollController
+from .state import StateStore, open_store
+from .table import ChannelTable
+from .stats import LatencyStats
+
+log = logging.getLogger(__name__)
+
+
+def run(
+    channels: Optional[Tuple[str, ...]] = None, cfg: Optional[EngineConfig] = None, argv: Optional[List[str]] = None
+) -> None:
+    """
+    Einstieg der *_pulser.py. Kommandozeile: --profile FILE schreibt beim Beenden ein
+    cProfile/pstats-Profil (RUNTIME=threads: nur der Poll-Loop, asyncio: alles);
+    --env-file FILE lädt die Konfig aus FILE und bei SIGHUP neu (siehe reload).
+    """
+    ap = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]), description="Venus/Modbus -> Shelly-Impulse")
+    ap.add_argument("--profile", metavar="FILE", help="cProfile beim Beenden nach FILE (python3 -m pstats FILE)")
+    ap.add_argument("--env-file", metavar="FILE", help="Konfig (KEY=VAL), bei SIGHUP neu gelesen")
+    args = ap.parse_args(sys.argv[1:] if argv is None else argv)
+    reloader = Reloader(args.env_file, channels)
+    if cfg is None:
+        reloader.load_env()
+        cfg = load_engine_config(channels)
+    setup_logging(cfg.log_level, cfg.log_format, cfg.log_rate_burst, cfg.log_rate_window_s)
+
+    prof = cProfile.Profile() if args.profile else None
+    if prof is not None:
+        prof.enable()
+    try:
+        if cfg.runtime == "asyncio":
+            from . import aio  # importiert engine.Cycle
+
+            aio.run(cfg, reloader)
+        else:
+            _run_threads(cfg, reloader)
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(args.profile)
+            log.info("Profil geschrieben: %s (python3 -m pstats %s)", args.profile, args.profile)
+        shutdown_logging()
+
+
+def _run_threads(cfg: EngineConfig, reloader: Reloader) -> None:
+    reader = make_reader(cfg.modbus)
+
+    labels = {name: s.label for name, s in cfg.signals.items()}
+    table = ChannelTable(cfg.channels, cfg.used_signals())
+    chans = [
+        Channel(c, labels, table, i, store=open_store(cfg.state_dir, c.name)) for i, c in enumerate(cfg.channels)
+    ]
+    poller = Poller(
+        reader, cfg.used_signals(), cfg.modbus.merge_gap, cfg.modbus.backoff_min_s, cfg.modbus.backoff_max_s
+    )
+    metrics = start_metrics(cfg.metrics_bind, cfg.metrics_port)
+    if metrics is not None:
+        poller.on_read = metrics.observe_modbus
+        metrics.track_channels(chans)
+    proxy = start_proxy(cfg.proxy_bind, cfg.proxy_port, cfg.proxy_max_age_s, cfg.modbus)
+    if proxy is not None:
+        poller.on_regs = proxy.cache.store
+        if metrics is not None:
+            metrics.track_proxy(proxy)
+    recorder = open_recorder(cfg.record_dir, cfg.record_size_mb, poller.signals, cfg.channels)
+    if recorder is not None:
+        recorder.track_channels(chans)
+    for ch in chans:
+        ch.restore(cfg.state_hold_max_s)
+        ch.emitter.start()
+    # Zählerstand-Ausgang neben den Pulsen (COUNTER_PUSH_URL)
+    counter = start_counter_push(cfg.counter_push_url, cfg.counter_push_s, chans)
+    if counter is not None and metrics is not None:
+        metrics.track_counter(counter.push)
+
+    cycle = Cycle(cfg, poller, chans, metrics, recorder)
+    # systemd stop/restart: sauber beenden, damit der letzte Zustand auf der Platte ist
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # kill -USR1: Profil + Zustand ins Journal, ausgegeben zwischen zwei Zyklen
+    signal.signal(signal.SIGUSR1, lambda *_: cycle.request_dump())
+    # systemctl reload (SIGHUP): Konfig neu laden, übernommen zwischen zwei Zyklen
+    signal.signal(signal.SIGHUP, lambda *_: cycle.request_reload())
+
+    log.info(
+        "Pulser gestartet: Venus=%s:%d | Kanäle=%s | Signale=%s (%s, %s)",
+        cfg.modbus.host, cfg.modbus.port, ",".join(c.name for c in chans),
+        ",".join(s.name for s in poller.signals), poller.describe(),
+        "pipelined" if cfg.modbus.pipeline else "sequentiell",
+    )
+
+    try:
+        _loop(cycle, lambda: _reload(cycle, reloader, proxy))
+    finally:
+        if counter is not None:
+            counter.close()
+        for ch in cycle.chans:
+            ch.emitter.stop(timeout=1.0)
+            ch.checkpoint()
+            if ch.store is not None:
+                ch.store.close()
+        if cycle.recorder is not None:
+            cycle.recorder.close()
+        if proxy is not None:
+            proxy.close()
+        cycle.poller.reader.close()
+
+
+def _reload(cycle: "Cycle", reloader: Reloader, proxy: Optional[ModbusProxy]) -> None:
+    plan = reloader.plan(cycle.cfg, cycle.chans, PulseEmitter)
+    if plan is None:
+        return
+    if plan.channels:
+        # neue Kanäle stehen schon; laufende Trigger fertig werden lassen, die Queue übernimmt der neue Emitter
+        for ch in cycle.chans:
+            ch.emitter.stop(timeout=STOP_TIMEOUT_S)
+    reader = make_reader(plan.cfg.modbus) if plan.endpoint else None
+    cycle.reconfigure(plan, reader, Poller, proxy)
+
+
+class Cycle:
+    """
+    Verarbeitung eines Poll-Zyklus ohne I/O: Kanäle integrieren, Metrics, Statuslog, nächster Poll.
+    Gemeinsam für den Thread-Loop (_loop) und RUNTIME=asyncio (aio).
+    Integriert wird für alle Kanäle in einem Schritt (ChannelTable), pro Kanal bleibt nur
+    Pulsernte (selten), Überlast-Hysterese und Checkpoint.
+
+    Abgebrochene Zyklen: Reconnect mit Backoff + Jitter (MODBUS_BACKOFF_MIN_S..MAX_S) statt
+    fester Pause; der Ausfall wird der Kanal-Tabelle als Lücke gemeldet (GAP_POLICY) und
+    beim ersten Sample danach mit seiner Dauer geloggt.
+
+    Takt: der nächste Poll wird ab der geplanten Startzeit dieses Zyklus gerechnet (Ticker),
+    die Zyklusdauer verschiebt die Sample-Rate also nicht; verpasste Deadlines werden gezählt.
+
+    Reload (SIGHUP): request_reload() weckt den Loop, der vor dem nächsten Poll reconfigure() anwendet.
+    SIGUSR1 (Thread-Loop): request_dump() weckt ihn ebenso, dump() läuft dort und nicht im Signal-Handler
+    (der Profiler-/Log-Lock kann gerade vom unterbrochenen Loop gehalten sein).
+    """
+
+    def __init__(
+        self, cfg: EngineConfig, poller: Poller, chans: List[Channel], metrics: Optional[PulserMetrics],
+        recorder: Optional[Recorder] = None,
+    ):
+        self.cfg = cfg
+        self.poller = poller
+        self.chans = chans
+        self.table = chans[0].table
+        self.metrics = metrics
+        self.recorder = recorder
+        self.poll_latency = LatencyStats()
+        self.ctl = PollController(cfg.poll_interval_s, cfg.poll_max_s, cfg.poll_idle_s, cfg.poll_change_w)
+        self.ticker = Ticker()
+        self.prof = CycleProfiler()
+        self.prof.track_channels(chans)
+        self.prev_ts_ns: Optional[int] = None
+        self.prev_dt_ns: Optional[int] = None
+        self.last_log = 0.0
+        self.window_start = time.monotonic()  # Zeitfenster für Samples/s im Statuslog
+        self.last_sync = time.monotonic()
+        self.backoff = Backoff(cfg.modbus.backoff_min_s, cfg.modbus.backoff_max_s)
+        self.last_ok_ns: Optional[int] = None  # letztes Sample
+        self.down_since_ns: Optional[int] = None  # letztes Sample vor dem laufenden Ausfall
+        self.outages = 0
+        self.outage_ns = 0
+        self.reload_pending = False
+        self.dump_pending = False
+
+    def request_reload(self) -> None:
+        """Aus dem Signal-Handler: nur vormerken und das Warten auf die Deadline abbrechen."""
+        self.reload_pending = True
+        self.ticker.interrupt()
+
+    def request_dump(self) -> None:
+        """Aus dem Signal-Handler (SIGUSR1): nur vormerken, dump() läuft im Loop."""
+        self.dump_pending = True
+        self.ticker.interrupt()
+
+    def reconfigure(
+        self, plan: Plan, reader, poller_cls: Type[Poller], proxy: Optional[ModbusProxy],
+    ) -> None:
+        """
+        Reload zwischen zwei Zyklen übernehmen (siehe reload). Bei plan.channels müssen die alten Emitter
+        schon gestoppt sein; reader = neue Modbus-Verbindung (nur bei neuem Endpunkt).
+        """
+        cfg = plan.cfg
+        log.info("Reload: %s", ", ".join(plan.changed), extra={"fields": {"changed": list(plan.changed)}})
+        if plan.channels:
+            # gleiche Liste: Metrics-Collector und Loop sehen die neuen Kanäle
+            self.chans[:] = adopt_channels(plan.chans, self.chans, cfg.state_hold_max_s)
+            self.table = self.chans[0].table
+            if self.metrics is not None:
+                self.metrics.track_channels(self.chans)
+            self.prof.track_channels(self.chans)
+            for ch in self.chans:
+                ch.emitter.start()
+        else:
+            labels = {name: s.label for name, s in cfg.signals.items()}
+            for ch in self.chans:
+                ch.labels = labels
+        if plan.reads:
+            old = self.poller
+            if reader is not None:
+                old.reader.close()
+            self.poller = poller_cls(
+                reader or old.reader, cfg.used_signals(), cfg.modbus.merge_gap,
+                cfg.modbus.backoff_min_s, cfg.modbus.backoff_max_s,
+            )
+            self.poller.on_read, self.poller.on_regs = old.on_read, old.on_regs
+        if proxy is not None:
+            if reader is not None:
+                proxy.retarget(cfg.modbus)
+            proxy.cache.max_age_ns = int(cfg.proxy_max_age_s * 1e9)
+        if plan.recorder:
+            if self.recorder is not None:
+                self.recorder.close()
+            self.recorder = open_recorder(cfg.record_dir, cfg.record_size_mb, self.poller.signals, cfg.channels)
+        if self.recorder is not None and (plan.recorder or plan.channels):
+            self.recorder.track_channels(self.chans)
+        get_logger().setLevel(cfg.log_level.upper())
+        self.ctl = PollController(cfg.poll_interval_s, cfg.poll_max_s, cfg.poll_idle_s, cfg.poll_change_w)
+        self.backoff = Backoff(cfg.modbus.backoff_min_s, cfg.modbus.backoff_max_s)
+        self.cfg = cfg
+        self.prev_ts_ns = self.prev_dt_ns = None
+        self.ticker.reset()
+
+    def sampled(
+        self, start_ns: int, ts_ns: int, samples: Dict[str, SignalSample], errors: Dict[str, Exception]
+    ) -> int:
+        """Sample des Zyklus verarbeiten (ts_ns = Read fertig), gibt den Zeitpunkt des nächsten Polls zurück."""
+        cfg, metrics, chans = self.cfg, self.metrics, self.chans
+        self.poll_latency.record(ts_ns - start_ns)
+        if not samples:
+            first = next(iter(errors.values()))
+            raise RuntimeError(f"kein Signal lesbar ({first})")
+        for name, e in errors.items():
+            log.warning(
+                "Warn: %s read failed (%s)", cfg.signals[name].label, e,
+                extra={"key": f"read.{name}", "fields": {"signal": name}},
+            )
+        if self.down_since_ns is not None:
+            self._recovered(ts_ns)
+        self.last_ok_ns = ts_ns
+        if self.recorder is not None:
+            self.recorder.frame(ts_ns, samples, errors)
+        self.prof.mark(RECORD)
+
+        # Pulse nur einreihen, gesendet wird in den Emittern
+        for i in self.table.update(ts_ns, samples):
+            chans[i].harvest()
+        for ch in chans:
+            ch.settle()
+        self.prof.mark(INTEGRATE)
+
+        if metrics is not None:
+            metrics.modbus_reconnects.set(self.poller.reconnects)
+            metrics.cycle.observe((time.monotonic_ns() - start_ns) / 1e9)
+            metrics.wake_late.observe(self.ticker.last_late_ns / 1e9)
+            if self.prev_ts_ns is not None:
+                dt_ns = ts_ns - self.prev_ts_ns
+                if self.prev_dt_ns is not None:
+                    metrics.dt_jitter.observe(abs(dt_ns - self.prev_dt_ns) / 1e9)
+                self.prev_dt_ns = dt_ns
+            self.prev_ts_ns = ts_ns
+
+        # Statuslog
+        if time.monotonic() - self.last_log >= cfg.log_every_s:
+            elapsed = time.monotonic() - self.window_start
+            self.last_log = self.window_start = time.monotonic()
+            log.info(
+                "Modbus: %s | %s | %s | %s", self.poll_latency.summary("zyklus"), self.poller.describe(),
+                f"{self.poll_latency.count / elapsed:.2f} Samples/s" if elapsed >= 1.0 else "Samples/s n/a",
+                self.ticker.summary(),
+            )
+            self.poll_latency.reset()
+            self.ticker.late.reset()
+            for ch in chans:
+                log.info(
+                    "%s", ch.status_line(),
+                    extra={"fields": {
+                        "channel": ch.name, "power_w": ch.power_w, "queue": ch.pulse_queue,
+                        "sent": ch.pulses_sent,
+                    }},
+                )
+
+        # nächster Poll: fest oder adaptiv (Leistungsänderung, nächste Pulsschwelle),
+        # ab der geplanten Startzeit dieses Zyklus
+        wake_ns = self.ctl.next_wake(
+            self.ticker.base_ns, zip(self.table.names, self.table.power), self.table.crossings(ts_ns)
+        )
+        missed = self.ticker.missed
+        wake_ns = self.ticker.schedule(wake_ns, time.monotonic_ns())
+        if metrics is not None:
+            metrics.poll_interval.set(self.ctl.last_wait_ns / 1e9)
+            metrics.missed_deadlines.inc(self.ticker.missed - missed)
+        self.prof.mark(LOG)
+        return wake_ns
+
+    def stores_to_sync(self) -> List[Union[StateStore, Recorder]]:
+        """Alle STATE_SYNC_S die Stores (und den Recorder), die auf die Platte sollen (sonst leer)."""
+        if time.monotonic() - self.last_sync < self.cfg.state_sync_s:
+            return []
+        self.last_sync = time.monotonic()
+        stores: List[Union[StateStore, Recorder]] = [ch.store for ch in self.chans if ch.store is not None]
+        if self.recorder is not None:
+            stores.append(self.recorder)
+        return stores
+
+    def dump(self) -> None:
+        """SIGUSR1: Profil, Takt und Zustand von Tabelle/Queues ins Log (Journal), ohne Zähler zurückzusetzen."""
+        lines = self.prof.dump()
+        lines.append(f"Takt: {self.ticker.summary()} | Modbus: {self.poller.describe()}")
+        t, now = self.table, time.monotonic_ns()
+        for i, ch in enumerate(self.chans):
+            age = f"vor {(now - t.last_ts[i]) / 1e9:.1f}s" if t.last_ts[i] >= 0 else "keins"
+            s = (
+                f"  [{ch.name}] P={t.power[i]}W avg~{t.avg[i]:.0f}W "
+                f"rest={t.energy[i] / 3.6e12:.3f}/{t.wpp[i] / 3.6e12:.3f}Wh queue={ch.pulse_queue} "
+                f"in_flight={ch.emitter.in_flight} sent={ch.pulses_sent} Sample {age}"
+            )
+            if t.outage[i]:
+                s += " | Ausfall"
+            if ch.overloaded:
+                s += " | OVERLOAD"
+            gaps = t.gap_summary(i)
+            lines.append(f"{s} | {gaps}" if gaps else s)
+        for line in lines:
+            log.warning("%s", line)
+
+    def failed(self, e: Exception) -> float:
+        """Zyklus abgebrochen: Ausfall verbuchen, gibt die Wartezeit bis zum nächsten Versuch (s) zurück."""
+        delay = self.backoff.next()
+        log.error("Fehler: %s (nächster Versuch in %.1fs)", e, delay, extra={"key": "loop"})
+        if self.down_since_ns is None:
+            self.down_since_ns = self.last_ok_ns if self.last_ok_ns is not None else time.monotonic_ns()
+            self.outages += 1
+        self.table.mark_outage()
+        if self.recorder is not None:
+            self.recorder.outage()
+        if self.metrics is not None:
+            self.metrics.loop_errors.inc()
+            self.prev_ts_ns = self.prev_dt_ns = None
+        self.ctl.reset()
+        self.ticker.reset()
+        return delay
+
+    def _recovered(self, ts_ns: int) -> None:
+        assert self.down_since_ns is not None
+        dur_ns = ts_ns - self.down_since_ns
+        self.outage_ns += dur_ns
+        log.warning(
+            "Modbus wieder da nach %.1fs (%d Fehlversuche), Lücke nach GAP_POLICY verbucht",
+            dur_ns / 1e9, self.backoff.streak,
+            extra={"fields": {"outage_s": round(dur_ns / 1e9, 1), "attempts": self.backoff.streak}},
+        )
+        if self.metrics is not None:
+            self.metrics.modbus_outages.inc()
+            self.metrics.modbus_outage_seconds.inc(dur_ns / 1e9)
+        self.down_since_ns = None
+        self.backoff.reset()
+
+
+def _loop(cycle: Cycle, reload: Callable[[], None]) -> None:
+    prof = cycle.prof
+    while True:
+        try:
+            cycle.ticker.wait()
+            if cycle.dump_pending:
+                cycle.dump_pending = False
+                cycle.dump()
+                if not cycle.reload_pending:
+                    continue  # weiter bis zur eigentlichen Deadline
+            if cycle.reload_pending:
+                cycle.reload_pending = False
+                reload()
+            poller = cycle.poller
+            reader = poller.reader
+            prof.begin()
+            if not reader.connect():
+                raise RuntimeError("Modbus connect() fehlgeschlagen")
+            prof.mark(CONNECT)
+
+            start_ns = time.monotonic_ns()
+            samples, errors = poller.poll()
+            prof.mark(READ)
+            # Sample-Zeitpunkt = Read fertig (nicht Loop-Start)
+            cycle.sampled(start_ns, time.monotonic_ns(), samples, errors)
+
+            stores = cycle.stores_to_sync()
+            if stores:
+                for store in stores:
+                    store.sync()
+                prof.mark(SYNC)
+            prof.end()
+
+        except Exception as e:
+            prof.end()
+            delay = cycle.failed(e)
+            try:
+                cycle.poller.reader.close()
+            except Exception:
+                pass
+            time.sleep(delay)
@@ -0,0 +1,221 @@
+"""
+Logging: Level, strukturierte Felder, asynchrone Ausgabe, Rate-Limit pro Meldung.
+
+Aufrufer (Poll-Loop, Emitter-Threads) legen Records nur in eine Queue; geschrieben
+wird in einem eigenen Thread. Ein langsames journald bremst damit weder Sampling
+noch Pulse.
+
+Rate-Limit: pro Schlüssel höchstens LOG_RATE_BURST Meldungen je LOG_RATE_WINDOW_S.
+Schlüssel ist `extra={"key": ...}`, sonst (ab WARNING) der Meldungstext selbst; INFO
+ohne Schlüssel wird nie gedrosselt. Unterdrücktes wird am Fensterende zu einer Zeile
+zusammengefasst, z.B. "Warn: HP read failed (...) [x37 in den letzten 60s]".
+
+Strukturierte Felder: `extra={"fields": {...}}`, erscheinen bei LOG_FORMAT=json.
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+LOGGER_NAME = "pulsar"
+
+# systemd/journald wertet "<N>" am Zeilenanfang als Priorität (SyslogLevelPrefix)
+_SYSLOG_PRIO = {logging.DEBUG: 7, logging.INFO: 6, logging.WARNING: 4, logging.ERROR: 3, logging.CRITICAL: 2}
+
+
+def get_logger(name: str = "") -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+class TextFormatter(logging.Formatter):
+    """Nur der Text (Zeitstempel setzt journald); unter systemd mit Priorität-Präfix."""
+
+    def __init__(self) -> None:
+        super().__init__("%(message)s")
+        self.journal = bool(os.getenv("JOURNAL_STREAM"))
+
+    def format(self, record: logging.LogRecord) -> str:
+        s = super().format(record)
+        if self.journal:
+            return f"<{_SYSLOG_PRIO.get(record.levelno, 6)}>{s}"
+        return s
+
+
+class JsonFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Meldung inkl. strukturierter Felder."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        d = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            d.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            d["suppressed"] = suppressed
+        if record.exc_text:
+            d["exc"] = record.exc_text
+        return json.dumps(d, ensure_ascii=False, default=str)
+
+
+@dataclass
+class _Window:
+    start: float
+    count: int = 0
+    suppressed: int = 0
+    last: Optional[logging.LogRecord] = field(default=None, repr=False)
+
+
+class RateLimiter:
+    def __init__(self, burst: int, window_s: float):
+        self.burst = burst
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._windows: Dict[str, _Window] = {}
+
+    @staticmethod
+    def key(record: logging.LogRecord) -> Optional[str]:
+        key = getattr(record, "key", None)
+        if key is None and record.levelno >= logging.WARNING:
+            key = f"{record.name}:{record.getMessage()}"
+        return key
+
+    def allow(self, record: logging.LogRecord) -> List[logging.LogRecord]:
+        """Records, die jetzt raus sollen: [] (gedrosselt), [record] oder [Zusammenfassung, record]."""
+        if self.burst <= 0:
+            return [record]
+        key = self.key(record)
+        if key is None:
+            return [record]
+        now = time.monotonic()
+        with self._lock:
+            w = self._windows.get(key)
+            out: List[logging.LogRecord] = []
+            if w is None or now - w.start >= self.window_s:
+                if w is not None and w.suppressed:
+                    out.append(self._summary(w))
+                w = self._windows[key] = _Window(now)
+            w.count += 1
+            if w.count <= self.burst:
+                out.append(record)
+            else:
+                w.suppressed += 1
+                w.last = record
+            return out
+
+    def expired(self, all_windows: bool = False) -> List[logging.LogRecord]:
+        """Abgelaufene (oder alle) Fenster aufräumen, Zusammenfassungen für Gedrosseltes zurückgeben."""
+        now = time.monotonic()
+        out = []
+        with self._lock:
+            for key in [k for k, w in self._windows.items() if all_windows or now - w.start >= self.window_s]:
+                w = self._windows.pop(key)
+                if w.suppressed:
+                    out.append(self._summary(w))
+        return out
+
+    def _summary(self, w: _Window) -> logging.LogRecord:
+        rec = w.last
+        assert rec is not None
+        rec.msg = f"{rec.getMessage()} [x{w.suppressed} in den letzten {self.window_s:.0f}s]"
+        rec.args = None
+        rec.suppressed = w.suppressed
+        return rec
+
+
+class AsyncHandler(logging.Handler):
+    """Queue + Schreib-Thread vor einem normalen Handler (stdout)."""
+
+    _STOP = object()
+
+    def __init__(self, target: logging.Handler, limiter: RateLimiter):
+        super().__init__()
+        self.target = target
+        self.limiter = limiter
+        self._q: "queue.SimpleQueue[object]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _prepare(record: logging.LogRecord) -> logging.LogRecord:
+        # Text im aufrufenden Thread festhalten (args können sich danach ändern)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for r in self.limiter.allow(record):
+            self._q.put(self._prepare(r))
+
+    def _run(self) -> None:
+        next_sweep = time.monotonic() + 1.0
+        while True:
+            try:
+                item = self._q.get(timeout=1.0)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                self.target.handle(item)  # type: ignore[arg-type]
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + 1.0
+                for r in self.limiter.expired():
+                    self.target.handle(self._prepare(r))
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._q.put(self._STOP)
+            self._thread.join(2.0)
+            # Rest der Queue + offene Zusammenfassungen noch ausgeben
+            while True:
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not self._STOP:
+                    self.target.handle(item)  # type: ignore[arg-type]
+            for r in self.limiter.expired(all_windows=True):
+                self.target.handle(self._prepare(r))
+            self.target.flush()
+        super().close()
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", burst: int = 10, window_s: float = 60.0) -> None:
+    """Einmal beim Start; ersetzt evtl. vorhandene Handler am pulsar-Logger."""
+    if fmt not in ("text", "json"):
+        raise ValueError(f"LOG_FORMAT unbekannt: {fmt} (text | json)")
+    lvl = logging.getLevelName(level.upper())
+    if not isinstance(lvl, int):
+        raise ValueError(f"LOG_LEVEL unbekannt: {level}")
+
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    root = get_logger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    root.addHandler(AsyncHandler(out, RateLimiter(burst, window_s)))
+    root.setLevel(lvl)
+    root.propagate = False
+
+
+def shutdown_logging() -> None:
+    """Queue leeren (beim Beenden, damit die letzten Zeilen nicht verloren gehen)."""
+    root = get_logger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
@@ -0,0 +1,208 @@
+"""
+Minimaler Modbus-TCP-Client für Read Holding Registers (FC3) mit Pipelining
+(transact: einzelner Request mit beliebigem PDU, für den Proxy).
+
+pymodbus' Sync-Client schickt Request für Request und wartet jeweils auf die
+Antwort. Hier gehen alle Requests eines Zyklus (bis `max_inflight`) auf einmal
+raus, die Antworten werden über die Transaction-ID zugeordnet. Die Zyklusdauer
+ist damit ~1 RTT statt Summe der RTTs, und alle Werte stammen aus (fast)
+demselben Moment.
+"""
+import logging
+import socket
+import struct
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+# MBAP-Header: transaction id, protocol id (0), length (unit + pdu), unit id
+MBAP = struct.Struct(">HHHB")
+FC_READ_HOLDING = 3
+
+# Nach so vielen Timeouts in Folge mit >1 Request in flight wird auf sequentiell
+# umgestellt (Gegenstelle kann offenbar nicht mit gepipelinten Requests umgehen)
+PIPELINE_MAX_TIMEOUTS = 3
+
+ReadRequest = Tuple[int, int, int]  # (unit, addr, count)
+
+log = logging.getLogger(__name__)
+
+
+class ModbusExceptionResponse(RuntimeError):
+    """Gegenstelle hat mit einer Modbus-Exception geantwortet (Verbindung bleibt ok)."""
+
+
+class ReadSkipped(TimeoutError):
+    """Request einer stummen Unit, der nach deren Timeout nicht mehr gesendet wurde (zählt wie ein Timeout)."""
+
+
+def encode_read_request(tid: int, unit: int, addr: int, count: int) -> bytes:
+    pdu = struct.pack(">BHH", FC_READ_HOLDING, addr, count)
+    return MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu
+
+
+def decode_read_response(pdu: bytes, unit: int, addr: int, count: int) -> List[int]:
+    fc = pdu[0]
+    if fc & 0x80:
+        code = pdu[1] if len(pdu) > 1 else 0
+        raise ModbusExceptionResponse(f"Modbus read error: unit={unit} addr={addr} -> exception code {code}")
+    nbytes = pdu[1]
+    if fc != FC_READ_HOLDING or nbytes != 2 * count or len(pdu) < 2 + nbytes:
+        raise ModbusExceptionResponse(f"Modbus read error: unit={unit} addr={addr} -> malformed response")
+    return list(struct.unpack_from(f">{count}H", pdu, 2))
+
+
+class ModbusTcpPipe:
+    def __init__(self, host: str, port: int, timeout_s: float, max_inflight: int = 16):
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self.max_inflight = max(1, max_inflight)
+        self.sock: Optional[socket.socket] = None
+        self._tid = 0
+        self._buf = b""
+        self._pipeline_timeouts = 0
+        # Dauer Senden -> Antwort je Request des letzten read_many (None = keine Antwort)
+        self.last_latency_ns: List[Optional[int]] = []
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def connect(self) -> bool:
+        if self.sock is not None:
+            return True
+        try:
+            s = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        except OSError:
+            return False
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = s
+        self._buf = b""
+        return True
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+                self._buf = b""
+
+    def _next_tid(self) -> int:
+        self._tid = (self._tid + 1) & 0xFFFF
+        return self._tid
+
+    def _recv_exact(self, n: int, deadline: float) -> bytes:
+        assert self.sock is not None
+        while len(self._buf) < n:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("Modbus response timeout")
+            self.sock.settimeout(remaining)
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("Modbus connection closed by peer")
+            self._buf += chunk
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+    def _recv_adu(self, deadline: float) -> Tuple[int, bytes]:
+        tid, _proto, length, _unit = MBAP.unpack(self._recv_exact(MBAP.size, deadline))
+        if length < 2:
+            raise ConnectionError(f"Modbus framing error (length={length})")
+        return tid, self._recv_exact(length - 1, deadline)
+
+    def read_many(self, reqs: Sequence[ReadRequest]) -> List[Union[List[int], Exception]]:
+        """
+        Liest alle Requests, bis zu max_inflight gleichzeitig unterwegs.
+        Modbus-Exceptions landen pro Request im Ergebnis. Bleibt genau eine Unit komplett
+        stumm, während andere geantwortet haben, bekommen nur deren Requests einen
+        TimeoutError (noch nicht gesendete: ReadSkipped) und die Verbindung bleibt (verspätete
+        Antworten werden über die Transaction-ID verworfen); noch nicht gesendete Requests anderer
+        Units enden mit RuntimeError. Sonstige Verbindungsfehler/Timeouts schließen den
+        Socket und werden geworfen.
+        """
+        if self.sock is None:
+            raise ConnectionError("Modbus nicht verbunden")
+        results: List[Union[List[int], Exception, None]] = [None] * len(reqs)
+        sent_ns = [0] * len(reqs)
+        self.last_latency_ns = [None] * len(reqs)
+        pending: Dict[int, int] = {}  # tid -> index
+        deadline = time.monotonic() + self.timeout_s
+        i = 0
+        answered: Set[int] = set()  # Units mit Antwort in diesem Aufruf
+        try:
+            while i < len(reqs) or pending:
+                out = []
+                first = i
+                while i < len(reqs) and len(pending) < self.max_inflight:
+                    tid = self._next_tid()
+                    pending[tid] = i
+                    out.append(encode_read_request(tid, *reqs[i]))
+                    i += 1
+                if out:
+                    self.sock.sendall(b"".join(out))
+                    now = time.monotonic_ns()
+                    for k in range(first, i):
+                        sent_ns[k] = now
+                tid, pdu = self._recv_adu(deadline)
+                idx = pending.pop(tid, None)
+                if idx is None:
+                    continue  # verspätete Antwort eines früheren (abgebrochenen) Zyklus
+                self.last_latency_ns[idx] = time.monotonic_ns() - sent_ns[idx]
+                answered.add(reqs[idx][0])
+                try:
+                    results[idx] = decode_read_response(pdu, *reqs[idx])
+                except ModbusExceptionResponse as e:
+                    results[idx] = e
+        except (OSError, ConnectionError) as e:
+            silent = {reqs[idx][0] for idx in pending.values()}
+            if isinstance(e, socket.timeout) and answered and len(silent) == 1 and not silent & answered:
+                # nur diese Unit hängt (z.B. Wallbox weg), nicht die Verbindung
+                unit = silent.pop()
+                for idx in pending.values():
+                    results[idx] = TimeoutError(f"Modbus response timeout: unit={unit} addr={reqs[idx][1]}")
+                for k in range(i, len(reqs)):
+                    u = reqs[k][0]
+                    if u == unit:
+                        results[k] = ReadSkipped(f"Modbus read übersprungen: unit={unit} antwortet nicht")
+                    else:
+                        results[k] = RuntimeError(f"Modbus read übersprungen: unit={u} (unit={unit} antwortet nicht)")
+                return results  # type: ignore[return-value]
+            inflight = len(pending)
+            self.close()
+            if isinstance(e, socket.timeout) and inflight > 1:
+                self._on_pipeline_timeout()
+            raise
+        if self.max_inflight > 1 and len(reqs) > 1:
+            self._pipeline_timeouts = 0
+        return results  # type: ignore[return-value]
+
+    def transact(self, unit: int, pdu: bytes) -> bytes:
+        """
+        Ein Request mit beliebigem PDU (z.B. Weiterleitung im Proxy), gibt das Antwort-PDU zurück.
+        Verbindet bei Bedarf; Verbindungsfehler/Timeouts schließen den Socket und werden geworfen.
+        """
+        if not self.connect():
+            raise ConnectionError(f"Modbus connect {self.host}:{self.port} fehlgeschlagen")
+        assert self.sock is not None
+        tid = self._next_tid()
+        deadline = time.monotonic() + self.timeout_s
+        try:
+            self.sock.sendall(MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu)
+            while True:
+                rtid, resp = self._recv_adu(deadline)
+                if rtid == tid:
+                    return resp
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def _on_pipeline_timeout(self) -> None:
+        self._pipeline_timeouts += 1
+        if self.max_inflight > 1 and self._pipeline_timeouts >= PIPELINE_MAX_TIMEOUTS:
+            self.max_inflight = 1
+            log.warning(
+                "Modbus: %d Timeouts in Folge mit parallelen Requests -> Pipelining aus, lese sequentiell",
+                self._pipeline_timeouts,
+            )
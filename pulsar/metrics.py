@@ -0,0 +1,360 @@
+"""
+Optionaler Prometheus-Endpoint (/metrics, Text-Format 0.0.4).
+
+Bewusst ohne prometheus_client: eine Handvoll Counter/Gauges/Histogramme, gerendert
+beim Scrape. Histogramme werden direkt beim Messen gefüllt (Modbus-Reads, Shelly-Trigger,
+Loop), Werte die ohnehin im Kanal stehen (Leistung, Queue, Zähler) holt ein Collector
+erst beim Scrape ab. METRICS_PORT=0 (Default) = aus, dann kostet das nichts.
+Der Endpoint läuft in einem eigenen Thread, mit RUNTIME=asyncio als Task im Event-Loop.
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Sekunden; deckt LAN-RTT (ms) bis Timeout (s) ab
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+log = logging.getLogger(__name__)
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Counter(Gauge):
+    """Monoton steigend; set() nur für Zähler, die anderswo geführt werden (Collector)."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [counts je bucket (nicht kumuliert)..., +Inf], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            c = self._counts.get(labels)
+            if c is None:
+                c = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            c[i] += 1
+            self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(c), self._sums[k]) for k, c in self._counts.items())
+        out = self.header()
+        for k, counts, total in items:
+            acc = 0
+            for le, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                le_label = 'le="' + _fmt(le) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def _add(self, m):
+        self._metrics.append(m)
+        return m
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, doc, labelnames))
+
+    def gauge(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, doc, labelnames))
+
+    def histogram(
+        self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, doc, labelnames, buckets))
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        """fn wird vor jedem Scrape aufgerufen und setzt Gauges/Counter aus dem aktuellen Zustand."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                log.warning("Metrics: Collector fehlgeschlagen (%s)", e)
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+# =========================
+# Pulser-Metriken
+# =========================
+class PulserMetrics:
+    def __init__(self) -> None:
+        r = self.registry = Registry()
+        self._chans: Optional[list] = None  # Kanäle für den Collector (track_channels)
+        ch = ("channel",)
+        self.power = r.gauge("pulsar_channel_power_watts", "Aktuelle Kanalleistung (gedeckelt)", ch)
+        self.avg_power = r.gauge("pulsar_channel_avg_power_watts", "Geglättete Kanalleistung (ALPHA_AVG)", ch)
+        self.energy = r.gauge("pulsar_channel_energy_remainder_joules", "Energie-Rest unterhalb der Pulsschwelle", ch)
+        self.queue = r.gauge("pulsar_channel_pulse_queue", "Geerntete, noch nicht gesendete Pulse", ch)
+        self.sent = r.counter("pulsar_channel_pulses_sent_total", "Gesendete Pulse (inkl. Stand vor Neustart)", ch)
+        self.overload = r.gauge("pulsar_channel_overload", "1 = Queue am Limit (MAX_QUEUE)", ch)
+        self.dropped = r.counter("pulsar_channel_dropped_pulses_total", "Verworfene Pulse (BACKLOG_POLICY=drop)", ch)
+        self.dropped_energy = r.counter(
+            "pulsar_channel_dropped_joules_total", "Energie der verworfenen Pulse (BACKLOG_POLICY=drop)", ch
+        )
+        self.gaps = r.counter(
+            "pulsar_channel_integration_gaps_total", "Sample-Lücken (über MAX_GAP_S oder Modbus-Ausfall)", ch
+        )
+
+        unit = ("unit",)
+        self.modbus_latency = r.histogram("pulsar_modbus_read_seconds", "Dauer eines Modbus-Reads", unit)
+        self.modbus_errors = r.counter("pulsar_modbus_read_errors_total", "Fehlgeschlagene Modbus-Reads", unit)
+        self.modbus_reconnects = r.counter(
+            "pulsar_modbus_reconnects_total", "Sofortige Reconnects nach weggebrochener Verbindung (im selben Zyklus)"
+        )
+        self.modbus_outages = r.counter("pulsar_modbus_outages_total", "Ausfälle (Zyklen ohne Sample bis zur Erholung)")
+        self.modbus_outage_seconds = r.counter(
+            "pulsar_modbus_outage_seconds_total", "Dauer der Ausfälle (letztes Sample davor bis erstes danach)"
+        )
+
+        self.shelly_latency = r.histogram("pulsar_shelly_request_seconds", "Dauer eines HTTP-Requests zum Shelly", ch)
+        self.shelly_retries = r.counter("pulsar_shelly_retries_total", "Wiederholte Shelly-Trigger (SHELLY_RETRIES)", ch)
+        self.shelly_failures = r.counter("pulsar_shelly_failures_total", "Shelly-Trigger nach allen Retries fehlgeschlagen", ch)
+        self.shelly_reconnects = r.counter("pulsar_shelly_reconnects_total", "Transparente Reconnects (keep-alive)", ch)
+        self.reconciled_extra = r.counter(
+            "pulsar_reconcile_extra_pulses_total", "Abgleich: geschaltet, aber nicht gezählt (Energie abgezogen)", ch
+        )
+        self.reconciled_missing = r.counter(
+            "pulsar_reconcile_missing_pulses_total", "Abgleich: gezählt, aber nicht geschaltet (neu eingereiht)", ch
+        )
+
+        out = ("channel", "output")
+        self.output_healthy = r.gauge("pulsar_output_healthy", "1 = Ausgang in Rotation, 0 = nach Fehler im Backoff", out)
+        self.output_pulses = r.counter("pulsar_output_pulses_total", "Gesendete Pulse je Ausgang", out)
+        self.output_failures = r.counter("pulsar_output_failures_total", "Fehlgeschlagene Trigger je Ausgang", out)
+
+        self.cycle = r.histogram("pulsar_loop_cycle_seconds", "Dauer eines Poll-Zyklus (Reads + Verarbeitung)")
+        self.dt_jitter = r.histogram(
+            "pulsar_loop_dt_jitter_seconds", "Änderung des Sample-Abstands gegenüber dem vorigen Zyklus"
+        )
+        self.poll_interval = r.gauge("pulsar_poll_interval_seconds", "Geplanter Abstand zum nächsten Poll (adaptiv)")
+        self.wake_late = r.histogram(
+            "pulsar_loop_wake_late_seconds", "Verspätung des Zyklusstarts gegenüber seiner absoluten Deadline"
+        )
+        self.missed_deadlines = r.counter(
+            "pulsar_loop_missed_deadlines_total", "Übersprungene Poll-Deadlines (Zyklus länger als geplant)"
+        )
+        self.loop_errors = r.counter("pulsar_loop_errors_total", "Abgebrochene Poll-Zyklen")
+        self.proxy_requests = r.counter(
+            "pulsar_proxy_requests_total", "Modbus-Proxy: Requests nach Quelle (cache | upstream | coalesced | error)",
+            ("source",),
+        )
+        self.counter_pushes = r.counter(
+            "pulsar_counter_push_total", "Zählerstand-Push (COUNTER_PUSH_URL) nach Ergebnis (ok | error)", ("result",)
+        )
+        self.loop_errors.set(0)
+        for c in (self.modbus_reconnects, self.modbus_outages, self.modbus_outage_seconds, self.missed_deadlines):
+            c.set(0)
+
+    def observe_modbus(self, unit: int, dur_ns: Optional[int], ok: bool) -> None:
+        u = str(unit)
+        if dur_ns is not None:
+            self.modbus_latency.observe(dur_ns / 1e9, u)
+        if not ok:
+            self.modbus_errors.inc(1, u)
+
+    def _shelly_observer(self, channel: str) -> Callable[[int], None]:
+        return lambda dur_ns: self.shelly_latency.observe(dur_ns / 1e9, channel)
+
+    def track_channels(self, chans) -> None:
+        """
+        Kanal-Werte beim Scrape einsammeln + Shelly-Latenz je Request mitschreiben.
+        Nach einem Reload erneut aufrufen (neue Emitter), der Collector bleibt einmal registriert.
+        """
+        for c in chans:
+            for o in c.emitter.outputs:
+                o.transport.on_latency = self._shelly_observer(c.name)
+        if self._chans is None:
+            self.registry.add_collector(self._collect)
+        self._chans = chans
+
+    def _collect(self) -> None:
+        for c in self._chans:
+            n = c.name
+            self.power.set(c.power_w, n)
+            self.avg_power.set(round(c.avg_power_w, 1), n)
+            self.energy.set(c.energy_wns / 1e9, n)
+            self.queue.set(c.pulse_queue, n)
+            self.sent.set(c.pulses_sent, n)
+            self.gaps.set(c.gaps, n)
+            self.overload.set(int(c.overloaded), n)
+            self.dropped.set(c.dropped_pulses, n)
+            self.dropped_energy.set(c.dropped_wns / 1e9, n)
+            outputs = c.emitter.outputs
+            self.shelly_retries.set(sum(o.transport.retries for o in outputs), n)
+            self.shelly_failures.set(c.emitter.failures, n)
+            self.shelly_reconnects.set(sum(o.transport.reconnects for o in outputs), n)
+            self.reconciled_extra.set(c.emitter.reconciled_extra, n)
+            self.reconciled_missing.set(c.emitter.reconciled_missing, n)
+            now = time.monotonic_ns()
+            for o in outputs:
+                self.output_healthy.set(int(o.healthy(now)), n, o.label)
+                self.output_pulses.set(o.sent, n, o.label)
+                self.output_failures.set(o.failures, n, o.label)
+
+    def track_proxy(self, proxy) -> None:
+        """Proxy-Zähler beim Scrape einsammeln."""
+
+        def collect() -> None:
+            for source, n in proxy.counts.items():
+                self.proxy_requests.set(n, source)
+
+        self.registry.add_collector(collect)
+
+    def track_counter(self, push) -> None:
+        """Zählerstand-Pushes beim Scrape einsammeln."""
+
+        def collect() -> None:
+            for result, n in push.counts.items():
+                self.counter_pushes.set(n, result)
+
+        self.registry.add_collector(collect)
+
+
+def _handler(registry: Registry):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass  # kein Log pro Scrape
+
+    return Handler
+
+
+def start_metrics(bind: str, port: int) -> Optional[PulserMetrics]:
+    """HTTP-Endpoint im Hintergrund-Thread starten; None wenn aus (port 0) oder Port belegt."""
+    if port <= 0:
+        return None
+    m = PulserMetrics()
+    try:
+        srv = ThreadingHTTPServer((bind, port), _handler(m.registry))
+    except OSError as e:
+        log.warning("Warn: Metrics-Endpoint %s:%d nicht verfügbar (%s)", bind, port, e)
+        return None
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    log.info("Metrics: http://%s:%d/metrics", bind, port)
+    return m
+
+
+async def start_metrics_async(bind: str, port: int) -> Optional[PulserMetrics]:
+    """Wie start_metrics, aber als asyncio-Server im laufenden Event-Loop."""
+    if port <= 0:
+        return None
+    m = PulserMetrics()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await asyncio.wait_for(reader.readline(), 5.0)
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass  # Header interessieren nicht
+            parts = line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+            if path in ("/metrics", "/"):
+                body = m.registry.render().encode()
+                head = "HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            else:
+                body = b"not found\n"
+                head = "HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+            writer.write(f"{head}Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    try:
+        await asyncio.start_server(handle, bind, port)
+    except OSError as e:
+        log.warning("Warn: Metrics-Endpoint %s:%d nicht verfügbar (%s)", bind, port, e)
+        return None
+    log.info("Metrics: http://%s:%d/metrics", bind, port)
+    return m
@@ -0,0 +1,420 @@
+"""
+Venus Modbus TCP lesen: jedes benötigte Signal genau einmal pro Poll-Zyklus.
+
+Der Read-Planer fasst benachbarte/überlappende Registerbereiche derselben Unit zu
+einem Request zusammen (z.B. PV 811-813 + House 817-819 auf Unit 100 -> 811-819).
+Die Requests eines Zyklus gehen gepipelined über eine Verbindung raus (mbtcp).
+Für RUNTIME=asyncio gibt es AsyncPymodbusReader/AsyncPoller mit derselben Planung.
+
+Verbindungsfehler:
+- Reset/vom Peer geschlossen -> im selben Zyklus sofort einmal neu verbinden und lesen
+- antwortet nur eine Unit nicht (Timeout, andere Antworten kamen), bleibt die Verbindung
+  stehen; die Unit wird mit wachsendem Backoff ausgesetzt, ihre Signale zählen als Fehler
+- Reconnect-Backoff nach abgebrochenen Zyklen und Ausfall-Buchhaltung macht der Poll-Loop (engine.Cycle)
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pymodbus.client import AsyncModbusTcpClient, ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from .config import ModbusConfig, SignalConfig
+from .mbtcp import ModbusExceptionResponse, ModbusTcpPipe, ReadRequest
+
+# Modbus-Limit für FC3
+MAX_REGS_PER_READ = 125
+# Backoff-Streuung (+-), damit mehrere Pulser nach einem Venus-Neustart nicht im Gleichschritt verbinden
+BACKOFF_JITTER = 0.25
+# Stumme Unit frühestens nach so vielen Sekunden wieder probieren: jeder Versuch hält den Zyklus
+# bis MODBUS_TIMEOUT_S auf (Backoff verdoppelt bis MODBUS_BACKOFF_MAX_S)
+UNIT_BACKOFF_MIN_S = 5.0
+
+log = logging.getLogger(__name__)
+
+
+def u32_from_regs(r0: int, r1: int, wordorder: str = "big") -> int:
+    """uint32 aus 2x16-bit holding regs."""
+    if wordorder == "little":
+        return (r1 << 16) | r0
+    # default "big"
+    return (r0 << 16) | r1
+
+
+@dataclass(frozen=True)
+class SignalSample:
+    total: int
+    phases: Tuple[int, ...]  # L1/L2/L3 bei u16x3, sonst (total,)
+
+
+def decode_signal(sig: SignalConfig, regs: Sequence[int]) -> SignalSample:
+    """Rohregister -> Watt."""
+    if sig.kind == "u32":
+        val = int(u32_from_regs(int(regs[0]), int(regs[1]), wordorder=sig.wordorder))
+        return SignalSample(val, (val,))
+    a, b, c = int(regs[0]), int(regs[1]), int(regs[2])
+    s = a + b + c
+    if s < 0:
+        s = 0
+    return SignalSample(s, (a, b, c))
+
+
+# =========================
+# Read-Planer
+# =========================
+@dataclass(frozen=True)
+class ReadBlock:
+    unit_id: int
+    addr: int
+    count: int
+    signals: Tuple[SignalConfig, ...]
+
+    @property
+    def request(self) -> ReadRequest:
+        return (self.unit_id, self.addr, self.count)
+
+
+def plan_reads(
+    signals: Iterable[SignalConfig], max_gap: int, no_merge: FrozenSet[str] = frozenset()
+) -> Tuple[ReadBlock, ...]:
+    """
+    Fasst Signale pro Unit zu möglichst wenigen Requests zusammen.
+    Lücken bis max_gap Register werden mitgelesen (max_gap < 0: nie zusammenfassen),
+    Signale in no_merge werden immer einzeln gelesen.
+    """
+    by_unit: Dict[int, List[SignalConfig]] = {}
+    for sig in signals:
+        by_unit.setdefault(sig.unit_id, []).append(sig)
+
+    blocks: List[ReadBlock] = []
+    for unit, sigs in by_unit.items():
+        cur: List[SignalConfig] = []
+        start = end = 0  # [start, end)
+        for sig in sorted(sigs, key=lambda s: s.addr):
+            s_end = sig.addr + sig.count
+            mergeable = (
+                cur
+                and max_gap >= 0
+                and sig.name not in no_merge
+                and all(c.name not in no_merge for c in cur)
+                and sig.addr <= end + max_gap
+                and max(end, s_end) - start <= MAX_REGS_PER_READ
+            )
+            if mergeable:
+                cur.append(sig)
+                end = max(end, s_end)
+                continue
+            if cur:
+                blocks.append(ReadBlock(unit, start, end - start, tuple(cur)))
+            cur, start, end = [sig], sig.addr, s_end
+        if cur:
+            blocks.append(ReadBlock(unit, start, end - start, tuple(cur)))
+    return tuple(blocks)
+
+
+# =========================
+# Transport
+# =========================
+ReadResult = Union[List[int], Exception]
+
+
+class PymodbusReader:
+    """Sequentiell über pymodbus (MODBUS_PIPELINE=0)."""
+
+    def __init__(self, cfg: ModbusConfig):
+        # keine internen Retries: eine stumme Unit kostet sonst 4x MODBUS_TIMEOUT_S, das Aussetzen macht der Poller
+        self.client = ModbusTcpClient(cfg.host, port=cfg.port, timeout=cfg.timeout_s, retries=0)
+        self.last_latency_ns: List[Optional[int]] = []
+
+    def connect(self) -> bool:
+        if self.client.connected:
+            return True
+        return bool(self.client.connect())
+
+    def close(self) -> None:
+        self.client.close()
+
+    def read_many(self, reqs: Sequence[ReadRequest]) -> List[ReadResult]:
+        """Verbindungsverlust wird geworfen, keine Antwort einer Unit landet als TimeoutError im Ergebnis."""
+        out: List[ReadResult] = []
+        self.last_latency_ns = []
+        for unit, addr, count in reqs:
+            t0 = time.monotonic_ns()
+            try:
+                rr = self.client.read_holding_registers(addr, count=count, slave=unit)
+                dur_ns: Optional[int] = time.monotonic_ns() - t0
+                if rr.isError():
+                    raise ModbusExceptionResponse(f"Modbus read error: unit={unit} addr={addr} -> {rr}")
+                out.append([int(r) for r in rr.registers])
+            except ConnectionException as e:
+                self.client.close()
+                raise ConnectionError(str(e)) from e
+            except ModbusIOException as e:
+                out.append(TimeoutError(f"Modbus response timeout: unit={unit} addr={addr} ({e})"))
+                dur_ns = None
+            except Exception as e:
+                if not isinstance(e, ModbusExceptionResponse):
+                    dur_ns = None
+                out.append(e)
+            self.last_latency_ns.append(dur_ns)
+        if out and all(isinstance(r, TimeoutError) for r in out):
+            self.client.close()
+            raise out[0]
+        return out
+
+
+class AsyncPymodbusReader:
+    """
+    asyncio über pymodbus' AsyncModbusTcpClient: alle Requests eines Zyklus gleichzeitig,
+    jeder mit eigenem Timeout - eine hängende Unit hält die anderen nicht auf.
+    """
+
+    def __init__(self, cfg: ModbusConfig):
+        self.timeout_s = cfg.timeout_s
+        # Reconnect/Retries macht der Poll-Loop selbst
+        self.client = AsyncModbusTcpClient(
+            cfg.host, port=cfg.port, timeout=cfg.timeout_s, retries=0, reconnect_delay=0
+        )
+        self.last_latency_ns: List[Optional[int]] = []
+
+    async def connect(self) -> bool:
+        if self.client.connected:
+            return True
+        return bool(await asyncio.wait_for(self.client.connect(), self.timeout_s))
+
+    def close(self) -> None:
+        self.client.close()
+
+    async def _read_one(self, unit: int, addr: int, count: int) -> Tuple[ReadResult, Optional[int]]:
+        t0 = time.monotonic_ns()
+        try:
+            rr = await asyncio.wait_for(
+                self.client.read_holding_registers(addr, count=count, slave=unit), self.timeout_s
+            )
+        except asyncio.TimeoutError:
+            return TimeoutError(f"Modbus response timeout: unit={unit} addr={addr}"), None
+        except Exception as e:
+            return e, None
+        dur_ns = time.monotonic_ns() - t0
+        if rr.isError():
+            return ModbusExceptionResponse(f"Modbus read error: unit={unit} addr={addr} -> {rr}"), dur_ns
+        return [int(r) for r in rr.registers], dur_ns
+
+    async def read_many(self, reqs: Sequence[ReadRequest]) -> List[ReadResult]:
+        """Wie ModbusTcpPipe: Verbindungsverlust (oder gar keine Antwort) wird geworfen."""
+        done = await asyncio.gather(*(self._read_one(*r) for r in reqs))
+        self.last_latency_ns = [d for _, d in done]
+        results = [r for r, _ in done]
+        for r in results:
+            if isinstance(r, ConnectionException):
+                self.client.close()
+                raise ConnectionError(str(r)) from r
+        if results and all(isinstance(r, TimeoutError) for r in results):
+            self.client.close()
+            raise results[0]
+        return results
+
+
+def make_reader(cfg: ModbusConfig):
+    if cfg.pipeline:
+        return ModbusTcpPipe(cfg.host, cfg.port, cfg.timeout_s)
+    return PymodbusReader(cfg)
+
+
+class Backoff:
+    """Exponentieller Backoff mit Jitter: min_s, 2*min_s, ... bis max_s, jeweils +-BACKOFF_JITTER."""
+
+    def __init__(self, min_s: float, max_s: float):
+        self.min_s = min_s
+        self.max_s = max(min_s, max_s)
+        self.streak = 0
+
+    def next(self) -> float:
+        self.streak += 1
+        base = min(self.max_s, self.min_s * 2 ** min(self.streak - 1, 30))
+        return base * random.uniform(1.0 - BACKOFF_JITTER, 1.0 + BACKOFF_JITTER)
+
+    def reset(self) -> None:
+        self.streak = 0
+
+
+class UnitSuspended(RuntimeError):
+    """Unit antwortet nicht und ist im Backoff, ihre Reads werden ausgelassen."""
+
+
+class Poller:
+    """Liest pro Zyklus alle Signale einmal; Fehler werden pro Signal gesammelt statt geworfen."""
+
+    def __init__(
+        self, reader, signals: Iterable[SignalConfig], max_gap: int,
+        backoff_min_s: float = 0.2, backoff_max_s: float = 30.0,
+    ):
+        self.reader = reader
+        self.signals = tuple(signals)
+        self.max_gap = max_gap
+        self._no_merge: FrozenSet[str] = frozenset()
+        self.blocks = plan_reads(self.signals, max_gap)
+        # optional: (unit, Dauer ns | None, ok) je Read, z.B. für Metrics
+        self.on_read: Optional[Callable[[int, Optional[int], bool], None]] = None
+        # optional: (unit, addr, Register) je erfolgreichem Read, z.B. für den Proxy-Cache
+        self.on_regs: Optional[Callable[[int, int, List[int]], None]] = None
+        self.reconnects = 0  # sofortige Reconnects nach weggebrochener Verbindung
+        # Units ohne Antwort: Backoff + ausgesetzt bis (monotonic ns)
+        self._backoff = (max(backoff_min_s, UNIT_BACKOFF_MIN_S), backoff_max_s)
+        self._unit_backoff: Dict[int, Backoff] = {}
+        self._unit_down: Dict[int, int] = {}
+
+    def describe(self) -> str:
+        s = f"{len(self.blocks)} Reads für {len(self.signals)} Signale"
+        now = time.monotonic_ns()
+        down = [f"{u} (noch {(t - now) / 1e9:.0f}s)" for u, t in sorted(self._unit_down.items()) if t > now]
+        if down:
+            s += " | ausgesetzt: Unit " + ", ".join(down)
+        return s
+
+    def _active(self, errors: Dict[str, Exception]) -> List[ReadBlock]:
+        """Blöcke dieses Zyklus; die ausgesetzter Units landen direkt als Fehler."""
+        now = time.monotonic_ns()
+        active = []
+        for b in self.blocks:
+            until = self._unit_down.get(b.unit_id, 0)
+            if until > now:
+                err = UnitSuspended(
+                    f"Unit {b.unit_id} ausgesetzt (keine Antwort), nächster Versuch in {(until - now) / 1e9:.1f}s"
+                )
+                for sig in b.signals:
+                    errors[sig.name] = err
+            else:
+                active.append(b)
+        return active
+
+    @staticmethod
+    def _is_reset(e: Exception) -> bool:
+        # Reset, Broken Pipe, vom Peer geschlossen, nicht verbunden - aber kein Timeout
+        return isinstance(e, ConnectionError)
+
+    def _read(self, blocks: Sequence[ReadBlock]) -> List[ReadResult]:
+        if not blocks:
+            return []
+        reqs = [b.request for b in blocks]
+        try:
+            results = self.reader.read_many(reqs)
+        except Exception as e:
+            if not self._is_reset(e):
+                return self._failed(blocks, e)
+            # Verbindung weg: sofort neu verbinden und einmal wiederholen, statt den Zyklus zu verlieren
+            self.reconnects += 1
+            try:
+                self.reader.close()
+                if not self.reader.connect():
+                    raise e
+                results = self.reader.read_many(reqs)
+            except Exception as e2:
+                return self._failed(blocks, e2)
+        return self._observed(blocks, results)
+
+    def _failed(self, blocks: Sequence[ReadBlock], e: Exception) -> List[ReadResult]:
+        results: List[ReadResult] = [e] * len(blocks)
+        if self.on_read is not None:
+            for b in blocks:
+                self.on_read(b.unit_id, None, False)
+        return results
+
+    def _observed(self, blocks: Sequence[ReadBlock], results: List[ReadResult]) -> List[ReadResult]:
+        if self.on_read is not None:
+            for b, r, dur_ns in zip(blocks, results, self.reader.last_latency_ns):
+                self.on_read(b.unit_id, dur_ns, not isinstance(r, Exception))
+        # Verbindung steht (sonst wäre read_many geworfen): Timeouts betreffen nur die jeweilige Unit
+        timed_out = {b.unit_id for b, r in zip(blocks, results) if isinstance(r, TimeoutError)}
+        for unit in {b.unit_id for b in blocks}:
+            if unit in timed_out:
+                self._suspend(unit)
+            elif unit in self._unit_backoff:
+                del self._unit_backoff[unit], self._unit_down[unit]
+                log.info("Modbus: Unit %d antwortet wieder", unit)
+        return results
+
+    def _suspend(self, unit: int) -> None:
+        backoff = self._unit_backoff.setdefault(unit, Backoff(*self._backoff))
+        delay = backoff.next()
+        self._unit_down[unit] = time.monotonic_ns() + int(delay * 1e9)
+        log.warning(
+            "Modbus: Unit %d antwortet nicht (%d. Mal in Folge), setze %.1fs aus", unit, backoff.streak, delay,
+            extra={"key": f"unit.{unit}", "fields": {"unit": unit}},
+        )
+
+    def poll(self) -> Tuple[Dict[str, SignalSample], Dict[str, Exception]]:
+        samples: Dict[str, SignalSample] = {}
+        errors: Dict[str, Exception] = {}
+        blocks = self._active(errors)
+        singles = self._apply(blocks, self._read(blocks), samples, errors)
+        if singles:
+            self._apply(singles, self._read(singles), samples, errors)
+        return samples, errors
+
+    def _apply(
+        self, blocks: Sequence[ReadBlock], results: List[ReadResult],
+        samples: Dict[str, SignalSample], errors: Dict[str, Exception],
+    ) -> List[ReadBlock]:
+        """Ergebnisse übernehmen; abgelehnte zusammengefasste Reads -> neu planen, gibt die Einzel-Reads zurück."""
+        split: List[ReadBlock] = []
+        for b, r in zip(blocks, results):
+            if isinstance(r, ModbusExceptionResponse) and len(b.signals) > 1:
+                # Zusammengefasster Bereich wird abgelehnt (Lücke enthält ungültige Register)
+                split.append(b)
+                continue
+            if self.on_regs is not None and not isinstance(r, Exception):
+                self.on_regs(b.unit_id, b.addr, r)
+            self._collect(b, r, samples, errors)
+        if not split:
+            return []
+        names = frozenset(s.name for b in split for s in b.signals)
+        self._no_merge |= names
+        self.blocks = plan_reads(self.signals, self.max_gap, self._no_merge)
+        log.warning("Modbus: zusammengefasster Read abgelehnt, lese %s einzeln", ",".join(sorted(names)))
+        return [b for b in self.blocks if b.signals[0].name in names]
+
+    @staticmethod
+    def _collect(b: ReadBlock, r: ReadResult, samples: Dict[str, SignalSample], errors: Dict[str, Exception]) -> None:
+        if isinstance(r, Exception):
+            for sig in b.signals:
+                errors[sig.name] = r
+            return
+        for sig in b.signals:
+            off = sig.addr - b.addr
+            samples[sig.name] = decode_signal(sig, r[off:off + sig.count])
+
+
+class AsyncPoller(Poller):
+    """Poller für RUNTIME=asyncio (reader: AsyncPymodbusReader), gleiche Planung und Fehlerbehandlung."""
+
+    async def _read_async(self, blocks: Sequence[ReadBlock]) -> List[ReadResult]:
+        if not blocks:
+            return []
+        reqs = [b.request for b in blocks]
+        try:
+            results = await self.reader.read_many(reqs)
+        except Exception as e:
+            if not self._is_reset(e):
+                return self._failed(blocks, e)
+            self.reconnects += 1
+            try:
+                self.reader.close()
+                if not await self.reader.connect():
+                    raise e
+                results = await self.reader.read_many(reqs)
+            except Exception as e2:
+                return self._failed(blocks, e2)
+        return self._observed(blocks, results)
+
+    async def poll(self) -> Tuple[Dict[str, SignalSample], Dict[str, Exception]]:  # type: ignore[override]
+        samples: Dict[str, SignalSample] = {}
+        errors: Dict[str, Exception] = {}
+        blocks = self._active(errors)
+        singles = self._apply(blocks, await self._read_async(blocks), samples, errors)
+        if singles:
+            self._apply(singles, await self._read_async(singles), samples, errors)
+        return samples, errors
@@ -0,0 +1,141 @@
+"""
+Zyklus-Profiler: immer an, misst jede Stufe des Poll-Zyklus mit monotonic_ns.
+
+Stufen: connect, read (Modbus), record (Recorder + Lesefehler-Log), integrate (Tabelle,
+Pulsernte, Überlast), log (Metrics, Statuslog, nächster Poll), sync (fsync Stores/Recorder);
+dazu shelly (Dauer je HTTP-Request, aus den Ausgangs-Threads).
+
+Je Stufe ein Histogramm mit festen log2-Buckets (ab ~1 µs, Faktor 2, bis ~8 s) in einem
+vorab angelegten array, dazu Summe und Maximum; die letzten RING_CYCLES Zyklen liegen mit
+ihren Stufenzeiten in einem Ring. Pro Sample wird nichts angelegt.
+dump() (SIGUSR1) gibt Histogramme und die langsamsten Zyklen aus dem Ring als Text zurück.
+"""
+import threading
+import time
+from array import array
+from typing import Callable, List, Optional
+
+STAGES = ("connect", "read", "record", "integrate", "log", "sync", "shelly")
+CONNECT, READ, RECORD, INTEGRATE, LOG, SYNC, SHELLY = range(len(STAGES))
+# Bucket i: Dauer < 2**i * 1024 ns, letzter Bucket = alles darüber
+BUCKETS = 24
+# so viele letzte Zyklen für "langsamste Zyklen"
+RING_CYCLES = 600
+SLOWEST = 5
+# Ring-Eintrag: Ende (monotonic ns), Gesamtdauer, Stufenzeiten
+_ROW = 2 + len(STAGES)
+
+
+def _bucket(dur_ns: int) -> int:
+    i = (dur_ns >> 10).bit_length()
+    return i if i < BUCKETS else BUCKETS - 1
+
+
+def _edge(i: int) -> str:
+    """Obergrenze von Bucket i als Text."""
+    us = (1 << i) * 1024 / 1e3
+    return f"{us:.0f}µs" if us < 1000 else f"{us / 1e3:.3g}ms"
+
+
+class CycleProfiler:
+    def __init__(self) -> None:
+        n = len(STAGES)
+        self.hist = array("q", bytes(8 * n * BUCKETS))
+        self.count = array("q", bytes(8 * n))
+        self.sum_ns = array("q", bytes(8 * n))
+        self.max_ns = array("q", bytes(8 * n))
+        self.ring = array("q", bytes(8 * RING_CYCLES * _ROW))
+        self.cycles = 0
+        self._cur = array("q", bytes(8 * n))
+        self._start_ns = 0
+        self._mark_ns = 0
+        self._lock = threading.Lock()  # shelly kommt aus anderen Threads
+
+    def track_channels(self, chans) -> None:
+        """Dauer je Shelly-Request mitschreiben; ein vorhandener on_latency-Beobachter (Metrics) bleibt."""
+        for c in chans:
+            for o in c.emitter.outputs:
+                o.transport.on_latency = self._observer(o.transport.on_latency)
+
+    def _observer(self, prev: Optional[Callable[[int], None]]) -> Callable[[int], None]:
+        def observe(dur_ns: int) -> None:
+            if prev is not None:
+                prev(dur_ns)
+            self.record(SHELLY, dur_ns)
+
+        return observe
+
+    def begin(self) -> None:
+        """Zyklus beginnt (nach dem Warten auf die Deadline)."""
+        for i in range(len(self._cur)):
+            self._cur[i] = 0
+        self._start_ns = self._mark_ns = time.monotonic_ns()
+
+    def mark(self, stage: int) -> None:
+        """Zeit seit begin()/letztem mark() der Stufe zuschreiben."""
+        now = time.monotonic_ns()
+        dur = now - self._mark_ns
+        self._mark_ns = now
+        self._cur[stage] += dur
+        self.record(stage, dur)
+
+    def record(self, stage: int, dur_ns: int) -> None:
+        with self._lock:
+            self.hist[stage * BUCKETS + _bucket(dur_ns)] += 1
+            self.count[stage] += 1
+            self.sum_ns[stage] += dur_ns
+            if dur_ns > self.max_ns[stage]:
+                self.max_ns[stage] = dur_ns
+
+    def end(self) -> None:
+        """Zyklus fertig (auch abgebrochen): Stufenzeiten in den Ring."""
+        if self._start_ns == 0:
+            return
+        now = time.monotonic_ns()
+        base = (self.cycles % RING_CYCLES) * _ROW
+        self.ring[base] = now
+        self.ring[base + 1] = now - self._start_ns
+        self.ring[base + 2:base + _ROW] = self._cur
+        self.cycles += 1
+        self._start_ns = 0
+
+    def _percentile(self, stage: int, q: float) -> str:
+        """Obere Bucket-Grenze, unter der q der Messungen liegen."""
+        need = q * self.count[stage]
+        seen = 0
+        for i in range(BUCKETS):
+            seen += self.hist[stage * BUCKETS + i]
+            if seen >= need:
+                return _edge(i)
+        return _edge(BUCKETS - 1)
+
+    def dump(self) -> List[str]:
+        lines = [f"Profil: {self.cycles} Zyklen, Stufen (ms; Perzentile/Buckets: Obergrenze:Anzahl):"]
+        with self._lock:
+            for s, name in enumerate(STAGES):
+                n = self.count[s]
+                if n == 0:
+                    continue
+                buckets = " ".join(
+                    f"<{_edge(i)}:{self.hist[s * BUCKETS + i]}"
+                    for i in range(BUCKETS) if self.hist[s * BUCKETS + i]
+                )
+                lines.append(
+                    f"  {name:<9} n={n} avg={self.sum_ns[s] / n / 1e6:.2f} max={self.max_ns[s] / 1e6:.2f} "
+                    f"p50<{self._percentile(s, 0.5)} p99<{self._percentile(s, 0.99)} | {buckets}"
+                )
+        now = time.monotonic_ns()
+        rows = range(min(self.cycles, RING_CYCLES))
+        slow = sorted(rows, key=lambda r: self.ring[r * _ROW + 1], reverse=True)[:SLOWEST]
+        if slow:
+            lines.append(f"Langsamste der letzten {len(rows)} Zyklen:")
+        for r in slow:
+            base = r * _ROW
+            parts = " + ".join(
+                f"{name} {self.ring[base + 2 + s] / 1e6:.2f}"
+                for s, name in enumerate(STAGES) if self.ring[base + 2 + s]
+            )
+            lines.append(
+                f"  vor {(now - self.ring[base]) / 1e9:.1f}s: {self.ring[base + 1] / 1e6:.2f}ms = {parts or '-'}"
+            )
+        return lines
@@ -0,0 +1,345 @@
+"""
+Modbus-TCP-Proxy (MODBUS_PROXY_PORT): der Pulser als einziger Venus-Client im Netz.
+
+Home Assistant, Grafana-Collector & Co. lesen vom Pulser statt von der Venus:
+- FC3-Reads, deren Register der Pulser ohnehin pollt (oder kürzlich weitergeleitet hat),
+  kommen aus dem Cache, solange alle Register jünger als MODBUS_PROXY_MAX_AGE_S sind
+- alles andere geht über eine eigene Verbindung an die Venus; gleiche Reads, die schon
+  unterwegs sind, warten auf deren Antwort statt einen zweiten Request auszulösen
+- Schreibzugriffe (FC6/FC16) werden durchgereicht und verwerfen die Register im Cache
+- Venus nicht erreichbar -> Modbus-Exception 0x0A/0x0B (Gateway) an den Client
+
+Weitergeleitet wird seriell (ein Request gleichzeitig an die Venus). Der Poll-Loop hat
+seine eigene Verbindung und wartet nie auf Proxy-Clients.
+"""
+import asyncio
+import logging
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import ModbusConfig
+from .mbtcp import FC_READ_HOLDING, MBAP, ModbusExceptionResponse, ModbusTcpPipe, decode_read_response
+from .modbus import MAX_REGS_PER_READ
+
+FC_WRITE_SINGLE = 6
+FC_WRITE_MULTIPLE = 16
+EXC_ILLEGAL_DATA_VALUE = 0x03
+EXC_GATEWAY_PATH = 0x0A  # Venus nicht erreichbar
+EXC_GATEWAY_TIMEOUT = 0x0B  # Venus/Unit antwortet nicht
+# Client-Verbindung ohne Request so lange offen lassen
+CLIENT_IDLE_S = 600.0
+
+log = logging.getLogger(__name__)
+
+
+def encode_read_pdu(regs: Sequence[int]) -> bytes:
+    return struct.pack(f">BB{len(regs)}H", FC_READ_HOLDING, 2 * len(regs), *regs)
+
+
+def exception_pdu(fc: int, code: int) -> bytes:
+    return bytes((fc | 0x80, code))
+
+
+def _read_range(pdu: bytes) -> Optional[Tuple[int, int]]:
+    """(addr, count) eines FC3-Requests, sonst None."""
+    if len(pdu) != 5 or pdu[0] != FC_READ_HOLDING:
+        return None
+    addr, count = struct.unpack_from(">HH", pdu, 1)
+    return addr, count
+
+
+def _write_range(pdu: bytes) -> Optional[Tuple[int, int]]:
+    """(addr, count) eines Schreib-Requests (FC6/FC16), sonst None."""
+    if len(pdu) >= 5 and pdu[0] == FC_WRITE_SINGLE:
+        return struct.unpack_from(">H", pdu, 1)[0], 1
+    if len(pdu) >= 5 and pdu[0] == FC_WRITE_MULTIPLE:
+        addr, count = struct.unpack_from(">HH", pdu, 1)
+        return addr, count
+    return None
+
+
+class RegisterCache:
+    """Registerwerte je (Unit, Adresse) mit Zeitstempel (monotonic ns); Poller und Proxy schreiben."""
+
+    def __init__(self, max_age_s: float):
+        self.max_age_ns = int(max_age_s * 1e9)
+        self._regs: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def store(self, unit: int, addr: int, regs: Sequence[int], ts_ns: Optional[int] = None) -> None:
+        ts = time.monotonic_ns() if ts_ns is None else ts_ns
+        with self._lock:
+            for i, v in enumerate(regs):
+                self._regs[(unit, addr + i)] = (v, ts)
+
+    def lookup(self, unit: int, addr: int, count: int) -> Optional[List[int]]:
+        """Werte, wenn alle Register im Cache und jünger als max_age sind, sonst None."""
+        oldest = time.monotonic_ns() - self.max_age_ns
+        out = []
+        with self._lock:
+            for a in range(addr, addr + count):
+                hit = self._regs.get((unit, a))
+                if hit is None or hit[1] < oldest:
+                    return None
+                out.append(hit[0])
+        return out
+
+    def invalidate(self, unit: int, addr: int, count: int) -> None:
+        with self._lock:
+            for a in range(addr, addr + count):
+                self._regs.pop((unit, a), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._regs.clear()
+
+
+class _Call:
+    """Weitergeleiteter Read, auf dessen Antwort gleiche Requests anderer Clients warten."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.resp = b""
+
+
+class ModbusProxy:
+    """Request-Verarbeitung ohne Server: Cache, Zusammenfassen gleicher Reads, Weiterleitung."""
+
+    def __init__(self, cache: RegisterCache, cfg: ModbusConfig):
+        self.cache = cache
+        self.upstream = ModbusTcpPipe(cfg.host, cfg.port, cfg.timeout_s, max_inflight=1)
+        self._upstream_lock = threading.Lock()
+        self._calls_lock = threading.Lock()
+        self._calls: Dict[Tuple[int, bytes], _Call] = {}
+        # Requests nach Quelle, für /metrics
+        self.counts = {"cache": 0, "upstream": 0, "coalesced": 0, "error": 0}
+
+    def _cached(self, unit: int, rng: Tuple[int, int]) -> Optional[bytes]:
+        """Antwort aus dem Cache bzw. Fehler für ungültige Reads, None = weiterleiten."""
+        if not 1 <= rng[1] <= MAX_REGS_PER_READ:
+            return exception_pdu(FC_READ_HOLDING, EXC_ILLEGAL_DATA_VALUE)
+        regs = self.cache.lookup(unit, *rng)
+        if regs is None:
+            return None
+        self.counts["cache"] += 1
+        return encode_read_pdu(regs)
+
+    def _answered(self, unit: int, pdu: bytes, resp: bytes) -> None:
+        """Antwort der Venus: gelesene Register cachen, geschriebene verwerfen."""
+        rng = _read_range(pdu)
+        if rng is not None:
+            try:
+                self.cache.store(unit, rng[0], decode_read_response(resp, unit, *rng))
+            except (ModbusExceptionResponse, IndexError, struct.error):
+                pass
+            return
+        rng = _write_range(pdu)
+        if rng is not None:
+            self.cache.invalidate(unit, *rng)
+
+    def _failed(self, pdu: bytes, e: Exception) -> bytes:
+        self.counts["error"] += 1
+        log.warning("Modbus-Proxy: Weiterleitung fehlgeschlagen (%s)", e, extra={"key": "proxy.upstream"})
+        timeout = isinstance(e, (TimeoutError, asyncio.TimeoutError))
+        return exception_pdu(pdu[0], EXC_GATEWAY_TIMEOUT if timeout else EXC_GATEWAY_PATH)
+
+    def handle(self, unit: int, pdu: bytes) -> bytes:
+        """Antwort-PDU für einen Client-Request (aus dem Thread der Client-Verbindung)."""
+        rng = _read_range(pdu)
+        if rng is None:
+            return self._forward(unit, pdu)
+        resp = self._cached(unit, rng)
+        if resp is not None:
+            return resp
+        key = (unit, pdu)
+        with self._calls_lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        assert call is not None
+        if not leader:
+            self.counts["coalesced"] += 1
+            call.done.wait()
+            return call.resp
+        try:
+            call.resp = self._forward(unit, pdu)
+        finally:
+            with self._calls_lock:
+                del self._calls[key]
+            call.done.set()
+        return call.resp
+
+    def _forward(self, unit: int, pdu: bytes) -> bytes:
+        with self._upstream_lock:
+            try:
+                resp = self.upstream.transact(unit, pdu)
+            except (OSError, ConnectionError) as e:
+                return self._failed(pdu, e)
+        self.counts["upstream"] += 1
+        self._answered(unit, pdu, resp)
+        return resp
+
+    def retarget(self, cfg: ModbusConfig) -> None:
+        """Reload: neuer Venus-Endpunkt, gecachte Werte stammen noch vom alten."""
+        with self._upstream_lock:
+            self.upstream.close()
+            self.upstream = ModbusTcpPipe(cfg.host, cfg.port, cfg.timeout_s, max_inflight=1)
+        self.cache.clear()
+
+    def close(self) -> None:
+        with self._upstream_lock:
+            self.upstream.close()
+
+
+class AsyncModbusProxy(ModbusProxy):
+    """ModbusProxy für RUNTIME=asyncio: Weiterleitung über asyncio-Streams im Event-Loop."""
+
+    def __init__(self, cache: RegisterCache, cfg: ModbusConfig):
+        super().__init__(cache, cfg)
+        self.cfg = cfg
+        self._stream: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._alock = asyncio.Lock()
+        self._futures: Dict[Tuple[int, bytes], asyncio.Future] = {}
+        self._tid = 0
+
+    async def handle_async(self, unit: int, pdu: bytes) -> bytes:
+        rng = _read_range(pdu)
+        if rng is None:
+            return await self._forward_async(unit, pdu)
+        resp = self._cached(unit, rng)
+        if resp is not None:
+            return resp
+        key = (unit, pdu)
+        fut = self._futures.get(key)
+        if fut is not None:
+            self.counts["coalesced"] += 1
+            return await asyncio.shield(fut)
+        fut = self._futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            resp = await self._forward_async(unit, pdu)
+            fut.set_result(resp)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # kein "never retrieved", falls niemand wartet
+            raise
+        finally:
+            del self._futures[key]
+        return resp
+
+    async def _transact(self, unit: int, pdu: bytes) -> bytes:
+        if self._stream is None:
+            self._stream = await asyncio.open_connection(self.cfg.host, self.cfg.port)
+        reader, writer = self._stream
+        self._tid = (self._tid + 1) & 0xFFFF
+        writer.write(MBAP.pack(self._tid, 0, len(pdu) + 1, unit) + pdu)
+        await writer.drain()
+        while True:
+            tid, _proto, length, _unit = MBAP.unpack(await reader.readexactly(MBAP.size))
+            if length < 2:
+                raise ConnectionError(f"Modbus framing error (length={length})")
+            resp = await reader.readexactly(length - 1)
+            if tid == self._tid:
+                return resp
+
+    async def _forward_async(self, unit: int, pdu: bytes) -> bytes:
+        async with self._alock:
+            try:
+                resp = await asyncio.wait_for(self._transact(unit, pdu), self.cfg.timeout_s)
+            except (OSError, ConnectionError, EOFError, asyncio.TimeoutError) as e:
+                self.close()
+                return self._failed(pdu, e)
+        self.counts["upstream"] += 1
+        self._answered(unit, pdu, resp)
+        return resp
+
+    def retarget(self, cfg: ModbusConfig) -> None:
+        self.cfg = cfg
+        self.close()
+        self.cache.clear()
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream[1].close()
+            self._stream = None
+
+
+def _frame(tid: int, unit: int, pdu: bytes) -> bytes:
+    return MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = CLIENT_IDLE_S
+
+    def handle(self) -> None:
+        proxy: ModbusProxy = self.server.proxy  # type: ignore[attr-defined]
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                head = self.rfile.read(MBAP.size)
+                if len(head) < MBAP.size:
+                    return
+                tid, proto, length, unit = MBAP.unpack(head)
+                if proto != 0 or not 2 <= length <= 254:
+                    return  # kein Modbus-TCP
+                pdu = self.rfile.read(length - 1)
+                if len(pdu) < length - 1:
+                    return
+                self.wfile.write(_frame(tid, unit, proxy.handle(unit, pdu)))
+        except OSError:
+            pass
+
+
+def start_proxy(bind: str, port: int, max_age_s: float, cfg: ModbusConfig) -> Optional[ModbusProxy]:
+    """Proxy-Server in Hintergrund-Threads starten; None wenn aus (port 0) oder Port belegt."""
+    if port <= 0:
+        return None
+    proxy = ModbusProxy(RegisterCache(max_age_s), cfg)
+    try:
+        srv = socketserver.ThreadingTCPServer((bind, port), _Handler, bind_and_activate=False)
+        srv.allow_reuse_address = True
+        srv.server_bind()
+        srv.server_activate()
+    except OSError as e:
+        log.warning("Warn: Modbus-Proxy %s:%d nicht verfügbar (%s)", bind, port, e)
+        return None
+    srv.daemon_threads = True
+    srv.proxy = proxy  # type: ignore[attr-defined]
+    threading.Thread(target=srv.serve_forever, name="modbus-proxy", daemon=True).start()
+    log.info("Modbus-Proxy: %s:%d -> %s:%d (Cache max. %.1fs)", bind, port, cfg.host, cfg.port, max_age_s)
+    return proxy
+
+
+async def start_proxy_async(bind: str, port: int, max_age_s: float, cfg: ModbusConfig) -> Optional[AsyncModbusProxy]:
+    """Wie start_proxy, aber als asyncio-Server im laufenden Event-Loop."""
+    if port <= 0:
+        return None
+    proxy = AsyncModbusProxy(RegisterCache(max_age_s), cfg)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                head = await asyncio.wait_for(reader.readexactly(MBAP.size), CLIENT_IDLE_S)
+                tid, proto, length, unit = MBAP.unpack(head)
+                if proto != 0 or not 2 <= length <= 254:
+                    return
+                pdu = await reader.readexactly(length - 1)
+                writer.write(_frame(tid, unit, await proxy.handle_async(unit, pdu)))
+                await writer.drain()
+        except (OSError, EOFError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    try:
+        await asyncio.start_server(handle, bind, port)
+    except OSError as e:
+        log.warning("Warn: Modbus-Proxy %s:%d nicht verfügbar (%s)", bind, port, e)
+        return None
+    log.info("Modbus-Proxy: %s:%d -> %s:%d (Cache max. %.1fs)", bind, port, cfg.host, cfg.port, max_age_s)
+    return proxy
@@ -0,0 +1,505 @@
+"""
+Sample-Recorder: jedes Modbus-Sample und jedes Puls-Ereignis in einer Ring-Datei
+(RECORD_DIR/<kanäle>.rec, z.B. pv.rec oder pv-wp-house.rec für engine_pulser).
+
+Damit lässt sich im Nachhinein prüfen, welche Leistung welche Pulse ausgelöst hat.
+Die Datei ist ein mmap mit festem Header und Records fester Breite (ein struct.pack_into
+pro Record direkt ins mmap, kein Syscall; fdatasync läuft mit STATE_SYNC_S wie beim StateStore,
+ohne den Schreib-Lock der Records).
+
+Header (HEADER_SIZE Bytes): magic, Version, Record-Größe, Kapazität, Anzahl geschriebener
+Records (Ring-Position = count % capacity), Erstellzeit und das Layout als JSON (Signale
+mit Register-Typ, Kanäle mit Termen/Pulswertigkeit) - die CLI braucht keine Konfig.
+
+Record: ts_ns (Wanduhr), kind, id, flags + Nutzlast
+  KIND_FRAME  - ein Poll-Zyklus: Rohwerte aller Signale (u16x3: L1-L3, u32: Gesamt),
+                flags = Bitmaske fehlender Signale, FLAG_OUTAGE = erster Zyklus nach einem Ausfall.
+                Unveränderte Zyklen werden ausgelassen (höchstens HEARTBEAT_S lang); vor einer
+                Änderung wird der letzte ausgelassene geschrieben, der konstante Abschnitt
+                ist damit exakt begrenzt (wichtig für Integration und Replay).
+  KIND_PULSE  - Puls(e) gesendet: id = Kanal, n, Queue, Summe gesendet, Abstand (ms), Ausgang
+  KIND_ADJUST - Abgleich: n Pulse mehr (+) / weniger (-) geschaltet als gezählt
+
+Beispiel: 4 Signale (11 Register) -> 36 Bytes je Zyklus. Ändert sich die Leistung in jedem Zyklus,
+sind das bei 5 Hz ~15 MB je Tag; Nächte mit 0 W kosten fast nichts, RECORD_SIZE_MB=32 reicht damit
+für einige Tage, nicht für Wochen. Bewusst so: jeder Record trägt seinen absoluten Zeitstempel und ist
+für sich lesbar, der Ring kann an jeder Stelle überschreiben und CLI/Replay brauchen keinen Vorgänger.
+Ein u32-Delta statt ts_ns spart nur 4 der 36 Bytes; deutlich kleiner ginge nur mit Kompression über
+mehrere Records.
+
+Ändern sich Signale, Kanäle (Terme, Pulswertigkeit) oder die Größe, passt die Datei nicht mehr zum
+Layout im Header: sie wird nach <datei>.<JJJJMMTT-hhmmss>.old verschoben (Zeit der Umstellung) und
+eine neue angelegt. Ältere Aufzeichnungen werden dabei nicht überschrieben, nur über KEEP_OLD hinaus
+die ältesten gelöscht (begrenzter Platz auf der SD-Karte).
+
+CLI:
+  python3 -m pulsar.recorder dump   <datei> [--from ZEIT] [--to ZEIT] [--kind frame|pulse|adjust]
+  python3 -m pulsar.recorder energy <datei> [--from ZEIT] [--to ZEIT]
+ZEIT: ISO (2026-10-17T12:00, lokale Zeit), Unix-Sekunden oder relativ (--from=-2h, -30m, -1d).
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import ChannelConfig, SignalConfig
+
+MAGIC = b"PLRC"
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, record size, capacity, count, created wall ns, layout length
+_HEAD = struct.Struct("<4sHHQQqI")
+_COUNT_OFF = 16  # Offset von count im Header
+_COUNT = struct.Struct("<Q")
+# ts_ns, kind, id, flags
+_REC = struct.Struct("<qBBH")
+# Nutzlast Puls/Abgleich: n, queue, sent, interval_ms, output
+_PULSE = struct.Struct("<iIQHB")
+
+KIND_FRAME = 1
+KIND_PULSE = 2
+KIND_ADJUST = 3
+KINDS = {"frame": KIND_FRAME, "pulse": KIND_PULSE, "adjust": KIND_ADJUST}
+
+FLAG_OUTAGE = 0x8000
+MAX_SIGNALS = 15  # Bits 0-14 der Fehlermaske
+# Unveränderte Frames werden ausgelassen, spätestens nach so vielen Sekunden aber geschrieben
+HEARTBEAT_S = 60.0
+# so viele beiseitegelegte Aufzeichnungen (<datei>.<zeit>.old) bleiben je Datei liegen
+KEEP_OLD = 10
+
+_PAYLOAD = {"u16x3": "3H", "u32": "I"}
+
+log = logging.getLogger(__name__)
+
+
+def _layout(signals: Sequence[SignalConfig], channels: Sequence[ChannelConfig]) -> dict:
+    return {
+        "signals": [{"name": s.name, "kind": s.kind} for s in signals],
+        "channels": [
+            {
+                "name": c.name,
+                "terms": [[t.signal, t.sign] + ([t.phase] if t.phase is not None else []) for t in c.terms],
+                "max_power_w": c.max_power_w,
+                "wns_per_pulse": c.wns_per_pulse,
+            }
+            for c in channels
+        ],
+    }
+
+
+def _frame_struct(layout: dict) -> struct.Struct:
+    return struct.Struct("<" + "".join(_PAYLOAD[s["kind"]] for s in layout["signals"]))
+
+
+def _record_size(layout: dict) -> int:
+    payload = max(_frame_struct(layout).size, _PULSE.size)
+    return -(-(_REC.size + payload) // 4) * 4
+
+
+class Recorder:
+    """Schreibt Frames (Poll-Loop) und Puls-Ereignisse (Emitter) in die Ring-Datei."""
+
+    def __init__(self, path: str, size_mb: float, signals: Sequence[SignalConfig], channels: Sequence[ChannelConfig]):
+        if len(signals) > MAX_SIGNALS:
+            raise ValueError(f"Recorder: höchstens {MAX_SIGNALS} Signale ({len(signals)})")
+        self.path = path
+        self.layout = _layout(signals, channels)
+        self.rec_size = _record_size(self.layout)
+        self._frame = _frame_struct(self.layout)
+        self._names = [s.name for s in signals]
+        self._u32 = [s.kind == "u32" for s in signals]
+        self._lock = threading.Lock()  # Ring-Position + pack_into (Poll-Loop vs. Emitter)
+        self._sync_lock = threading.Lock()  # fdatasync vs. close
+        # Wanduhr = monotonic + Offset (fest ab Start, NTP-Sprünge verschieben die Records nicht)
+        self._offset_ns = time.time_ns() - time.monotonic_ns()
+
+        # vorbelegte Puffer: pro Frame wird nur umgefüllt und per pack_into geschrieben
+        self._vals = [0] * sum(1 if u32 else 3 for u32 in self._u32)
+        self._prev = list(self._vals)
+        self._prev_flags = -1
+        self._prev_ns = 0
+        self._held_ns = 0  # letzter ausgelassener (unveränderter) Frame, 0 = keiner
+        self._outage = False
+
+        blob = json.dumps(self.layout, sort_keys=True).encode()
+        if _HEAD.size + len(blob) > HEADER_SIZE:
+            raise ValueError("Recorder: Layout passt nicht in den Header")
+        capacity = max(16, int(size_mb * 1024 * 1024 - HEADER_SIZE) // self.rec_size)
+        self._fd, self._mm = self._open(path, capacity, blob)
+        self.capacity = capacity
+        (self.count,) = _COUNT.unpack_from(self._mm, _COUNT_OFF)
+
+    def _open(self, path: str, capacity: int, blob: bytes) -> Tuple[int, mmap.mmap]:
+        size = HEADER_SIZE + capacity * self.rec_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+        try:
+            st_size = os.fstat(fd).st_size
+            if st_size:
+                head = os.pread(fd, HEADER_SIZE, 0)
+                if not self._compatible(head, capacity, blob):
+                    # andere Konfig (Signale, Kanäle, Größe): alte Aufzeichnung beiseitelegen
+                    os.close(fd)
+                    fd = -1
+                    old = rotate(path)
+                    log.warning("Recorder: Layout/Größe geändert, alte Aufzeichnung -> %s", old)
+                    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+                    st_size = 0
+            if st_size != size:
+                os.ftruncate(fd, size)
+            mm = mmap.mmap(fd, size)
+        except BaseException:
+            if fd >= 0:
+                os.close(fd)
+            raise
+        if not st_size:
+            _HEAD.pack_into(mm, 0, MAGIC, VERSION, self.rec_size, capacity, 0, time.time_ns(), len(blob))
+            mm[_HEAD.size:_HEAD.size + len(blob)] = blob
+        return fd, mm  # fd bleibt offen für sync()
+
+    def _compatible(self, head: bytes, capacity: int, blob: bytes) -> bool:
+        if len(head) < _HEAD.size:
+            return False
+        magic, version, rec_size, cap, _count, _created, n = _HEAD.unpack_from(head)
+        return (
+            magic == MAGIC and version == VERSION and rec_size == self.rec_size and cap == capacity
+            and head[_HEAD.size:_HEAD.size + n] == blob
+        )
+
+    def _slot(self) -> int:
+        """Offset des nächsten Records (mit gehaltenem Lock)."""
+        return HEADER_SIZE + (self.count % self.capacity) * self.rec_size
+
+    def _commit(self) -> None:
+        # count erst nach dem Record: ein halb geschriebener Record liegt hinter dem Ende
+        self.count += 1
+        _COUNT.pack_into(self._mm, _COUNT_OFF, self.count)
+
+    def outage(self) -> None:
+        """Zyklus abgebrochen: der nächste Frame bekommt FLAG_OUTAGE."""
+        self._outage = True
+
+    def frame(self, ts_ns: int, samples: Dict[str, object], errors: Dict[str, Exception]) -> None:
+        """Sample eines Poll-Zyklus (ts_ns monotonic), aus dem Poll-Loop."""
+        vals = self._vals
+        flags = 0
+        k = 0
+        for i, name in enumerate(self._names):
+            s = samples.get(name)
+            if s is None:
+                flags |= 1 << i
+                if self._u32[i]:
+                    vals[k] = 0
+                    k += 1
+                else:
+                    vals[k] = vals[k + 1] = vals[k + 2] = 0
+                    k += 3
+            elif self._u32[i]:
+                vals[k] = s.total  # type: ignore[attr-defined]
+                k += 1
+            else:
+                vals[k], vals[k + 1], vals[k + 2] = s.phases  # type: ignore[attr-defined]
+                k += 3
+        if self._outage:
+            flags |= FLAG_OUTAGE
+            self._outage = False
+        same = flags == self._prev_flags and vals == self._prev
+        if same and ts_ns - self._prev_ns < HEARTBEAT_S * 1e9:
+            self._held_ns = ts_ns
+            return
+        with self._lock:
+            if self._held_ns and not same:
+                self._write_frame(self._held_ns, self._prev_flags & ~FLAG_OUTAGE, self._prev)
+            self._write_frame(ts_ns, flags, vals)
+        self._held_ns = 0
+        self._prev[:] = vals
+        self._prev_flags = flags
+        self._prev_ns = ts_ns
+
+    def _write_frame(self, ts_ns: int, flags: int, vals: List[int]) -> None:
+        off = self._slot()
+        _REC.pack_into(self._mm, off, ts_ns + self._offset_ns, KIND_FRAME, 0, flags)
+        self._frame.pack_into(self._mm, off + _REC.size, *vals)
+        self._commit()
+
+    def event(
+        self, kind: int, channel: int, ts_ns: int, n: int, queue: int, sent: int, interval_ms: int, output: int
+    ) -> None:
+        """Puls-Ereignis (KIND_PULSE/KIND_ADJUST), aus den Emitter-Threads."""
+        with self._lock:
+            off = self._slot()
+            _REC.pack_into(self._mm, off, ts_ns + self._offset_ns, kind, channel, 0)
+            _PULSE.pack_into(self._mm, off + _REC.size, n, queue, sent, interval_ms, output)
+            self._commit()
+
+    def track_channels(self, chans) -> None:
+        """Puls-/Abgleich-Ereignisse der Emitter mitschreiben (id = Index des Kanals)."""
+        for i, c in enumerate(chans):
+            c.emitter.on_pulses = self._pulse_observer(i)
+            c.emitter.on_adjust = self._adjust_observer(i)
+
+    def _pulse_observer(self, idx: int):
+        def observe(out, n: int, sent_ns: int, interval_ns: int, sent: int, queue: int) -> None:
+            self.event(KIND_PULSE, idx, sent_ns, n, queue, sent, interval_ns // 1_000_000, out.index)
+        return observe
+
+    def _adjust_observer(self, idx: int):
+        def observe(out, diff: int, sent: int) -> None:
+            self.event(KIND_ADJUST, idx, time.monotonic_ns(), diff, 0, sent, 0, out.index)
+        return observe
+
+    def sync(self) -> None:
+        """Auf die Platte; Frames und Puls-Ereignisse werden solange weiter geschrieben."""
+        with self._sync_lock:
+            if self._fd >= 0:
+                os.fdatasync(self._fd)
+
+    def close(self) -> None:
+        with self._sync_lock:
+            if self._fd < 0:
+                return
+            os.fdatasync(self._fd)
+            os.close(self._fd)
+            self._fd = -1
+        self._mm.close()
+
+
+def rotate(path: str) -> str:
+    """Aufzeichnung nach <path>.<zeit>.old verschieben (nie überschreiben), über KEEP_OLD hinaus die ältesten löschen."""
+    base = f"{path}.{time.strftime('%Y%m%d-%H%M%S')}"
+    dest, k = base + ".old", 1
+    while os.path.exists(dest):
+        k += 1
+        dest = f"{base}_{k}.old"  # sortiert hinter base.old
+    os.replace(path, dest)
+    d, name = os.path.split(path)
+    prefix = name + "."
+    # Zeitstempel im Namen: alphabetisch = chronologisch
+    rotated = sorted(f for f in os.listdir(d or ".") if f.startswith(prefix) and f.endswith(".old"))
+    for f in rotated[:-KEEP_OLD]:
+        try:
+            os.remove(os.path.join(d, f))
+        except OSError as e:
+            log.warning("Recorder: %s nicht gelöscht (%s)", f, e)
+    return dest
+
+
+def open_recorder(
+    record_dir: str, size_mb: float, signals: Sequence[SignalConfig], channels: Sequence[ChannelConfig]
+) -> Optional[Recorder]:
+    """Recorder für die Kanäle dieses Prozesses oder None (RECORD_DIR=off oder nicht beschreibbar)."""
+    if not record_dir or record_dir.lower() in ("off", "0", "none"):
+        return None
+    path = os.path.join(record_dir, "-".join(c.name for c in channels) + ".rec")
+    try:
+        os.makedirs(record_dir, exist_ok=True)
+        rec = Recorder(path, size_mb, signals, channels)
+    except (OSError, ValueError) as e:
+        log.warning("Warn: Recorder aus (%s: %s)", path, e)
+        return None
+    log.info(
+        "Recorder: %s (%d Records à %d Bytes, %d belegt)", path, rec.capacity, rec.rec_size, min(rec.count, rec.capacity)
+    )
+    return rec
+
+
+# =========================
+# Lesen / CLI
+# =========================
+class Recording:
+    """Lesezugriff auf eine Ring-Datei (read-only mmap, auch während der Pulser schreibt)."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rec_size, self.capacity, self.count, self.created_ns, n = _HEAD.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: keine Recorder-Datei (v{VERSION})")
+        self.layout = json.loads(self._mm[_HEAD.size:_HEAD.size + n])
+        self._frame = _frame_struct(self.layout)
+        self.signals = [s["name"] for s in self.layout["signals"]]
+        self.channels = [c["name"] for c in self.layout["channels"]]
+
+    def records(
+        self, t_from: Optional[int] = None, t_to: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, int, int, int]]:
+        """(ts_ns, kind, id, flags, Offset der Nutzlast) in Schreibreihenfolge, optional auf [t_from, t_to)."""
+        first = max(0, self.count - self.capacity)
+        mm, size = self._mm, self.rec_size
+        for i in range(first, self.count):
+            off = HEADER_SIZE + (i % self.capacity) * size
+            ts, kind, ident, flags = _REC.unpack_from(mm, off)
+            if t_from is not None and ts < t_from:
+                continue
+            if t_to is not None and ts >= t_to:
+                continue
+            yield ts, kind, ident, flags, off + _REC.size
+
+    def frame_values(self, off: int) -> Dict[str, Tuple[int, ...]]:
+        """Werte je Signal: u16x3 -> (L1, L2, L3), u32 -> (Gesamt,)."""
+        raw = self._frame.unpack_from(self._mm, off)
+        out: Dict[str, Tuple[int, ...]] = {}
+        k = 0
+        for s in self.layout["signals"]:
+            n = 3 if s["kind"] == "u16x3" else 1
+            out[s["name"]] = tuple(raw[k:k + n])
+            k += n
+        return out
+
+    def frames(
+        self, t_from: Optional[int] = None, t_to: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, Dict[str, Tuple[int, ...]]]]:
+        """(ts_ns, flags, Werte je Signal) aller Frames."""
+        for ts, kind, _ident, flags, off in self.records(t_from, t_to):
+            if kind == KIND_FRAME:
+                yield ts, flags, self.frame_values(off)
+
+    def pulse(self, off: int) -> Tuple[int, int, int, int, int]:
+        """(n, queue, sent, interval_ms, output)."""
+        return _PULSE.unpack_from(self._mm, off)
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def channel_power(ch: dict, values: Dict[str, Tuple[int, ...]], missing: set) -> Optional[int]:
+    """Kanalleistung wie ChannelTable: Pflichtsignal fehlt -> None, optionale -> 0 W, gedeckelt."""
+    terms = ch["terms"]
+    if terms[0][0] in missing:
+        return None
+    p = 0
+    for sig, sign, *phase in terms:
+        if sig not in missing:
+            p += sign * (values[sig][phase[0]] if phase else sum(values[sig]))
+    return max(0, min(ch["max_power_w"], p))
+
+
+def energy_totals(rec: Recording, t_from: Optional[int], t_to: Optional[int]) -> List[dict]:
+    """Je Kanal: integrierte Energie (Trapez zwischen Frames) gegen gesendete Pulse."""
+    chans = rec.layout["channels"]
+    out = [
+        {"channel": c["name"], "wns": 0, "pulses": 0, "adjust": 0, "frames": 0, "outages": 0,
+         "first_ns": None, "last_ns": None, "wns_per_pulse": c["wns_per_pulse"]}
+        for c in chans
+    ]
+    prev: List[Optional[Tuple[int, int]]] = [None] * len(chans)
+    for ts, kind, ident, flags, off in rec.records(t_from, t_to):
+        if kind == KIND_FRAME:
+            values = rec.frame_values(off)
+            missing = {name for i, name in enumerate(rec.signals) if flags & (1 << i)}
+            for i, c in enumerate(chans):
+                p = channel_power(c, values, missing)
+                if p is None:
+                    continue
+                acc = out[i]
+                if prev[i] is not None:
+                    pts, pp = prev[i]  # type: ignore[misc]
+                    acc["wns"] += (pp + p) * (ts - pts) // 2
+                if flags & FLAG_OUTAGE:
+                    acc["outages"] += 1
+                acc["frames"] += 1
+                acc["first_ns"] = acc["first_ns"] or ts
+                acc["last_ns"] = ts
+                prev[i] = (ts, p)
+        elif ident < len(out):
+            n = rec.pulse(off)[0]
+            out[ident]["pulses" if kind == KIND_PULSE else "adjust"] += n
+    return out
+
+
+def parse_time(s: Optional[str]) -> Optional[int]:
+    """ISO (lokale Zeit), Unix-Sekunden oder relativ zu jetzt (-2h, -30m, -1d) -> Wanduhr ns."""
+    if s is None:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if s.startswith("-") and s[-1] in units:
+        return time.time_ns() - int(float(s[1:-1]) * units[s[-1]] * 1e9)
+    try:
+        return int(float(s) * 1e9)
+    except ValueError:
+        return int(datetime.fromisoformat(s).timestamp() * 1e9)
+
+
+def _fmt_ts(ts_ns: int) -> str:
+    return datetime.fromtimestamp(ts_ns / 1e9).isoformat(timespec="milliseconds")
+
+
+def _dump(rec: Recording, t_from: Optional[int], t_to: Optional[int], kind: Optional[int]) -> None:
+    for ts, k, ident, flags, off in rec.records(t_from, t_to):
+        if kind is not None and k != kind:
+            continue
+        if k == KIND_FRAME:
+            values = rec.frame_values(off)
+            parts = []
+            for i, name in enumerate(rec.signals):
+                v = values[name]
+                if flags & (1 << i):
+                    parts.append(f"{name}=-")
+                elif len(v) == 1:
+                    parts.append(f"{name}={v[0]}")
+                else:
+                    parts.append(f"{name}={sum(v)}({'/'.join(str(x) for x in v)})")
+            mark = " OUTAGE" if flags & FLAG_OUTAGE else ""
+            print(f"{_fmt_ts(ts)} frame {' '.join(parts)}{mark}")
+        else:
+            n, queue, sent, interval_ms, output = rec.pulse(off)
+            ch = rec.channels[ident] if ident < len(rec.channels) else str(ident)
+            if k == KIND_PULSE:
+                batch = f" batch={interval_ms}ms" if n > 1 else ""
+                print(f"{_fmt_ts(ts)} pulse  [{ch}] n={n} sent={sent} queue={queue} output={output}{batch}")
+            else:
+                print(f"{_fmt_ts(ts)} adjust [{ch}] n={n:+d} sent={sent}")
+
+
+def _energy(rec: Recording, t_from: Optional[int], t_to: Optional[int]) -> None:
+    print(
+        f"{'channel':<8} {'von':<23} {'bis':<23} {'frames':>7} {'Wh integriert':>14} {'pulses':>7} "
+        f"{'Wh Pulse':>9} {'diff Wh':>8}"
+    )
+    for r in energy_totals(rec, t_from, t_to):
+        wh = r["wns"] / 3.6e12
+        pulses = r["pulses"] + r["adjust"]
+        pwh = pulses * r["wns_per_pulse"] / 3.6e12
+        first = _fmt_ts(r["first_ns"]) if r["first_ns"] else "-"
+        last = _fmt_ts(r["last_ns"]) if r["last_ns"] else "-"
+        line = (
+            f"{r['channel']:<8} {first:<23} {last:<23} {r['frames']:>7} {wh:>14.2f} {pulses:>7} "
+            f"{pwh:>9.2f} {pwh - wh:>8.2f}"
+        )
+        if r["outages"]:
+            line += f"  ({r['outages']} Ausfälle)"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python3 -m pulsar.recorder", description="Recorder-Datei auswerten")
+    ap.add_argument("command", choices=("dump", "energy"))
+    ap.add_argument("file")
+    ap.add_argument("--from", dest="t_from", help="ISO-Zeit, Unix-Sekunden oder relativ (-2h)")
+    ap.add_argument("--to", dest="t_to")
+    ap.add_argument("--kind", choices=tuple(KINDS), help="nur diese Records (dump)")
+    args = ap.parse_args(argv)
+
+    rec = Recording(args.file)
+    t_from, t_to = parse_time(args.t_from), parse_time(args.t_to)
+    try:
+        if args.command == "dump":
+            _dump(rec, t_from, t_to, KINDS.get(args.kind) if args.kind else None)
+        else:
+            _energy(rec, t_from, t_to)
+    except BrokenPipeError:
+        pass  # z.B. | head
+    finally:
+        rec.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Konfig zur Laufzeit neu laden (SIGHUP, `systemctl reload pulser@pv`), ohne Neustart.
+
+Gelesen wird die Env-Datei aus --env-file (die Unit übergibt /etc/pv-tools/<name>.env):
+ihre Keys ersetzen die bisherigen, aus der Datei entfernte Keys fallen weg (Default gilt).
+Validiert wird wie beim Start, bei geänderten Kanälen werden die neuen Kanäle samt Emittern
+schon gebaut, solange die alten noch senden. Ist die neue Konfig ungültig, bleibt die laufende
+unverändert und der Fehler steht im Log.
+
+Übernommen wird zwischen zwei Poll-Zyklen (Cycle.reconfigure):
+- Kanäle (IMP_PER_KWH, Terme, Shelly, Scheduler, MAX_QUEUE ...): Tabelle und Emitter werden
+  neu gebaut. Bei gleicher Pulswertigkeit behalten die Pulse der Queue ihre Fälligkeit,
+  sonst werden Energie-Rest + Queue energiegleich umgerechnet (wie beim Restore);
+  Leistung, Zeitstempel, gesendete Pulse und Lückenzähler laufen weiter.
+- Modbus: neue Verbindung nur bei neuem Endpunkt (VENUS_IP, VENUS_PORT, MODBUS_TIMEOUT_S, MODBUS_PIPELINE);
+  geänderte Signale, MODBUS_MERGE_GAP oder Backoff planen nur die Reads neu.
+- Pollen, LOG_LEVEL, LOG_EVERY_S, STATE_HOLD_MAX_S/STATE_SYNC_S, Recorder, Proxy-Cache-Alter.
+Erst nach einem Neustart: RUNTIME, METRICS_*, MODBUS_PROXY_BIND/PORT, STATE_DIR, LOG_FORMAT, LOG_RATE_*,
+COUNTER_PUSH_*.
+"""
+import logging
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Type
+
+from .channel import Channel
+from .config import EngineConfig, ModbusConfig, load_engine_config, read_env_file
+from .emitter import PulseEmitter
+from .state import StateStore, open_store
+from .table import ChannelTable
+
+log = logging.getLogger(__name__)
+
+# so lange dürfen laufende Shelly-Trigger beim Umbau der Emitter noch fertig werden
+STOP_TIMEOUT_S = 2.0
+RESTART_ONLY = (
+    "runtime", "metrics_bind", "metrics_port", "proxy_bind", "proxy_port", "state_dir",
+    "log_format", "log_rate_burst", "log_rate_window_s", "counter_push_url", "counter_push_s",
+)
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Was ein Reload umbauen muss."""
+
+    cfg: EngineConfig
+    changed: Tuple[str, ...]  # fürs Log
+    channels: bool  # Tabelle + Kanäle (Emitter) neu
+    endpoint: bool  # neue Modbus-Verbindung
+    reads: bool  # Poller neu (Signale, MERGE_GAP, Backoff)
+    recorder: bool  # Recorder neu öffnen
+    chans: Tuple[Channel, ...] = ()  # bei channels: neue Kanäle, Zustand übernimmt adopt_channels
+
+
+def _endpoint(m: ModbusConfig) -> ModbusConfig:
+    return replace(m, merge_gap=0, backoff_min_s=0.0, backoff_max_s=0.0)
+
+
+def _recorder_layout(cfg: EngineConfig) -> tuple:
+    return (
+        cfg.record_dir, cfg.record_size_mb, cfg.used_signals(),
+        tuple((c.name, c.terms, c.max_power_w, c.wns_per_pulse) for c in cfg.channels),
+    )
+
+
+def _channel_changes(old: EngineConfig, new: EngineConfig) -> List[str]:
+    before = {c.name: c for c in old.channels}
+    out = []
+    for c in new.channels:
+        prev = before.pop(c.name, None)
+        if prev is None:
+            out.append(f"+{c.name}")
+        elif prev != c:
+            keys = [f.name for f in fields(c) if getattr(prev, f.name) != getattr(c, f.name)]
+            out.append(f"{c.name}({','.join(keys)})")
+    out.extend(f"-{name}" for name in before)
+    return out
+
+
+class Reloader:
+    """Env-Datei + Kanäle des Prozesses; plan() lädt neu, validiert und vergleicht mit der laufenden Konfig."""
+
+    def __init__(self, env_file: Optional[str], channels: Optional[Tuple[str, ...]]):
+        self.env_file = env_file
+        self.channels = channels
+        self._keys: Set[str] = set()  # Keys, die zuletzt aus der Datei kamen
+
+    def load_env(self) -> None:
+        """Env-Datei in os.environ übernehmen (beim Start und bei jedem Reload)."""
+        if self.env_file is None:
+            return
+        try:
+            env: Dict[str, str] = read_env_file(self.env_file)
+        except FileNotFoundError:
+            env = {}  # wie EnvironmentFile=-: fehlende Datei = keine Keys
+        for k in self._keys - env.keys():
+            os.environ.pop(k, None)
+        os.environ.update(env)
+        self._keys = set(env)
+
+    def plan(
+        self, old: EngineConfig, chans: Sequence[Channel], emitter_cls: Type[PulseEmitter]
+    ) -> Optional[Plan]:
+        """
+        Neue Konfig laden; None = ungültig (läuft unverändert weiter) oder nichts geändert.
+        chans/emitter_cls: laufende Kanäle, bei geänderten Kanälen werden die neuen hier gebaut.
+        """
+        saved, keys = dict(os.environ), self._keys
+        try:
+            self.load_env()
+            plan = _diff(old, load_engine_config(self.channels))
+            if plan is not None and plan.channels:
+                # Tabelle (INTEGRATION/GAP_POLICY) und Emitter prüfen, bevor die alten gestoppt werden
+                plan = replace(plan, chans=tuple(build_channels(plan.cfg, chans, emitter_cls)))
+        except (OSError, ValueError) as e:
+            os.environ.clear()
+            os.environ.update(saved)
+            self._keys = keys
+            log.error("Reload: Konfig ungültig, laufende bleibt aktiv (%s)", e, extra={"key": "reload"})
+            return None
+        if plan is None:
+            log.info("Reload: keine Änderung")
+            return None
+        restart = [k for k in RESTART_ONLY if getattr(old, k) != getattr(plan.cfg, k)]
+        if restart:
+            log.warning("Reload: %s gilt erst nach einem Neustart", ", ".join(restart))
+        return plan
+
+
+def _diff(old: EngineConfig, cfg: EngineConfig) -> Optional[Plan]:
+    changed = [
+        f.name for f in fields(cfg)
+        if f.name not in ("channels", "signals", "modbus") and getattr(old, f.name) != getattr(cfg, f.name)
+    ]
+    if old.modbus != cfg.modbus:
+        changed.append("modbus")
+    if old.signals != cfg.signals:
+        changed.append("signals")
+    changed += _channel_changes(old, cfg)
+    if not changed:
+        return None
+    endpoint = _endpoint(old.modbus) != _endpoint(cfg.modbus)
+    kinds = [[(s.name, s.kind) for s in c.used_signals()] for c in (old, cfg)]
+    return Plan(
+        cfg=cfg,
+        changed=tuple(changed),
+        channels=old.channels != cfg.channels or kinds[0] != kinds[1],
+        endpoint=endpoint,
+        reads=endpoint or old.modbus != cfg.modbus or old.used_signals() != cfg.used_signals(),
+        recorder=_recorder_layout(old) != _recorder_layout(cfg),
+    )
+
+
+def build_channels(cfg: EngineConfig, old: Sequence[Channel], emitter_cls: Type[PulseEmitter]) -> List[Channel]:
+    """
+    Neue Tabelle + Kanäle (Emitter noch nicht gestartet) für cfg, die alten laufen weiter.
+    Kanäle gleichen Namens behalten ihren StateStore, neue öffnen ihren; bei einem Fehler
+    werden die neu geöffneten wieder geschlossen.
+    """
+    labels = {name: s.label for name, s in cfg.signals.items()}
+    table = ChannelTable(cfg.channels, cfg.used_signals())
+    stores = {c.name: c.store for c in old}
+    opened: List[StateStore] = []
+    chans: List[Channel] = []
+    try:
+        for i, c in enumerate(cfg.channels):
+            if c.name in stores:
+                store = stores[c.name]
+            else:
+                store = open_store(cfg.state_dir, c.name)
+                if store is not None:
+                    opened.append(store)
+            chans.append(Channel(c, labels, table, i, store=store, emitter_cls=emitter_cls))
+    except BaseException:
+        for store in opened:
+            store.close()
+        raise
+    return chans
+
+
+def adopt_channels(new: Sequence[Channel], old: Sequence[Channel], hold_max_s: float) -> List[Channel]:
+    """
+    Kanäle aus build_channels in Betrieb nehmen (die Emitter der alten müssen gestoppt sein):
+    gleiche Namen übernehmen den Zustand der alten, neue laden ihren StateStore, entfernte werden gesichert.
+    """
+    by_name = {c.name: c for c in old}
+    for ch in new:
+        prev = by_name.pop(ch.name, None)
+        if prev is not None:
+            ch.take_over(prev)
+        else:
+            ch.restore(hold_max_s)
+    for prev in by_name.values():
+        prev.checkpoint()
+        if prev.store is not None:
+            prev.store.close()
+        log.info("[%s] Kanal entfernt (Zustand gesichert)", prev.name)
+    return list(new)
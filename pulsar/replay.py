@@ -0,0 +1,386 @@
+"""
+Replay: aufgezeichnete Leistung mit virtueller Uhr durch Integration und Puls-Scheduling schicken.
+
+Es laufen dieselben Klassen wie im Betrieb (ChannelTable, Channel mit Pulsernte,
+PulseEmitter mit PulseScheduler, Ausgangs-Verteilung, Batches); nur die Ausgänge senden
+nicht, sondern melden nach --latency-ms auf der virtuellen Uhr "gesendet". Ein Tag
+5-Hz-Daten läuft so in Sekunden, und Änderungen an IMP_PER_KWH, MIN_TRIGGER_INTERVAL_S,
+MAX_QUEUE/BACKLOG_POLICY, INTEGRATION/GAP_POLICY oder an der Integration lassen sich direkt
+gegen dieselbe Aufzeichnung vergleichen.
+
+Eingaben:
+  *.rec  Recorder-Datei (RECORD_DIR): Frames wie gepollt, inkl. Ausfällen und fehlenden Signalen
+  *.csv  Spalte t (Sekunden) und je Signal Watt (z.B. t,pv,house,hp,chg wie bench/profiles),
+         leere Zelle = Signal fehlt, u16x3-Signale gleichmäßig auf L1-L3 verteilt; jede Zeile ist ein Sample
+Vom Recorder ausgelassene (unveränderte) Zyklen werden wieder aufgefüllt, sonst sähe die
+Integration dort Lücken.
+
+Konfig aus der Umgebung wie bei den Pulsern, dazu --env-file und --set KEY=VAL.
+Ausgabe je Kanal: Referenz-Energie (Trapez über alle Samples, unabhängig von GAP_POLICY)
+gegen gesendete Pulse, Rest, verworfene Pulse, max. Queue, Verspätung und Jitter;
+mit --pulses die Puls-Zeitleiste als CSV.
+
+  python3 -m pulsar.replay /var/lib/pv-tools/record/pv.rec --env-file /etc/pv-tools/pv.env --channels pv
+  python3 -m pulsar.replay trace.csv --set IMP_PER_KWH=1000 --set MIN_TRIGGER_INTERVAL_S=0.2 --pulses -
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .channel import Channel
+from .config import EngineConfig, SignalConfig, load_engine_config, read_env_file
+from .emitter import Output, PulseEmitter
+from .log import setup_logging, shutdown_logging
+from .modbus import SignalSample
+from .recorder import FLAG_OUTAGE, MAGIC, Recording, parse_time
+from .table import ChannelTable
+
+log = logging.getLogger(__name__)
+
+# (ts_ns, Ausfall davor, Samples je Signal)
+Sample = Tuple[int, bool, Dict[str, SignalSample]]
+
+
+# =========================
+# Eingaben
+# =========================
+def read_recording(path: str, t_from: Optional[int], t_to: Optional[int]) -> Tuple[Tuple[str, ...], Iterator[Sample]]:
+    rec = Recording(path)
+
+    def samples() -> Iterator[Sample]:
+        try:
+            for ts, flags, values in rec.frames(t_from, t_to):
+                s: Dict[str, SignalSample] = {}
+                for i, name in enumerate(rec.signals):
+                    if not flags & (1 << i):
+                        v = values[name]
+                        s[name] = SignalSample(sum(v), v)
+                yield ts, bool(flags & FLAG_OUTAGE), s
+        finally:
+            rec.close()
+
+    return tuple(rec.signals), samples()
+
+
+def read_csv(
+    path: str, t_from: Optional[int], t_to: Optional[int], signals: Dict[str, SignalConfig]
+) -> Tuple[Tuple[str, ...], Iterator[Sample]]:
+    rows: List[Sample] = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        names = tuple(n for n in (reader.fieldnames or ()) if n != "t")
+        for row in reader:
+            ts = int(float(row["t"]) * 1e9)
+            if (t_from is not None and ts < t_from) or (t_to is not None and ts >= t_to):
+                continue
+            s: Dict[str, SignalSample] = {}
+            for n in names:
+                if row.get(n):
+                    w = int(float(row[n]))
+                    if n in signals and signals[n].kind == "u16x3":
+                        s[n] = SignalSample(w, (w - 2 * (w // 3), w // 3, w // 3))
+                    else:
+                        s[n] = SignalSample(w, (w,))
+            rows.append((ts, False, s))
+    rows.sort(key=lambda r: r[0])
+    return names, iter(rows)
+
+
+def open_trace(
+    path: str, t_from: Optional[int], t_to: Optional[int], signals: Dict[str, SignalConfig]
+) -> Tuple[Tuple[str, ...], Iterator[Sample]]:
+    """(Signalnamen, Samples in Zeitreihenfolge) aus Recorder-Datei oder CSV."""
+    with open(path, "rb") as f:
+        is_rec = f.read(len(MAGIC)) == MAGIC
+    return read_recording(path, t_from, t_to) if is_rec else read_csv(path, t_from, t_to, signals)
+
+
+# =========================
+# Virtuelle Ausgänge / Emitter
+# =========================
+class ReplayOutput(Output):
+    """Ausgang ohne Thread und ohne HTTP, den Trigger erledigt ReplayEmitter.advance()."""
+
+    def _make_transport(self):
+        return None
+
+    def start(self) -> None:
+        pass
+
+    def wake(self) -> None:
+        pass
+
+    def assign(self, deadlines_ns: List[int], interval_ns: int) -> None:
+        self.busy = True
+        self._job = (deadlines_ns, interval_ns)
+
+
+class ReplayEmitter(PulseEmitter):
+    """PulseEmitter auf virtueller Uhr: advance() arbeitet alles bis zu einem Zeitpunkt ab."""
+
+    output_cls = ReplayOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.now_ns: Optional[int] = None
+        self.latency_ns = 0
+        self.timeline: Optional[List[Tuple[int, int, int, int, int, int]]] = None
+        # Ausgang -> (Deadlines, Abstand, gesendet um, fertig um)
+        self._pending: Dict[int, Tuple[List[int], int, int, int]] = {}
+
+    def start(self) -> None:
+        pass
+
+    def stop(self, timeout: float = 5.0) -> None:
+        pass
+
+    def advance(self, until_ns: Optional[int]) -> None:
+        """Virtuelle Zeit bis until_ns laufen lassen (None = bis die Queue leer ist)."""
+        now = self.now_ns if self.now_ns is not None else until_ns
+        assert now is not None
+        while True:
+            for o in self.outputs:
+                p = self._pending.get(o.index)
+                if p is not None and p[3] <= now:
+                    del self._pending[o.index]
+                    self._done(o, p[0], p[1], p[2], None)
+            wait_ns = self._dispatch(now)
+            for o in self.outputs:
+                if o._job is not None:
+                    deadlines, interval_ns = o._job
+                    o._job = None
+                    self._pending[o.index] = (deadlines, interval_ns, now, now + self.latency_ns)
+            if wait_ns == 0:
+                continue
+            events = [p[3] for p in self._pending.values()]
+            if wait_ns is not None:
+                events.append(now + wait_ns)
+            if not events:
+                break
+            nxt = min(events)
+            if until_ns is not None and nxt > until_ns:
+                break
+            now = nxt
+        self.now_ns = now if until_ns is None else max(now, until_ns)
+
+    def _done(
+        self, out: Output, deadlines_ns: List[int], interval_ns: int, sent_ns: int, err: Optional[Exception]
+    ) -> None:
+        super()._done(out, deadlines_ns, interval_ns, sent_ns, err)
+        if self.timeline is not None:
+            self.timeline.append(
+                (sent_ns, out.index, len(deadlines_ns), self.pulses_sent, self.queue, sent_ns - deadlines_ns[0])
+            )
+
+
+# =========================
+# Replay
+# =========================
+@dataclass
+class ChannelResult:
+    channel: str
+    imp_per_kwh: int
+    samples: int
+    ref_wh: float
+    pulses: int
+    expected_pulses: float
+    energy_err_wh: float
+    rest_wh: float
+    dropped: int
+    gaps: int
+    max_queue: int
+    late_avg_ms: float
+    late_max_ms: float
+    jitter_rms_ms: float
+    jitter_max_ms: float
+    drain_s: float
+
+
+class Replay:
+    def __init__(self, cfg: EngineConfig, latency_ms: float = 0.0, timeline: bool = False):
+        self.cfg = cfg
+        labels = {name: s.label for name, s in cfg.signals.items()}
+        self.table = ChannelTable(cfg.channels, cfg.used_signals())
+        self.chans = [Channel(c, labels, self.table, i, emitter_cls=ReplayEmitter) for i, c in enumerate(cfg.channels)]
+        for ch in self.chans:
+            ch.emitter.latency_ns = int(latency_ms * 1e6)
+            if timeline:
+                ch.emitter.timeline = []
+        # ausgelassene Zyklen im Raster von POLL_MAX_S auffüllen (wie der Poll-Loop bei stehender Leistung)
+        self.fill_ns = int(cfg.poll_max_s * 1e9)
+        self.samples = [0] * len(self.chans)
+        self.ref_wns = [0] * len(self.chans)
+        self.max_queue = [0] * len(self.chans)
+        self._ref_prev: List[Optional[Tuple[int, int]]] = [None] * len(self.chans)
+        self.first_ns: Optional[int] = None
+        self.last_ns: Optional[int] = None
+
+    def run(self, trace: Iterator[Sample]) -> None:
+        prev: Optional[Sample] = None
+        for ts, outage, samples in trace:
+            if prev is not None:
+                if ts <= prev[0]:
+                    continue
+                # vom Recorder ausgelassene Zyklen: gleiche Werte an beiden Enden, kein Ausfall dazwischen
+                if not outage and samples == prev[2] and ts - prev[0] > self.fill_ns:
+                    t = prev[0] + self.fill_ns
+                    while t < ts - self.fill_ns // 2:
+                        self._step(t, False, samples)
+                        t += self.fill_ns
+            self._step(ts, outage, samples)
+            prev = (ts, outage, samples)
+        for ch in self.chans:
+            ch.emitter.advance(None)
+
+    def _step(self, ts: int, outage: bool, samples: Dict[str, SignalSample]) -> None:
+        if self.first_ns is None:
+            self.first_ns = ts
+        self.last_ns = ts
+        table = self.table
+        for ch in self.chans:
+            ch.emitter.advance(ts)
+        if outage:
+            table.mark_outage()
+        for i in table.update(ts, samples):
+            self.chans[i].harvest()
+        for i, ch in enumerate(self.chans):
+            ch.settle()
+            if table.last_ts[i] != ts:
+                continue  # Pflichtsignal fehlte
+            self.samples[i] += 1
+            p = ch.power_w
+            ref = self._ref_prev[i]
+            if ref is not None:
+                self.ref_wns[i] += (ref[1] + p) * (ts - ref[0]) // 2
+            self._ref_prev[i] = (ts, p)
+            q = ch.pulse_queue
+            if q > self.max_queue[i]:
+                self.max_queue[i] = q
+
+    def results(self) -> List[ChannelResult]:
+        out = []
+        for i, ch in enumerate(self.chans):
+            em, wpp = ch.emitter, ch.cfg.wns_per_pulse
+            j = em.jitter
+            end = em.now_ns if em.now_ns is not None else 0
+            out.append(ChannelResult(
+                channel=ch.name,
+                imp_per_kwh=ch.cfg.imp_per_kwh,
+                samples=self.samples[i],
+                ref_wh=round(self.ref_wns[i] / 3.6e12, 3),
+                pulses=em.pulses_sent,
+                expected_pulses=round(self.ref_wns[i] / wpp, 2),
+                energy_err_wh=round((em.pulses_sent * wpp - self.ref_wns[i]) / 3.6e12, 3),
+                rest_wh=round(ch.energy_wns / 3.6e12, 3),
+                dropped=ch.dropped_pulses,
+                gaps=ch.gaps,
+                max_queue=self.max_queue[i],
+                late_avg_ms=round(j.late_sum_ns / j.count / 1e6, 1) if j.count else 0.0,
+                late_max_ms=round(j.late_max_ns / 1e6, 1),
+                jitter_rms_ms=round(math.sqrt(j.jitter_sq_sum / j.jitter_n) / 1e6, 1) if j.jitter_n else 0.0,
+                jitter_max_ms=round(j.jitter_max_ns / 1e6, 1),
+                drain_s=round(max(0, end - (self.last_ns or end)) / 1e9, 1),
+            ))
+        return out
+
+    def write_timeline(self, f) -> None:
+        """Puls-Zeitleiste: t in Sekunden ab erstem Sample, late = gesendet - Deadline."""
+        rows = [
+            (sent_ns, ch.name, o, n, sent, queue, late_ns)
+            for ch in self.chans for sent_ns, o, n, sent, queue, late_ns in (ch.emitter.timeline or [])
+        ]
+        rows.sort(key=lambda r: r[0])
+        t0 = self.first_ns or 0
+        w = csv.writer(f)
+        w.writerow(("t", "channel", "output", "n", "sent", "queue", "late_ms"))
+        for sent_ns, name, o, n, sent, queue, late_ns in rows:
+            w.writerow((f"{(sent_ns - t0) / 1e9:.3f}", name, o, n, sent, queue, f"{late_ns / 1e6:.1f}"))
+
+
+def _print_table(results: List[ChannelResult], f) -> None:
+    print(
+        f"{'channel':<8} {'samples':>8} {'Wh ref':>9} {'pulses':>7} {'expected':>9} {'err Wh':>7} {'rest Wh':>7} "
+        f"{'dropped':>7} {'gaps':>5} {'max q':>5} {'late avg':>9} {'late max':>9} {'jit rms':>8} {'drain s':>7}",
+        file=f,
+    )
+    print("-" * 118, file=f)
+    for r in results:
+        print(
+            f"{r.channel:<8} {r.samples:>8} {r.ref_wh:>9.2f} {r.pulses:>7} {r.expected_pulses:>9.2f} "
+            f"{r.energy_err_wh:>7.2f} {r.rest_wh:>7.2f} {r.dropped:>7} {r.gaps:>5} {r.max_queue:>5} "
+            f"{r.late_avg_ms:>7.1f}ms {r.late_max_ms:>7.1f}ms {r.jitter_rms_ms:>6.1f}ms {r.drain_s:>7.1f}",
+            file=f,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python3 -m pulsar.replay", description="Aufzeichnung mit virtueller Uhr durch die Pulser-Logik schicken"
+    )
+    ap.add_argument("trace", help="Recorder-Datei (.rec) oder CSV (t,<signal>,...)")
+    ap.add_argument("--env-file", action="append", default=[], metavar="FILE", help="z.B. /etc/pv-tools/engine.env")
+    ap.add_argument("--set", action="append", default=[], metavar="KEY=VAL", help="Konfig überschreiben")
+    ap.add_argument("--channels", help="Kanäle (Default: CHANNELS bzw. pv,wp,house)")
+    ap.add_argument("--from", dest="t_from", help="ISO-Zeit, Sekunden oder relativ (--from=-2h)")
+    ap.add_argument("--to", dest="t_to")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Dauer eines Shelly-Triggers (virtuell)")
+    ap.add_argument("--pulses", metavar="FILE", help="Puls-Zeitleiste als CSV (- = stdout)")
+    ap.add_argument("--log-level", default="WARNING")
+    ap.add_argument("--json", action="store_true", help="Ergebnis als JSON")
+    args = ap.parse_args(argv)
+
+    for path in args.env_file:
+        os.environ.update(read_env_file(path))
+    for kv in args.set:
+        k, _, v = kv.partition("=")
+        os.environ[k] = v
+    setup_logging(args.log_level)
+    try:
+        channels = tuple(c.strip() for c in args.channels.split(",") if c.strip()) if args.channels else None
+        cfg = load_engine_config(channels)
+        names, trace = open_trace(args.trace, parse_time(args.t_from), parse_time(args.t_to), cfg.signals)
+        missing = sorted({s.name for s in cfg.used_signals()} - set(names))
+        if missing:
+            raise ValueError(f"{args.trace}: Signal(e) fehlen in der Aufzeichnung: {', '.join(missing)}")
+
+        replay = Replay(cfg, args.latency_ms, timeline=args.pulses is not None)
+        t0 = time.perf_counter()
+        replay.run(trace)
+        wall = time.perf_counter() - t0
+        results = replay.results()
+    except (OSError, ValueError) as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return 2
+    finally:
+        shutdown_logging()
+
+    if args.pulses == "-":
+        replay.write_timeline(sys.stdout)
+    elif args.pulses:
+        with open(args.pulses, "w", newline="") as f:
+            replay.write_timeline(f)
+
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+        return 0
+    span = ((replay.last_ns or 0) - (replay.first_ns or 0)) / 1e9
+    # Zeitleiste auf stdout: Zusammenfassung nach stderr
+    out = sys.stderr if args.pulses == "-" else sys.stdout
+    print(
+        f"Replay: {args.trace} | {span / 3600:.2f} h virtuell in {wall:.2f}s "
+        f"({span / wall if wall > 0 else 0:.0f}x Echtzeit)",
+        file=out,
+    )
+    _print_table(results, out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
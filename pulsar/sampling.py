@@ -0,0 +1,70 @@
+"""
+Adaptives Poll-Intervall: schnell, wenn sich die Leistung ändert, langsam, wenn sie steht.
+
+- Leistungssprung >= change_w (irgendein Kanal) seit dem letzten Sample -> min_s
+- sonst wächst das Intervall je Sample um `growth` bis max_s,
+  stehen alle Kanäle auf 0 W (nachts) bis idle_s
+- steht die nächste Pulsschwelle (aus aktueller Leistung hochgerechnet) vorher an,
+  wird kurz danach gepollt, damit der Puls ohne Poll-Verzug geerntet wird
+
+Ein Sprung um dP zwischen zwei Polls im Abstand T wird linear interpoliert, der Fehler
+ist höchstens dP * T / 2 - deshalb lange Pausen nur bei 0 W, kurze bei Leistung.
+Mit min_s == max_s == idle_s verhält sich der Loop wie bisher mit festem POLL_INTERVAL_S.
+Alle Zeiten in monotonic ns, gerechnet ab der geplanten Startzeit des Zyklus (clock.Ticker).
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+# so lange nach der erwarteten Pulsschwelle pollen (Schwelle sicher überschritten)
+ALIGN_MARGIN_NS = 20_000_000
+
+
+class PollController:
+    def __init__(self, min_s: float, max_s: float, idle_s: float, change_w: int, growth: float = 1.5):
+        self.min_ns = int(min_s * 1e9)
+        self.max_ns = max(self.min_ns, int(max_s * 1e9))
+        self.idle_ns = max(self.max_ns, int(idle_s * 1e9))
+        self.change_w = change_w
+        self.growth = growth
+        self.interval_ns = self.min_ns  # aktuelles Grund-Intervall (ohne Ausrichtung auf Pulse)
+        self.last_wait_ns = self.min_ns  # zuletzt tatsächlich geplanter Abstand
+        self._prev: Dict[str, int] = {}
+
+    @property
+    def adaptive(self) -> bool:
+        return self.idle_ns > self.min_ns
+
+    def next_wake(self, base_ns: int, powers: Iterable[Tuple[str, int]], crossings: Iterable[Optional[int]]) -> int:
+        """
+        Zeitpunkt des nächsten Polls, base_ns = geplante Startzeit des aktuellen Zyklus (nicht Read-Ende).
+        powers: (Kanal, W) des Samples, crossings: erwartete nächste Pulsschwelle je Kanal (None = keine).
+        """
+        if not self.adaptive:
+            self.last_wait_ns = self.min_ns
+            return base_ns + self.min_ns
+
+        jump = 0
+        idle = True
+        for name, w in powers:
+            prev = self._prev.get(name)
+            if prev is not None:
+                jump = max(jump, abs(w - prev))
+            idle = idle and w == 0 and prev == 0
+            self._prev[name] = w
+        if jump >= self.change_w:
+            self.interval_ns = self.min_ns
+        else:
+            cap = self.idle_ns if idle else self.max_ns
+            self.interval_ns = min(cap, max(self.min_ns, int(self.interval_ns * self.growth)))
+
+        wake = base_ns + self.interval_ns
+        for c in crossings:
+            if c is not None and c + ALIGN_MARGIN_NS < wake:
+                wake = c + ALIGN_MARGIN_NS
+        wake = max(wake, base_ns + self.min_ns)
+        self.last_wait_ns = wake - base_ns
+        return wake
+
+    def reset(self) -> None:
+        """Nach Fehlern wieder schnell anfangen."""
+        self.interval_ns = self.min_ns
+        self._prev.clear()
@@ -0,0 +1,104 @@
+"""
+Puls-Scheduler: plant Sendezeitpunkte statt "1 Puls pro Loop".
+
+Jeder Puls kommt mit dem Zeitpunkt, zu dem die integrierte Energie die Pulsschwelle
+überschritten hat (`due_ns`). Gesendet wird um eine feste Verzögerung später
+(`delay_ns`, deckt Poll-Intervall + Modbus-Latenz ab), damit der Abstand der Pulse
+dem Energiefluss entspricht und nicht dem Poll-Raster.
+
+Liegt der Scheduler zurück (Shelly-Ausfall, Leistungsspitze), wird der Rückstand
+gleichmäßig mit höchstens `max_rate_hz` abgebaut statt in Bursts.
+
+Alle Zeiten in monotonic ns, ohne eigene Uhr -> auch mit virtueller Zeit nutzbar.
+"""
+import math
+from collections import deque
+from typing import Deque, Iterable, List, Optional
+
+
+class PulseScheduler:
+    def __init__(self, delay_ns: int, min_gap_ns: int):
+        self.delay_ns = delay_ns
+        self.min_gap_ns = min_gap_ns  # Mindestabstand zweier Pulse (Relais + max. Rate)
+        self._due: Deque[int] = deque()
+        self._last_deadline_ns: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def add(self, due_ns: Iterable[int]) -> None:
+        self._due.extend(due_ns)
+
+    def pending(self) -> List[int]:
+        """Fälligkeiten der noch nicht gesendeten Pulse (Reload übernimmt sie in den neuen Scheduler)."""
+        return list(self._due)
+
+    def requeue(self, now_ns: int, n: int = 1) -> None:
+        """Fehlgeschlagene Pulse wieder vorne einreihen, sofort fällig (Mindestabstand gilt weiter)."""
+        self._due.extendleft([now_ns - self.delay_ns] * n)
+
+    def next_deadline(self) -> Optional[int]:
+        """Sendezeitpunkt des nächsten Pulses oder None bei leerer Queue."""
+        if not self._due:
+            return None
+        deadline = self._due[0] + self.delay_ns
+        if self._last_deadline_ns is not None:
+            deadline = max(deadline, self._last_deadline_ns + self.min_gap_ns)
+        return deadline
+
+    def pop(self, now_ns: int) -> int:
+        """
+        Nächsten Puls als gesendet markieren, gibt seine Deadline zurück.
+        Lag die Deadline weit zurück (mehr als ein Mindestabstand), wird auf `now_ns`
+        neu aufgesetzt, damit nach einem Ausfall nicht mit "Vorsprung" gefeuert wird.
+        """
+        deadline = self.next_deadline()
+        assert deadline is not None
+        self._due.popleft()
+        if now_ns - deadline > self.min_gap_ns:
+            deadline = now_ns
+        self._last_deadline_ns = deadline
+        return deadline
+
+
+class JitterStats:
+    """
+    Timing-Statistik der gesendeten Pulse seit dem letzten reset():
+    - late: Sendezeitpunkt - Deadline
+    - jitter: Abweichung des tatsächlichen Pulsabstands vom geplanten
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+        self._prev_actual_ns: Optional[int] = None
+        self._prev_deadline_ns: Optional[int] = None
+
+    def reset(self) -> None:
+        self.count = 0
+        self.late_sum_ns = 0
+        self.late_max_ns = 0
+        self.jitter_n = 0
+        self.jitter_sq_sum = 0.0
+        self.jitter_max_ns = 0
+
+    def record(self, deadline_ns: int, actual_ns: int) -> None:
+        late = actual_ns - deadline_ns
+        self.count += 1
+        self.late_sum_ns += late
+        self.late_max_ns = max(self.late_max_ns, late)
+        if self._prev_actual_ns is not None and self._prev_deadline_ns is not None:
+            j = abs((actual_ns - self._prev_actual_ns) - (deadline_ns - self._prev_deadline_ns))
+            self.jitter_n += 1
+            self.jitter_sq_sum += float(j) * j
+            self.jitter_max_ns = max(self.jitter_max_ns, j)
+        self._prev_actual_ns = actual_ns
+        self._prev_deadline_ns = deadline_ns
+
+    def summary(self) -> str:
+        if self.count == 0:
+            return "jitter n/a"
+        rms = math.sqrt(self.jitter_sq_sum / self.jitter_n) if self.jitter_n else 0.0
+        return (
+            f"jitter rms={rms / 1e6:.1f}ms max={self.jitter_max_ns / 1e6:.1f}ms "
+            f"late avg={self.late_sum_ns / self.count / 1e6:.1f}ms max={self.late_max_ns / 1e6:.1f}ms"
+        )
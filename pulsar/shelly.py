@@ -0,0 +1,368 @@
+"""
+Shelly-Ausgang pulsen (Auto-Off am Shelly auf ~30ms konfiguriert).
+
+ShellyTransport hält eine persistente HTTP-Verbindung (keep-alive) zum Shelly,
+statt pro Puls einen neuen TCP-Handshake zu machen. AsyncShellyTransport macht
+dasselbe für RUNTIME=asyncio über asyncio-Streams (ein minimaler HTTP/1.1-Client,
+für Shelly-GETs reicht das; https wie bei requests mit Zertifikatsprüfung, Basic-Auth
+aus user:pass@ in der URL wie bei requests).
+"""
+import asyncio
+import base64
+import json
+import logging
+import ssl
+import time
+from typing import Callable, Optional, Tuple
+from urllib.parse import SplitResult, unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .stats import LatencyStats
+
+# So viele Fehler auf wiederverwendeten Verbindungen in Folge (ohne erfolgreiche
+# Wiederverwendung dazwischen) -> Firmware kann kein keep-alive, auf close wechseln
+KEEPALIVE_MAX_FAILURES = 3
+
+log = logging.getLogger(__name__)
+
+
+def shelly_on_url(ip: str, relay_idx: int, device: str = "uni") -> str:
+    """
+    URL zum Einschalten eines Ausgangs.
+    uni (Gen1): /relay/<idx>?turn=on, plus_uni (Gen2): /rpc/Switch.Set?id=<idx>&on=true
+    """
+    if device == "plus_uni":
+        return f"http://{ip}/rpc/Switch.Set?id={relay_idx}&on=true"
+    if device != "uni":
+        raise ValueError(f"SHELLY_DEVICE unbekannt: {device} (uni | plus_uni)")
+    return f"http://{ip}/relay/{relay_idx}?turn=on"
+
+
+class _TransportBase:
+    """Gemeinsame keep-alive-Logik (Auto-Fallback, Keep-warm, Statistik)."""
+
+    def __init__(self, keepalive: str, keepwarm_s: float, name: str):
+        if keepalive not in ("auto", "1", "0"):
+            raise ValueError(f"SHELLY_KEEPALIVE unbekannt: {keepalive} (auto | 1 | 0)")
+        self.name = name
+        self.keepalive = keepalive != "0"
+        self.auto_fallback = keepalive == "auto"
+        self.keepwarm_s = keepwarm_s
+
+        self.latency = LatencyStats()
+        self.on_latency: Optional[Callable[[int], None]] = None  # z.B. Metrics-Histogramm (ns)
+        self.retries = 0  # Wiederholungen in shelly_trigger_pulse
+        self._conn_open = False  # haben wir (vermutlich) eine offene Verbindung?
+        self._reuse_failures = 0
+        self.reconnects = 0  # transparente Reconnects nach weggebrochener keep-alive-Verbindung
+        self._last_request_ts = 0.0
+        self._last_url: Optional[str] = None
+
+    def _record(self, t0_ns: int) -> None:
+        dur_ns = time.monotonic_ns() - t0_ns
+        self.latency.record(dur_ns)
+        if self.on_latency is not None:
+            self.on_latency(dur_ns)
+
+    def _on_reuse_failure(self) -> None:
+        self.reconnects += 1
+        self._reuse_failures += 1
+        if self.auto_fallback and self._reuse_failures >= KEEPALIVE_MAX_FAILURES:
+            self.keepalive = False
+            log.warning(
+                "[%s] Shelly keep-alive: %d Verbindungsabbrüche in Folge -> wechsle auf Connection: close",
+                self.name, self._reuse_failures,
+            )
+
+    def warm_due_in(self) -> Optional[float]:
+        """Sekunden bis zum nächsten Keep-warm-Request, None wenn nicht nötig."""
+        if not self.keepalive or self.keepwarm_s <= 0 or self._last_url is None:
+            return None
+        return self._last_request_ts + self.keepwarm_s - time.monotonic()
+
+    def _warm_url(self) -> str:
+        """Billiger Request (/shelly, Gen1+Gen2), damit der Shelly die Verbindung nicht idle schließt."""
+        assert self._last_url is not None
+        u = urlsplit(self._last_url)
+        return f"{u.scheme}://{u.netloc}/shelly"
+
+    def summary(self) -> str:
+        mode = "keep-alive" if self.keepalive else "close"
+        return f"{self.latency.summary('shelly')} ({mode}, reconnects={self.reconnects})"
+
+
+class ShellyTransport(_TransportBase):
+    """
+    HTTP zum Shelly über eine persistente Verbindung.
+
+    keepalive:
+      "auto" - keep-alive, bei wiederholten Fehlern auf wiederverwendeten Verbindungen
+               automatisch dauerhaft auf close-per-request wechseln
+      "1"    - immer keep-alive
+      "0"    - close-per-request (altes Verhalten)
+    Bricht eine wiederverwendete Verbindung weg (Shelly schließt idle Verbindungen),
+    wird sofort einmal frisch verbunden, ohne RETRY_DELAY_S und ohne Retry zu verbrauchen.
+    """
+
+    def __init__(self, timeout: Tuple[float, float], keepalive: str = "auto", keepwarm_s: float = 0.0, name: str = ""):
+        super().__init__(keepalive, keepwarm_s, name)
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        # eine Verbindung pro Host, Retries macht shelly_trigger_pulse selbst
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+    def _headers(self) -> Optional[dict]:
+        return None if self.keepalive else {"Connection": "close"}
+
+    def _request(self, url: str, body: Optional[dict] = None) -> requests.Response:
+        if body is None:
+            r = self.session.get(url, timeout=self.timeout, headers=self._headers())
+        else:
+            r = self.session.post(url, json=body, timeout=self.timeout, headers=self._headers())
+        self._last_request_ts = time.monotonic()
+        self._last_url = url
+        return r
+
+    def get(self, url: str) -> requests.Response:
+        """GET mit Latenzmessung und transparentem Reconnect."""
+        return self._call(url)
+
+    def post(self, url: str, body: dict) -> requests.Response:
+        """POST (JSON) mit Latenzmessung und transparentem Reconnect, z.B. Gen2-RPC."""
+        return self._call(url, body)
+
+    def _call(self, url: str, body: Optional[dict] = None) -> requests.Response:
+        t0 = time.monotonic_ns()
+        reused = self.keepalive and self._conn_open
+        try:
+            r = self._request(url, body)
+        except requests.exceptions.ConnectTimeout:
+            self._conn_open = False
+            raise
+        except requests.ConnectionError:
+            self._conn_open = False
+            if not reused:
+                raise
+            self._on_reuse_failure()
+            r = self._request(url, body)
+        else:
+            if reused:
+                self._reuse_failures = 0
+        self._conn_open = self.keepalive
+        self._record(t0)
+        return r
+
+    def keep_warm(self) -> None:
+        try:
+            self._request(self._warm_url())
+            self._conn_open = True
+        except Exception:
+            self._conn_open = False
+            self._last_request_ts = time.monotonic()  # nicht im Takt weiterprobieren
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _host_auth(u: SplitResult) -> str:
+    """Host- (ohne user:pass@) und ggf. Authorization-Header (Basic, wie requests) einer URL."""
+    host = u.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"  # IPv6
+    if u.port is not None:
+        host += f":{u.port}"
+    out = f"Host: {host}\r\n"
+    if u.username is not None:
+        cred = f"{unquote(u.username)}:{unquote(u.password or '')}".encode("latin-1")
+        out += f"Authorization: Basic {base64.b64encode(cred).decode()}\r\n"
+    return out
+
+
+class AsyncShellyTransport(_TransportBase):
+    """
+    Wie ShellyTransport, aber für den Event-Loop: eine Stream-Verbindung je Transport,
+    GET und POST (JSON). get()/post() liefern (Status, Body). Gleiches keep-alive-/Reconnect-Verhalten.
+    """
+
+    def __init__(self, timeout: Tuple[float, float], keepalive: str = "auto", keepwarm_s: float = 0.0, name: str = ""):
+        super().__init__(keepalive, keepwarm_s, name)
+        self.connect_timeout, self.read_timeout = timeout
+        self._addr: Optional[Tuple[str, int, bool]] = None
+        self._tls: Optional[ssl.SSLContext] = None  # erst bei der ersten https-URL
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    def _drop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._conn_open = False
+
+    async def _request(self, url: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        u = urlsplit(url)
+        if u.scheme not in ("http", "https"):
+            raise ValueError(f"URL-Schema nicht unterstützt: {url}")
+        https = u.scheme == "https"
+        addr = (u.hostname or "", u.port or (443 if https else 80), https)
+        if self._writer is None or addr != self._addr:
+            self._drop()
+            if https and self._tls is None:
+                self._tls = ssl.create_default_context()
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(addr[0], addr[1], ssl=self._tls if https else None), self.connect_timeout
+            )
+            self._addr = addr
+        path = u.path or "/"
+        if u.query:
+            path += "?" + u.query
+        conn = "keep-alive" if self.keepalive else "close"
+        head = f"{'GET' if body is None else 'POST'} {path} HTTP/1.1\r\n{_host_auth(u)}Connection: {conn}\r\n"
+        if body is None:
+            self._writer.write(f"{head}\r\n".encode())
+        else:
+            data = json.dumps(body, separators=(",", ":")).encode()
+            head += f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+            self._writer.write(head.encode() + data)
+        status, body, keep = await asyncio.wait_for(self._send_and_read(), self.read_timeout)
+        self._last_request_ts = time.monotonic()
+        self._last_url = url
+        if not (keep and self.keepalive):
+            self._drop()
+        return status, body
+
+    async def _send_and_read(self) -> Tuple[int, bytes, bool]:
+        assert self._writer is not None
+        await self._writer.drain()
+        return await self._read_response()
+
+    async def _read_response(self) -> Tuple[int, bytes, bool]:
+        assert self._reader is not None
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Verbindung vom Shelly geschlossen")
+        parts = line.split(None, 2)
+        status = int(parts[1])
+        length: Optional[int] = None
+        chunked = False
+        keep = parts[0] == b"HTTP/1.1"
+        while True:
+            h = await self._reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            k, v = k.strip().lower(), v.strip().lower()
+            if k == "content-length":
+                length = int(v)
+            elif k == "transfer-encoding":
+                chunked = "chunked" in v
+            elif k == "connection":
+                keep = v != "close"
+        if chunked:
+            body = b""
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                body += await self._reader.readexactly(size)
+                await self._reader.readline()
+        elif length is not None:
+            body = await self._reader.readexactly(length)
+        else:
+            body = await self._reader.read()
+            keep = False
+        return status, body, keep
+
+    async def get(self, url: str) -> Tuple[int, bytes]:
+        """GET mit Latenzmessung und transparentem Reconnect."""
+        return await self._call(url)
+
+    async def post(self, url: str, body: dict) -> Tuple[int, bytes]:
+        """POST (JSON) mit Latenzmessung und transparentem Reconnect."""
+        return await self._call(url, body)
+
+    async def _call(self, url: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        t0 = time.monotonic_ns()
+        reused = self.keepalive and self._conn_open
+        try:
+            r = await self._request(url, body)
+        except asyncio.TimeoutError:
+            self._drop()
+            raise
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            self._drop()
+            if not reused:
+                raise
+            self._on_reuse_failure()
+            r = await self._request(url, body)
+        else:
+            if reused:
+                self._reuse_failures = 0
+        self._conn_open = self._writer is not None
+        self._record(t0)
+        return r
+
+    async def keep_warm(self) -> None:
+        try:
+            await self._request(self._warm_url())
+            self._conn_open = self._writer is not None
+        except Exception:
+            self._drop()
+            self._last_request_ts = time.monotonic()  # nicht im Takt weiterprobieren
+
+    def close(self) -> None:
+        self._drop()
+
+
+def shelly_trigger_pulse(
+    transport: ShellyTransport,
+    url: str,
+    retries: int = 1,
+    retry_delay_s: float = 0.2,
+) -> None:
+    """Triggert einen Puls (Shelly auto-off nach 30ms)."""
+    last_exc: Optional[Exception] = None
+    for attempt in range(retries + 1):
+        try:
+            r = transport.get(url)
+            r.raise_for_status()
+            return
+        except Exception as e:
+            last_exc = e
+            if attempt < retries:
+                transport.retries += 1
+                time.sleep(retry_delay_s)
+    if last_exc is not None:
+        raise last_exc
+    raise RuntimeError("Shelly trigger failed (unknown error)")
+
+
+async def shelly_trigger_pulse_async(
+    transport: AsyncShellyTransport,
+    url: str,
+    retries: int = 1,
+    retry_delay_s: float = 0.2,
+) -> None:
+    """Wie shelly_trigger_pulse, für RUNTIME=asyncio."""
+    last_exc: Optional[Exception] = None
+    for attempt in range(retries + 1):
+        try:
+            status, _ = await transport.get(url)
+            if status >= 400:
+                raise RuntimeError(f"Shelly HTTP {status}: {url}")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            last_exc = e
+            if attempt < retries:
+                transport.retries += 1
+                await asyncio.sleep(retry_delay_s)
+    if last_exc is not None:
+        raise last_exc
+    raise RuntimeError("Shelly trigger failed (unknown error)")
@@ -0,0 +1,162 @@
+"""
+Gen2-Pulse-Script: Pulszüge auf dem Shelly erzeugen und Einschaltungen zählen.
+
+Auf dem Shelly (Plus UNI, Gen2-Firmware) läuft ein kleines Script mit eigenem
+HTTP-Endpunkt:
+
+  GET /script/<sid>/pulse?id=<relay>&n=<Anzahl>&ms=<Abstand>
+
+Es hängt die Pulse an die Queue des Relais an und schaltet sie per Switch.Set mit
+toggle_after im gegebenen Abstand. Das Timing kommt damit vom Gerät, nicht vom WLAN.
+
+Außerdem zählt das Script jedes Einschalten eines Switches (Status-Handler, egal wer
+geschaltet hat):
+
+  GET /script/<sid>/count?id=<relay>  ->  {"ons": <Einschaltungen seit Script-Start>, "queued": <offen>}
+
+Darüber gleicht der Emitter gesendete gegen tatsächlich geschaltete Pulse ab (SHELLY_RECONCILE_S).
+Installiert bzw. aktualisiert wird das Script per Script.*-RPC vor dem ersten Batch bzw. Abgleich;
+läuft auf dem Gerät schon dasselbe Script (z.B. von einem anderen Pulser), wird es
+ohne Neustart übernommen.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .shelly import ShellyTransport
+
+SCRIPT_NAME = "pulsar"
+PUT_CHUNK = 1024  # Script.PutCode in Stücken, große Requests mag die Firmware nicht
+
+SCRIPT_CODE = """\
+// pulsar: Pulszuege je Relais, Aufruf GET /script/<sid>/pulse?id=<relay>&n=<n>&ms=<abstand>
+let Q = {};
+let ONS = {};
+function arg(q, k, d) {
+  let parts = q.split("&");
+  for (let i = 0; i < parts.length; i++) {
+    let kv = parts[i].split("=");
+    if (kv[0] === k && kv.length > 1) return JSON.parse(kv[1]);
+  }
+  return d;
+}
+function step(id) {
+  let s = Q[id];
+  if (s.n <= 0) { s.busy = false; return; }
+  s.n--;
+  s.sent++;
+  Shelly.call("Switch.Set", {id: id, on: true, toggle_after: 0.03});
+  Timer.set(s.ms, false, step, id);
+}
+HTTPServer.registerEndpoint("pulse", function (req, res) {
+  let q = req.query || "";
+  let id = arg(q, "id", 0);
+  let s = Q[id];
+  if (s === undefined) { s = {n: 0, ms: 80, busy: false, sent: 0}; Q[id] = s; }
+  s.n += arg(q, "n", 1);
+  s.ms = arg(q, "ms", s.ms);
+  if (!s.busy) { s.busy = true; step(id); }
+  res.code = 200;
+  res.body = JSON.stringify({id: id, queued: s.n, sent: s.sent});
+  res.send();
+});
+Shelly.addStatusHandler(function (ev) {
+  if (ev.name === "switch" && ev.delta.output === true) ONS[ev.id] = (ONS[ev.id] || 0) + 1;
+});
+HTTPServer.registerEndpoint("count", function (req, res) {
+  let id = arg(req.query || "", "id", 0);
+  let s = Q[id];
+  res.code = 200;
+  res.body = JSON.stringify({id: id, ons: ONS[id] || 0, queued: s === undefined ? 0 : s.n});
+  res.send();
+});
+"""
+
+log = logging.getLogger(__name__)
+
+# Script-ID je Gerät (http://<ip>), prozessweit: mehrere Kanäle/Ausgänge teilen sich ein Script
+_installed: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def split_switch_url(url: str) -> Tuple[str, int]:
+    """/rpc/Switch.Set?id=<idx>&on=true -> (http://<ip>, idx)."""
+    u = urlsplit(url)
+    if u.path != "/rpc/Switch.Set":
+        raise ValueError(f"Pulse-Script braucht Gen2-URLs (/rpc/Switch.Set?id=..), nicht {url}")
+    return f"{u.scheme}://{u.netloc}", int(parse_qs(u.query).get("id", ["0"])[0])
+
+
+def batch_url(base: str, script_id: int, relay_idx: int, n: int, interval_ms: int) -> str:
+    return f"{base}/script/{script_id}/pulse?id={relay_idx}&n={n}&ms={interval_ms}"
+
+
+def read_count(transport: ShellyTransport, base: str, script_id: int, relay_idx: int) -> Tuple[int, int]:
+    """(Einschaltungen seit Script-Start, noch offene Batch-Pulse) eines Relais."""
+    r = transport.get(f"{base}/script/{script_id}/count?id={relay_idx}")
+    r.raise_for_status()
+    data = r.json()
+    return int(data["ons"]), int(data.get("queued", 0))
+
+
+def rpc(transport: ShellyTransport, base: str, method: str, params: Optional[dict] = None) -> dict:
+    """Gen2-RPC per POST /rpc, gibt `result` zurück."""
+    r = transport.post(f"{base}/rpc", {"id": 1, "method": method, "params": params or {}})
+    r.raise_for_status()
+    data = r.json()
+    if "error" in data:
+        err = data["error"]
+        raise RuntimeError(f"Shelly {method}: {err.get('message', err)} (code {err.get('code')})")
+    return data.get("result") or {}
+
+
+def _get_code(transport: ShellyTransport, base: str, script_id: int) -> str:
+    code, offset = "", 0
+    while True:
+        res = rpc(transport, base, "Script.GetCode", {"id": script_id, "offset": offset})
+        chunk = res.get("data", "")
+        code += chunk
+        offset += len(chunk)
+        if not chunk or not res.get("left"):
+            return code
+
+
+def ensure_script(transport: ShellyTransport, base: str) -> int:
+    """Pulse-Script auf dem Gerät installieren/aktualisieren und starten, gibt die Script-ID zurück."""
+    with _lock:
+        if base in _installed:
+            return _installed[base]
+
+        scripts = rpc(transport, base, "Script.List").get("scripts", [])
+        found = next((s for s in scripts if s.get("name") == SCRIPT_NAME), None)
+        if found is None:
+            script_id = int(rpc(transport, base, "Script.Create", {"name": SCRIPT_NAME})["id"])
+            running = False
+        else:
+            script_id = int(found["id"])
+            running = bool(found.get("running"))
+
+        if running and _get_code(transport, base, script_id) == SCRIPT_CODE:
+            log.info("Shelly %s: Pulse-Script #%d läuft bereits", base, script_id)
+        else:
+            if running:
+                rpc(transport, base, "Script.Stop", {"id": script_id})
+            for i in range(0, len(SCRIPT_CODE), PUT_CHUNK):
+                rpc(
+                    transport, base, "Script.PutCode",
+                    {"id": script_id, "code": SCRIPT_CODE[i:i + PUT_CHUNK], "append": i > 0},
+                )
+            # auch nach einem Reboot des Shellys wieder starten
+            rpc(transport, base, "Script.SetConfig", {"id": script_id, "config": {"enable": True}})
+            rpc(transport, base, "Script.Start", {"id": script_id})
+            log.info("Shelly %s: Pulse-Script #%d installiert und gestartet", base, script_id)
+
+        _installed[base] = script_id
+        return script_id
+
+
+def forget(base: str) -> None:
+    """Nach Fehlern neu prüfen (Script gelöscht, Gerät getauscht, ...)."""
+    with _lock:
+        _installed.pop(base, None)
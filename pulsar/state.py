@@ -0,0 +1,146 @@
+"""
+Persistenter Kanal-Zustand (Energie-Rest, Pulsqueue, Zähler) über Neustarts hinweg.
+
+Pro Kanal eine kleine mmap-Datei `<STATE_DIR>/<kanal>.state` mit zwei Slots, die
+abwechselnd beschrieben werden (Sequenznummer + CRC). Ein Schreibvorgang ist nur ein
+struct.pack_into ins mmap - landet sofort im Page-Cache und übersteht damit jeden
+Prozess-Crash/Restart. fdatasync (gegen Stromausfall) läuft nur periodisch, über den
+offen gehaltenen fd und ohne den Schreib-Lock: save() (nach jedem gesendeten Puls) wartet
+nicht auf die Platte, und fdatasync gibt anders als mmap.flush() den GIL frei. Wird ein
+Slot beim Stromausfall halb geschrieben, gilt der andere.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+MAGIC = b"PLST"
+VERSION = 1
+
+# magic, version, reserved, seq, wall_ns, wns_per_pulse, energy_wns, pulse_queue, pulses_sent, power_w,
+# Zählerstand als ganze Wh + Rest in W*ns (in W*ns allein liefe int64 schon nach ~2,56 MWh über)
+_BODY = struct.Struct("<4sHHQQQqQQiQQ")
+WNS_PER_WH = 3_600_000_000_000
+_CRC = struct.Struct("<I")
+SLOT_SIZE = _BODY.size + _CRC.size
+FILE_SIZE = 2 * SLOT_SIZE
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChannelState:
+    wall_ns: int  # time.time_ns() beim Schreiben (monotonic überlebt keinen Reboot)
+    wns_per_pulse: int
+    energy_wns: int
+    pulse_queue: int
+    pulses_sent: int
+    power_w: int
+    meter_wns: int = 0  # Zählerstand: insgesamt integrierte Energie, monoton (unabhängig von IMP_PER_KWH)
+
+    def convert(self, wns_per_pulse: int) -> "ChannelState":
+        """Auf eine andere Pulswertigkeit umrechnen (Energie bleibt erhalten)."""
+        if wns_per_pulse == self.wns_per_pulse:
+            return self
+        total = self.pulse_queue * self.wns_per_pulse + self.energy_wns
+        return ChannelState(
+            self.wall_ns, wns_per_pulse, total % wns_per_pulse, total // wns_per_pulse,
+            self.pulses_sent, self.power_w, self.meter_wns,
+        )
+
+
+def _slots(buf: bytes) -> List[Tuple[int, tuple]]:
+    """Gültige Slots (magic, version, CRC) eines Datei-Inhalts als (Index, Felder)."""
+    out = []
+    for i in (0, 1):
+        raw = buf[i * SLOT_SIZE:i * SLOT_SIZE + _BODY.size]
+        (crc,) = _CRC.unpack_from(buf, i * SLOT_SIZE + _BODY.size)
+        if zlib.crc32(raw) != crc:
+            continue
+        fields = _BODY.unpack(raw)
+        if fields[0] == MAGIC and fields[1] == VERSION:
+            out.append((i, fields))
+    return out
+
+
+class StateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # Slot-Wechsel + pack_into
+        self._sync_lock = threading.Lock()  # fdatasync vs. close
+        self._seq = 0
+        self._slot = 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+        try:
+            if os.fstat(fd).st_size != FILE_SIZE:
+                # neu oder fremde Größe: leer anlegen, load() findet dann keinen Slot
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, FILE_SIZE)
+            self._mm = mmap.mmap(fd, FILE_SIZE)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd  # bleibt offen für sync()
+
+    def load(self) -> Optional[ChannelState]:
+        """Neuester gültiger Slot oder None (neue/kaputte Datei)."""
+        best = None
+        for i, f in _slots(self._mm[:]):
+            if best is None or f[3] > best[1][3]:
+                best = (i, f)
+        if best is None:
+            return None
+        i, f = best
+        self._seq = f[3]
+        self._slot = i
+        return ChannelState(*f[4:10], meter_wns=f[10] * WNS_PER_WH + f[11])
+
+    def save(self, st: ChannelState) -> None:
+        """Schreibt in den jeweils anderen Slot (kein Syscall, nur Speicher)."""
+        with self._lock:
+            self._seq += 1
+            self._slot ^= 1
+            off = self._slot * SLOT_SIZE
+            _BODY.pack_into(
+                self._mm, off, MAGIC, VERSION, 0, self._seq, st.wall_ns, st.wns_per_pulse,
+                st.energy_wns, st.pulse_queue, st.pulses_sent, st.power_w, *divmod(st.meter_wns, WNS_PER_WH),
+            )
+            _CRC.pack_into(self._mm, off + _BODY.size, zlib.crc32(self._mm[off:off + _BODY.size]))
+
+    def sync(self) -> None:
+        """Auf die Platte (periodisch / beim Beenden); ein gleichzeitiges save() wartet nicht darauf."""
+        with self._sync_lock:
+            if self._fd >= 0:
+                os.fdatasync(self._fd)
+
+    def close(self) -> None:
+        with self._sync_lock:
+            if self._fd < 0:
+                return
+            os.fdatasync(self._fd)
+            os.close(self._fd)
+            self._fd = -1
+        self._mm.close()
+
+
+def open_store(state_dir: str, channel: str) -> Optional[StateStore]:
+    """StateStore für einen Kanal oder None (STATE_DIR=off oder nicht beschreibbar)."""
+    if not state_dir or state_dir.lower() in ("off", "0", "none"):
+        return None
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        return StateStore(os.path.join(state_dir, f"{channel}.state"))
+    except OSError as e:
+        log.warning("[%s] Warn: Zustand wird nicht gespeichert (%s: %s)", channel, state_dir, e)
+        return None
+
+
+def downtime_s(st: ChannelState) -> float:
+    """Wanduhr-Zeit seit dem letzten Checkpoint (>= 0)."""
+    return max(0.0, (time.time_ns() - st.wall_ns) / 1e9)
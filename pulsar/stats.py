@@ -0,0 +1,32 @@
+"""
+Kleine Laufzeit-Statistiken für den Statuslog.
+"""
+
+
+class LatencyStats:
+    """min/avg/max einer Dauer (ns) seit dem letzten reset()."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.sum_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+
+    def record(self, dur_ns: int) -> None:
+        if self.count == 0 or dur_ns < self.min_ns:
+            self.min_ns = dur_ns
+        if dur_ns > self.max_ns:
+            self.max_ns = dur_ns
+        self.count += 1
+        self.sum_ns += dur_ns
+
+    def summary(self, name: str) -> str:
+        if self.count == 0:
+            return f"{name} n/a"
+        return (
+            f"{name} avg={self.sum_ns / self.count / 1e6:.1f}ms "
+            f"min={self.min_ns / 1e6:.1f}ms max={self.max_ns / 1e6:.1f}ms"
+        )
@@ -0,0 +1,26 @@
+"""Gemeinsame Fixtures: die Konfig kommt aus os.environ, jeder Test bekommt danach den alten Stand zurück."""
+import os
+
+import pytest
+
+from pulsar.config import EngineConfig, load_engine_config
+
+
+@pytest.fixture(autouse=True)
+def env():
+    saved = dict(os.environ)
+    os.environ["STATE_DIR"] = "off"
+    yield os.environ
+    os.environ.clear()
+    os.environ.update(saved)
+
+
+@pytest.fixture
+def load_cfg(env):
+    """load_cfg(("pv",), PV_IMP_PER_KWH=1000) -> EngineConfig mit diesen ENV-Werten."""
+
+    def load(channels=("pv",), **values) -> EngineConfig:
+        env.update({k: str(v) for k, v in values.items()})
+        return load_engine_config(tuple(channels))
+
+    return load
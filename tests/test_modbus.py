@@ -0,0 +1,163 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from pulsar.config import SignalConfig
+from pulsar.mbtcp import (
+    MBAP, ModbusExceptionResponse, ModbusTcpPipe, ReadSkipped, decode_read_response, encode_read_request,
+)
+from pulsar.modbus import MAX_REGS_PER_READ, plan_reads
+
+PV = SignalConfig("pv", "PV", 100, 811, "u16x3")
+HOUSE = SignalConfig("house", "House", 100, 817, "u16x3")
+HP = SignalConfig("hp", "HP", 31, 5502, "u32")
+CHG = SignalConfig("chg", "Wallbox", 52, 3900, "u16x3")
+
+
+def _spans(blocks):
+    return [(b.unit_id, b.addr, b.count, tuple(s.name for s in b.signals)) for b in blocks]
+
+
+# =========================
+# Read-Planer
+# =========================
+def test_plan_merges_within_gap():
+    assert _spans(plan_reads([PV, HOUSE, HP, CHG], 8)) == [
+        (100, 811, 9, ("pv", "house")), (31, 5502, 2, ("hp",)), (52, 3900, 3, ("chg",)),
+    ]
+
+
+def test_plan_gap_too_large():
+    assert _spans(plan_reads([HOUSE, PV], 2)) == [(100, 811, 3, ("pv",)), (100, 817, 3, ("house",))]
+
+
+def test_plan_never_merge():
+    adjacent = SignalConfig("x", "X", 100, 814, "u16x3")
+    assert len(plan_reads([PV, adjacent], -1)) == 2
+    assert _spans(plan_reads([PV, adjacent], 0)) == [(100, 811, 6, ("pv", "x"))]
+
+
+def test_plan_no_merge_set():
+    blocks = plan_reads([PV, HOUSE], 8, frozenset({"house"}))
+    assert _spans(blocks) == [(100, 811, 3, ("pv",)), (100, 817, 3, ("house",))]
+
+
+def test_plan_overlap_and_units():
+    overlap = SignalConfig("o", "O", 100, 812, "u32")
+    other_unit = SignalConfig("p2", "PV2", 101, 814, "u16x3")
+    assert _spans(plan_reads([PV, overlap, other_unit], 0)) == [
+        (100, 811, 3, ("pv", "o")), (101, 814, 3, ("p2",)),
+    ]
+
+
+def test_plan_respects_max_regs():
+    far = SignalConfig("far", "Far", 100, 811 + MAX_REGS_PER_READ - 2, "u16x3")
+    assert len(plan_reads([PV, far], 1000)) == 2
+    near = SignalConfig("near", "Near", 100, 811 + MAX_REGS_PER_READ - 3, "u16x3")
+    assert _spans(plan_reads([PV, near], 1000)) == [(100, 811, MAX_REGS_PER_READ, ("pv", "near"))]
+
+
+# =========================
+# Framing
+# =========================
+def test_encode_read_request():
+    assert encode_read_request(0x1234, 100, 811, 3) == bytes.fromhex("1234 0000 0006 64 03 032b 0003")
+
+
+def test_decode_read_response():
+    assert decode_read_response(bytes.fromhex("03 06 0001 0002 ffff"), 100, 811, 3) == [1, 2, 0xFFFF]
+
+
+@pytest.mark.parametrize("pdu", ["83 02", "03 04 0001 0002", "03 06 0001 0002", "04 06 0001 0002 0003"])
+def test_decode_rejects(pdu):
+    with pytest.raises(ModbusExceptionResponse):
+        decode_read_response(bytes.fromhex(pdu), 100, 811, 3)
+
+
+class Peer:
+    """Gegenstelle am anderen Ende eines socketpair: liest n Requests, antwortet nach answer()."""
+
+    def __init__(self, n: int, answer):
+        self.pipe = ModbusTcpPipe("peer", 0, timeout_s=0.3)
+        a, self.sock = socket.socketpair()
+        self.pipe.sock = a
+        self.requests = []
+        self._thread = threading.Thread(target=self._run, args=(n, answer), daemon=True)
+        self._thread.start()
+
+    def _run(self, n, answer) -> None:
+        buf = b""
+        while len(self.requests) < n:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                return
+            buf += chunk
+            while len(buf) >= 12:
+                tid, _, _, unit = MBAP.unpack_from(buf)
+                _, addr, count = struct.unpack_from(">BHH", buf, MBAP.size)
+                self.requests.append((tid, unit, addr, count))
+                buf = buf[12:]
+            for out in answer(self.requests):
+                self.sock.sendall(out)
+
+    def close(self) -> None:
+        self.pipe.close()
+        self.sock.close()
+        self._thread.join(1)
+
+
+def _reply(tid: int, unit: int, values, extra_len: int = 0) -> bytes:
+    pdu = struct.pack(f">BB{len(values)}H", 3, 2 * len(values), *values)
+    return MBAP.pack(tid, 0, len(pdu) + 1 + extra_len, unit) + pdu
+
+
+def test_pipelined_out_of_order_and_split():
+    def answer(reqs):
+        if len(reqs) < 3:
+            return []
+        # umgekehrte Reihenfolge, dazu eine fremde (verspätete) Antwort, byteweise gesendet
+        data = _reply(999, 100, [7]) + b"".join(
+            _reply(tid, unit, [addr + k for k in range(count)]) for tid, unit, addr, count in reversed(reqs)
+        )
+        return [data[k:k + 1] for k in range(len(data))]
+
+    peer = Peer(3, answer)
+    try:
+        out = peer.pipe.read_many([(100, 811, 3), (31, 5502, 2), (52, 3900, 3)])
+    finally:
+        peer.close()
+    assert out == [[811, 812, 813], [5502, 5503], [3900, 3901, 3902]]
+
+
+def test_framing_error_closes():
+    def answer(reqs):
+        tid = reqs[0][0]
+        return [MBAP.pack(tid, 0, 1, 100)]
+
+    peer = Peer(1, answer)
+    try:
+        with pytest.raises(ConnectionError):
+            peer.pipe.read_many([(100, 811, 3)])
+        assert not peer.pipe.connected
+    finally:
+        peer.close()
+
+
+def test_silent_unit_keeps_connection():
+    def answer(reqs):
+        tid, unit, addr, count = reqs[-1]
+        return [] if unit == 52 else [_reply(tid, unit, [1] * count)]
+
+    peer = Peer(2, answer)
+    peer.pipe.max_inflight = 1
+    try:
+        out = peer.pipe.read_many([(100, 811, 3), (52, 3900, 3), (52, 3903, 1), (31, 5502, 2)])
+        assert peer.pipe.connected
+    finally:
+        peer.close()
+    assert out[0] == [1, 1, 1]
+    assert isinstance(out[1], TimeoutError) and not isinstance(out[1], ReadSkipped)
+    assert isinstance(out[2], ReadSkipped)
+    assert isinstance(out[3], RuntimeError) and not isinstance(out[3], TimeoutError)
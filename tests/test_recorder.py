@@ -0,0 +1,106 @@
+import pytest
+
+from pulsar import recorder
+from pulsar.modbus import SignalSample
+from pulsar.recorder import FLAG_OUTAGE, KIND_PULSE, Recorder, Recording, energy_totals, open_recorder
+
+S = 1_000_000_000
+
+
+def _pv(w: int) -> dict:
+    return {"pv": SignalSample(3 * w, (w, w, w))}
+
+
+def _open(load_cfg, tmp_path, imp=1000) -> Recorder:
+    cfg = load_cfg(("pv",), PV_IMP_PER_KWH=imp)
+    # kleinste Datei: 16 Records
+    return Recorder(str(tmp_path / "pv.rec"), 0, cfg.used_signals(), cfg.channels)
+
+
+def _frames(rec: Recorder):
+    """(ts_ns monotonic, flags, L1) aller Frames der Datei."""
+    r = Recording(rec.path)
+    try:
+        return [(ts - rec._offset_ns, flags, v["pv"][0]) for ts, flags, v in r.frames()]
+    finally:
+        r.close()
+
+
+def test_ring_wraps_to_newest(load_cfg, tmp_path):
+    rec = _open(load_cfg, tmp_path)
+    assert rec.capacity == 16
+    for k in range(40):
+        rec.frame(k * S, _pv(k), {})
+    assert _frames(rec) == [(k * S, 0, k) for k in range(24, 40)]
+    rec.close()
+
+    # nach dem Neustart geht es an derselben Ring-Position weiter
+    rec = _open(load_cfg, tmp_path)
+    assert rec.count == 40
+    rec.frame(40 * S, _pv(40), {})
+    assert [f[2] for f in _frames(rec)] == list(range(25, 41))
+    rec.close()
+
+
+def test_unchanged_frames_are_held(load_cfg, tmp_path):
+    rec = _open(load_cfg, tmp_path)
+    for k in range(6):
+        rec.frame(k * S, _pv(100), {})
+    rec.frame(6 * S, _pv(200), {})
+    rec.frame(7 * S, _pv(300), {})
+    # konstanter Abschnitt exakt begrenzt: erster und letzter ausgelassener Frame
+    assert _frames(rec) == [(0, 0, 100), (5 * S, 0, 100), (6 * S, 0, 200), (7 * S, 0, 300)]
+    rec.close()
+
+
+def test_heartbeat_and_outage(load_cfg, tmp_path):
+    rec = _open(load_cfg, tmp_path)
+    for k in range(0, 131, 10):
+        rec.frame(k * S, _pv(100), {})
+    rec.outage()
+    rec.frame(140 * S, _pv(100), {})
+    rec.frame(150 * S, {}, {"pv": TimeoutError()})
+    assert _frames(rec) == [
+        (0, 0, 100), (60 * S, 0, 100), (120 * S, 0, 100), (130 * S, 0, 100),
+        (140 * S, FLAG_OUTAGE, 100), (150 * S, 1, 0),
+    ]
+    rec.close()
+
+
+def test_energy_against_pulses(load_cfg, tmp_path):
+    rec = _open(load_cfg, tmp_path)
+    for k in range(11):
+        rec.frame(k * S, _pv(1200), {})  # 3600 W
+    rec.frame(11 * S, _pv(0), {})
+    rec.event(KIND_PULSE, 0, 5 * S, 10, 0, 10, 0, 0)
+    rec.close()
+
+    r = Recording(rec.path)
+    (pv,) = energy_totals(r, None, None)
+    r.close()
+    # 10 s * 3600 W + Rampe auf 0 W über 1 s = 10,5 Wh, 10 Pulse à 1 Wh
+    assert pv["wns"] == 10 * 3600 * S + 1800 * S
+    assert (pv["pulses"], pv["frames"]) == (10, 3)  # 0 s, 10 s (gehalten), 11 s
+
+
+def test_layout_change_keeps_old_recordings(load_cfg, tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder, "KEEP_OLD", 2)
+    _open(load_cfg, tmp_path, 1000).close()
+    for imp in (500, 1000, 500):
+        rec = _open(load_cfg, tmp_path, imp)
+        rec.frame(0, _pv(imp), {})
+        rec.close()
+    old = sorted(p.name for p in tmp_path.iterdir() if p.name.endswith(".old"))
+    # drei Umstellungen (teils in derselben Sekunde), die ältesten über KEEP_OLD hinaus gelöscht
+    assert len(old) == 2 and all(n.startswith("pv.rec.") for n in old)
+    wpp = []
+    for n in old:
+        r = Recording(str(tmp_path / n))
+        wpp.append(r.layout["channels"][0]["wns_per_pulse"])
+        r.close()
+    assert wpp == [3_600 * S * 2, 3_600 * S]  # 500 imp/kWh, dann 1000 imp/kWh
+
+
+def test_open_recorder_off(tmp_path, load_cfg):
+    cfg = load_cfg(("pv",))
+    assert open_recorder("off", 1, cfg.used_signals(), cfg.channels) is None
@@ -0,0 +1,106 @@
+import logging
+import os
+
+import pytest
+
+from pulsar.config import load_engine_config
+from pulsar.emitter import PulseEmitter
+from pulsar.reload import Reloader, build_channels
+
+
+@pytest.fixture
+def running(tmp_path):
+    """Laufender Stand: Env-Datei mit PV_IMP_PER_KWH=500, Konfig und Kanäle daraus; set(text) schreibt die Datei neu."""
+    path = tmp_path / "pv.env"
+    path.write_text("PV_IMP_PER_KWH=500\n")
+    r = Reloader(str(path), ("pv",))
+    r.load_env()
+    cfg = load_engine_config(("pv",))
+    chans = build_channels(cfg, [], PulseEmitter)
+
+    class Running:
+        reloader, old, channels = r, cfg, chans
+
+        @staticmethod
+        def set(text: str) -> None:
+            path.write_text(text)
+
+        @staticmethod
+        def plan():
+            return r.plan(cfg, chans, PulseEmitter)
+
+    return Running
+
+
+def test_no_change(running, caplog):
+    caplog.set_level(logging.INFO)
+    running.set("# nur ein Kommentar\nPV_IMP_PER_KWH='500'\n")
+    assert running.plan() is None
+    assert "keine Änderung" in caplog.text
+
+
+@pytest.mark.parametrize("line", [
+    "PV_IMP_PER_KWH=abc",
+    "PV_IMP_PER_KWH=3000",  # über der Relais-Rate
+    "PV_GAP_POLICY=bogus",  # erst beim Bau der Tabelle geprüft
+    "PV_INTEGRATION=simpson",
+    "SHELLY_KEEPALIVE=maybe",
+    "SHELLY_ON_URL=ftp://shelly/relay/0?turn=on",
+    "LOG_LEVEL=LOUD",
+    "POLL_IDLE_S=10",  # >= MAX_GAP_S
+    "COUNTER_PUSH_URL=udp://host",
+])
+def test_invalid_keeps_running_config(running, caplog, line):
+    before = dict(os.environ)
+    running.set(f"VENUS_IP=10.0.0.9\n{line}\n")
+    assert running.plan() is None
+    assert "Konfig ungültig" in caplog.text
+    assert dict(os.environ) == before
+
+    # Keys der alten Datei gelten weiter: ohne PV_IMP_PER_KWH fällt der Wert beim nächsten Reload weg
+    running.set("")
+    plan = running.plan()
+    assert plan is not None and plan.channels
+    assert plan.cfg.channels[0].imp_per_kwh != 500 and "PV_IMP_PER_KWH" not in os.environ
+
+
+def test_unreadable_env_file(running, tmp_path, caplog):
+    running.reloader.env_file = str(tmp_path)
+    assert running.plan() is None
+    assert "Konfig ungültig" in caplog.text and os.environ["PV_IMP_PER_KWH"] == "500"
+
+
+def test_missing_env_file_drops_keys(running, tmp_path):
+    running.reloader.env_file = str(tmp_path / "weg.env")
+    plan = running.plan()
+    assert plan is not None and "pv(imp_per_kwh,wns_per_pulse)" in plan.changed
+
+
+def test_channel_change_builds_new_channels(running):
+    running.set("PV_IMP_PER_KWH=1000\n")
+    plan = running.plan()
+    assert plan.channels and not plan.endpoint and not plan.reads
+    (ch,) = plan.chans
+    assert ch.cfg.imp_per_kwh == 1000 and ch is not running.channels[0]
+    assert ch.table is not running.channels[0].table
+
+
+@pytest.mark.parametrize("line, endpoint, reads", [
+    ("VENUS_IP=10.0.0.9", True, True),
+    ("MODBUS_TIMEOUT_S=1", True, True),
+    ("MODBUS_MERGE_GAP=0", False, True),
+    ("MODBUS_BACKOFF_MAX_S=5", False, True),
+    ("LOG_EVERY_S=10", False, False),
+])
+def test_modbus_changes(running, line, endpoint, reads):
+    running.set(f"PV_IMP_PER_KWH=500\n{line}\n")
+    plan = running.plan()
+    assert (plan.endpoint, plan.reads, plan.channels) == (endpoint, reads, False)
+    assert plan.chans == ()
+
+
+def test_restart_only_warns(running, caplog):
+    running.set("PV_IMP_PER_KWH=500\nLOG_FORMAT=json\n")
+    plan = running.plan()
+    assert plan is not None and plan.changed == ("log_format",)
+    assert "log_format gilt erst nach einem Neustart" in caplog.text
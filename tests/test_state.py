@@ -0,0 +1,123 @@
+import os
+import threading
+from dataclasses import replace
+
+from pulsar.state import FILE_SIZE, SLOT_SIZE, ChannelState, StateStore, open_store
+
+
+def _state(seq: int) -> ChannelState:
+    return ChannelState(
+        wall_ns=1_000 + seq, wns_per_pulse=24_000_000_000_000, energy_wns=5_000 * seq, pulse_queue=seq,
+        pulses_sent=100 + seq, power_w=4200 + seq, meter_wns=10**15 + seq,
+    )
+
+
+def _flip(path: str, slot: int) -> None:
+    """Ein Byte im Slot kippen (halb geschriebener Slot, Stromausfall)."""
+    with open(path, "r+b") as f:
+        f.seek(slot * SLOT_SIZE + 20)
+        b = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([b[0] ^ 0xFF]))
+
+
+def test_new_file_is_empty(tmp_path):
+    st = StateStore(str(tmp_path / "pv.state"))
+    assert st.load() is None
+    st.close()
+    assert os.path.getsize(tmp_path / "pv.state") == FILE_SIZE
+
+
+def test_round_trip_keeps_newest(tmp_path):
+    path = str(tmp_path / "pv.state")
+    st = StateStore(path)
+    for seq in (1, 2, 3):
+        st.save(_state(seq))
+    st.close()
+
+    st = StateStore(path)
+    assert st.load() == _state(3)
+    # nach dem Laden geht es mit höherer Sequenz im anderen Slot weiter
+    st.save(_state(4))
+    st.close()
+    st = StateStore(path)
+    assert st.load() == _state(4)
+    st.close()
+
+
+def test_corrupt_newest_slot_falls_back(tmp_path):
+    path = str(tmp_path / "pv.state")
+    st = StateStore(path)
+    st.save(_state(1))  # Slot 1
+    st.save(_state(2))  # Slot 0
+    st.close()
+
+    _flip(path, 0)
+    st = StateStore(path)
+    assert st.load() == _state(1)
+    st.close()
+
+
+def test_both_slots_corrupt(tmp_path):
+    path = str(tmp_path / "pv.state")
+    st = StateStore(path)
+    st.save(_state(1))
+    st.save(_state(2))
+    st.close()
+
+    _flip(path, 0)
+    _flip(path, 1)
+    st = StateStore(path)
+    assert st.load() is None
+    st.close()
+
+
+def test_save_does_not_wait_for_sync(tmp_path):
+    st = StateStore(str(tmp_path / "pv.state"))
+    with st._sync_lock:  # fdatasync läuft gerade (langsame SD-Karte)
+        t = threading.Thread(target=st.save, args=(_state(1),))
+        t.start()
+        t.join(1)
+        assert not t.is_alive()
+    st.close()
+    st.close()  # zweites close (Reload + Shutdown) ist harmlos
+    st = StateStore(str(tmp_path / "pv.state"))
+    assert st.load() == _state(1)
+    st.close()
+
+
+def test_foreign_size_is_reset(tmp_path):
+    path = tmp_path / "pv.state"
+    path.write_bytes(b"\x01" * (FILE_SIZE + 7))
+    st = StateStore(str(path))
+    assert st.load() is None
+    st.close()
+    assert path.stat().st_size == FILE_SIZE
+
+
+def test_convert_keeps_energy():
+    wpp = 24_000_000_000_000
+    st = ChannelState(0, wpp, wpp // 3, 7, 50, 1000, 123)
+    out = st.convert(wpp * 2)
+    assert out.pulse_queue * out.wns_per_pulse + out.energy_wns == 7 * wpp + wpp // 3
+    assert 0 <= out.energy_wns < out.wns_per_pulse
+    assert (out.pulses_sent, out.power_w, out.meter_wns) == (50, 1000, 123)
+    assert st.convert(wpp) is st
+
+
+def test_open_store_off(tmp_path):
+    assert open_store("off", "pv") is None
+    st = open_store(str(tmp_path / "sub"), "pv")
+    assert st is not None and st.path == str(tmp_path / "sub" / "pv.state")
+    st.close()
+
+
+def test_meter_beyond_int64_wns(tmp_path):
+    # 100 MWh Zählerstand: in W*ns weit über int64
+    st = replace(_state(1), meter_wns=100_000_000 * 3_600_000_000_000 + 12345)
+    store = StateStore(str(tmp_path / "pv.state"))
+    store.save(st)
+    store.close()
+    store = StateStore(str(tmp_path / "pv.state"))
+    assert store.load() == st
+    store.close()
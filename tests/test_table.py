@@ -0,0 +1,114 @@
+import math
+
+import pytest
+
+from pulsar.channel import Channel
+from pulsar.modbus import SignalSample
+from pulsar.table import ChannelTable
+
+S = 1_000_000_000
+WH = 3_600 * S  # 1 Wh in W*ns
+
+
+def _pv(w: int) -> SignalSample:
+    return SignalSample(w, (w, 0, 0))
+
+
+def _setup(load_cfg, channels=("pv",), **values):
+    cfg = load_cfg(channels, PV_IMP_PER_KWH=1000, **values)
+    sigs = [cfg.signals[n] for n in ("pv", "house", "hp", "chg")]
+    table = ChannelTable(cfg.channels, sigs)
+    chans = [Channel(c, {}, table, i) for i, c in enumerate(cfg.channels)]
+    return table, chans
+
+
+def _run(table, chans, samples):
+    for ts, s in samples:
+        if table.update(ts, s):
+            for c in chans:
+                c.harvest()
+
+
+def test_ramp_matches_reference_integral(load_cfg):
+    # P(t) = 100 W/s * t über 60 s: Trapez ist exakt, E(t) = 50 t^2 Ws -> 50 Wh, k-ter Puls bei sqrt(72 k) s
+    table, (ch,) = _setup(load_cfg)
+    dt = S // 5
+    _run(table, [ch], ((k * dt, {"pv": _pv(20 * k)}) for k in range(301)))
+
+    assert ch.meter_wns == 50 * WH
+    assert ch.pulse_queue == 50 and ch.energy_wns == 0
+    due = ch.emitter.scheduler.pending()
+    for k, ts in enumerate(due, 1):
+        assert abs(ts - math.sqrt(72 * k) * S) < dt
+    assert due == sorted(due)
+
+
+def test_hold_integration(load_cfg):
+    table, (ch,) = _setup(load_cfg, PV_INTEGRATION="hold")
+    _run(table, [ch], ((k * S, {"pv": _pv(3600 if k < 5 else 0)}) for k in range(11)))
+    # 3600 W über 5 Intervalle à 1 s = 5 Wh, der Sprung auf 0 zählt erst ab dem nächsten Intervall
+    assert ch.meter_wns == 5 * WH and ch.pulse_queue == 5
+
+
+def test_clamped_to_cap(load_cfg):
+    table, (ch,) = _setup(load_cfg, PV_MAX_POWER_W=1800)
+    _run(table, [ch], ((k * S, {"pv": _pv(9000)}) for k in range(3)))
+    assert list(table.power) == [1800] and ch.meter_wns == WH
+
+
+def test_net_channel_never_negative(load_cfg):
+    table, (house,) = _setup(load_cfg, ("house",))
+    samples = {"house": _pv(1000), "hp": SignalSample(1500, (1500,)), "chg": _pv(0)}
+    _run(table, [house], ((k * S, samples) for k in range(4)))
+    assert list(table.power) == [0] and house.meter_wns == 0
+
+
+@pytest.mark.parametrize("policy, expected, dropped", [
+    ("interpolate", 3600 * 2 + 5400 * 10, 0),
+    ("hold", 3600 * 2 + 3600 * 10, 0),
+    ("zero", 3600 * 2, 5400 * 10),
+])
+def test_gap_policy(load_cfg, policy, expected, dropped):
+    table, (ch,) = _setup(load_cfg, PV_GAP_POLICY=policy, PV_MAX_GAP_S=5)
+    # 3 Samples im Abstand 1 s, dann 10 s Lücke bis zum nächsten (7200 W)
+    samples = [(k * S, {"pv": _pv(3600)}) for k in range(3)] + [(12 * S, {"pv": _pv(7200)})]
+    _run(table, [ch], samples)
+    assert ch.meter_wns == expected * S
+    assert table.gaps[0] == 1 and table.gap_ns[0] == 10 * S
+    assert table.gap_dropped_wns[0] == dropped * S
+
+
+def test_outage_counts_as_gap(load_cfg):
+    table, (ch,) = _setup(load_cfg, PV_GAP_POLICY="zero")
+    _run(table, [ch], [(0, {"pv": _pv(3600)}), (S, {"pv": _pv(3600)})])
+    table.mark_outage()
+    _run(table, [ch], [(2 * S, {"pv": _pv(3600)}), (3 * S, {"pv": _pv(3600)})])
+    assert ch.meter_wns == 2 * WH and table.gaps[0] == 1
+
+
+def test_missing_required_signal(load_cfg):
+    table, (pv, house) = _setup(load_cfg, ("pv", "house"), HOUSE_GAP_POLICY="zero")
+    full = {"pv": _pv(3600), "house": _pv(3600), "hp": SignalSample(0, (0,)), "chg": _pv(0)}
+    no_house = {k: v for k, v in full.items() if k != "house"}
+    _run(table, [pv, house], [(0, full), (S, full), (2 * S, no_house), (3 * S, full)])
+    # pv läuft durch, bei house zählt 1..3 s (über den Aussetzer) als Lücke
+    assert pv.meter_wns == 3 * WH
+    assert house.meter_wns == WH and table.gaps[1] == 1 and table.gap_ns[1] == 2 * S
+
+
+def test_first_sample_only_starts(load_cfg):
+    table, (ch,) = _setup(load_cfg)
+    assert table.update(5 * S, {"pv": _pv(20_000)}) == []
+    assert ch.meter_wns == 0 and table.last_ts[0] == 5 * S
+
+
+def test_carry_is_capped(load_cfg, monkeypatch):
+    from pulsar import channel
+
+    monkeypatch.setattr(channel, "CARRY_MAX_WNS", 5 * WH)
+    table, (ch,) = _setup(load_cfg, PV_MAX_QUEUE=2)
+    # 3600 W über 20 s = 20 Wh: 2 in der Queue, 5 Wh vorgetragen, der Rest verworfen und gezählt
+    _run(table, [ch], ((k * S, {"pv": _pv(3600)}) for k in range(21)))
+    assert ch.pulse_queue == 2 and ch.energy_wns <= 5 * WH
+    assert ch.dropped_pulses == 13 and ch.dropped_wns == 13 * WH
+    assert ch.meter_wns == 20 * WH
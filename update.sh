@@ -26,22 +26,27 @@ echo "[*] Updating Python deps..."
 "${VENV_DIR}/bin/python" -m pip install -U pip
 "${VENV_DIR}/bin/pip" install -r "${APP_DIR}/requirements.txt"
 
-echo "[*] Reloading systemd + restarting services..."
-sudo systemctl daemon-reload
+# Unit aus dem aktuellen Stand neu schreiben (inkl. daemon-reload), auch wenn sie schon existiert
+bash "${APP_DIR}/install.sh" unit
+
+echo "[*] Restarting services..."
 
 shopt -s nullglob
 found=0
 for f in "${APP_DIR}"/*_pulser.py; do
   base="$(basename "$f")"
   inst="${base%_pulser.py}"
+  # nur aktivierte Instanzen (install.sh entscheidet single vs. engine)
+  if ! systemctl is-enabled --quiet "pulser@${inst}"; then
+    continue
+  fi
   echo "    - restart pulser@${inst}"
-  sudo systemctl enable --now "pulser@${inst}"
   sudo systemctl restart "pulser@${inst}"
   found=1
 done
 
 if [ "$found" -eq 0 ]; then
-  echo "[!] No *_pulser.py scripts found to restart."
+  echo "[!] No enabled pulser@ services found to restart (run install.sh)."
 fi
 
 echo